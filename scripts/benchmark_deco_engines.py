@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark the Python ZH-L16C implementations against each other.
+
+Runs identical segment lists through TissueState (generate_uddf_test_data.py)
+and State/load (deco_golden/generate_vectors.py, the golden-vector engine),
+and reports:
+- throughput: tissue updates, ceilings and schedules per second. The golden
+  engine plans full stop schedules; TissueState has no stop planner, so its
+  NDL solve is timed instead.
+- agreement: largest tissue tension (bar) and ceiling (m) difference over
+  every prefix of the segment lists, twice. "aligned" gives both engines
+  the same starting tissues and pressure model, so it measures the
+  implementations. "native" keeps each engine's own surface pressure and
+  air N2 fraction, so it measures model drift. Aligned runs agree to
+  ~1e-14 until a list switches from trimix to nitrox: TissueState stops
+  decaying helium below 1 mbar, and the golden engine does not.
+
+The Dart engine is not runnable from here; golden_vector_test.dart checks
+it against the golden engine's vectors.
+
+    python3 scripts/benchmark_deco_engines.py
+    python3 scripts/benchmark_deco_engines.py --output deco.json
+
+Pure stdlib; results are JSON like benchmark_uddf_generator.py.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _HERE)
+import generate_uddf_test_data as uddf  # noqa: E402
+
+_spec = importlib.util.spec_from_file_location(
+    "generate_vectors", os.path.join(_HERE, "deco_golden", "generate_vectors.py")
+)
+golden = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(golden)
+
+# Open-circuit mixes as (o2, he) fractions
+MIXES = [(0.21, 0.0), (0.32, 0.0), (0.50, 0.0), (0.18, 0.45), (0.21, 0.35)]
+SEGMENT_SECONDS = [1, 5, 30, 60, 600]
+GF_LOW, GF_HIGH = 0.30, 0.85
+
+# golden.Env whose pressure model matches TissueState's: 1.01325 bar at the
+# surface plus exactly 0.1 bar per meter.
+UDDF_ENV = golden.Env(surface=uddf.SURFACE_PRESSURE, density=10000.0 / golden.G)
+
+
+def random_segments(seed: int, count: int = 200) -> list:
+    """Deterministic (depth_m, seconds, o2, he) segments."""
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(0, 70), rng.choice(SEGMENT_SECONDS), *rng.choice(MIXES))
+        for _ in range(count)
+    ]
+
+
+def _load_golden(state, segment):
+    depth, seconds, o2, he = segment
+    golden.load(state, depth, seconds, 1.0 - o2 - he, he, GF_LOW)
+
+
+def agreement(segment_lists: list, aligned: bool) -> dict:
+    """Largest TissueState vs golden difference after each segment."""
+    worst_tension = worst_ceiling = 0.0
+    for segments in segment_lists:
+        tissue = uddf.TissueState()
+        if aligned:
+            state = golden.State(UDDF_ENV)
+            state.n2, state.he = list(tissue.n2_loadings), list(tissue.he_loadings)
+        else:
+            state = golden.State(golden.Env())
+        for segment in segments:
+            tissue.update(*segment)
+            _load_golden(state, segment)
+            diffs = [abs(a - b) for a, b in zip(tissue.n2_loadings + tissue.he_loadings,
+                                                state.n2 + state.he)]
+            worst_tension = max(worst_tension, *diffs)
+            for gf in (GF_LOW, GF_HIGH, 1.0):
+                worst_ceiling = max(worst_ceiling,
+                                    abs(tissue.ceiling(gf) - golden.ceiling_m(state, gf)))
+    return {
+        "max_tension_diff_bar": float(f"{worst_tension:.3g}"),
+        "max_ceiling_diff_m": float(f"{worst_ceiling:.3g}"),
+    }
+
+
+def _rate(bench, ops: int, number: int) -> int:
+    """Best-of-3 operations per second for bench() performing `ops` ops."""
+    elapsed = min(timeit.repeat(bench, number=number, repeat=3))
+    return round(ops * number / elapsed)
+
+
+def throughput(segments: list, schedules: list, number: int = 5) -> dict:
+    """Operations per second for each engine over the same inputs."""
+    def tissue_updates():
+        tissue = uddf.TissueState()
+        for segment in segments:
+            tissue.update(*segment)
+
+    def golden_updates():
+        state = golden.State(UDDF_ENV)
+        for segment in segments:
+            _load_golden(state, segment)
+
+    tissue = uddf.TissueState()
+    state = golden.State(UDDF_ENV)
+    for segment in segments[:20]:
+        tissue.update(*segment)
+        _load_golden(state, segment)
+
+    def golden_schedules():
+        for point in schedules:
+            golden.sweep_schedule(point)
+
+    def tissue_ndls():
+        for _, depth, _, _, _ in schedules:
+            uddf.TissueState().ndl(depth, exact=True)
+
+    return {
+        "tissue_state": {
+            "updates_per_sec": _rate(tissue_updates, len(segments), number),
+            "ceilings_per_sec": _rate(lambda: tissue.ceiling(GF_HIGH), 1, number * 2000),
+            "ndl_per_sec": _rate(tissue_ndls, len(schedules), number),
+        },
+        "golden": {
+            # load() also tracks the GF-low anchor ceiling on every update
+            "updates_per_sec": _rate(golden_updates, len(segments), number),
+            "ceilings_per_sec": _rate(lambda: golden.ceiling_m(state, GF_HIGH), 1, number * 2000),
+            "schedules_per_sec": _rate(golden_schedules, len(schedules), 1),
+        },
+    }
+
+
+def schedule_sample(count: int) -> list:
+    """Every n-th point of the golden --sweep grid, `count` points in all."""
+    points = golden.sweep_points()
+    return points[:: max(1, len(points) // count)][:count]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark and cross-check the Python ZH-L16C engines"
+    )
+    parser.add_argument("--lists", type=int, default=20,
+                        help="Random segment lists for agreement (default: 20)")
+    parser.add_argument("--segments", type=int, default=200,
+                        help="Segments per list (default: 200)")
+    parser.add_argument("--schedules", type=int, default=100,
+                        help="Sweep-grid schedules to time (default: 100)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    segment_lists = [random_segments(args.seed + i, args.segments) for i in range(args.lists)]
+    results = {
+        "benchmark": "scripts/benchmark_deco_engines.py",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "throughput": throughput(segment_lists[0], schedule_sample(args.schedules)),
+        "agreement": {
+            "aligned": agreement(segment_lists, aligned=True),
+            "native": agreement(segment_lists, aligned=False),
+        },
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Unit tests for benchmark_deco_engines.py."""
+
+import importlib.util
+import os
+import unittest
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_spec = importlib.util.spec_from_file_location(
+    "benchmark_deco_engines",
+    os.path.join(_HERE, "benchmark_deco_engines.py"),
+)
+bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench)
+
+
+class AgreementTest(unittest.TestCase):
+    def _segments(self, mixes):
+        original = bench.MIXES
+        self.addCleanup(setattr, bench, "MIXES", original)
+        bench.MIXES = mixes
+        return [bench.random_segments(seed, 100) for seed in range(3)]
+
+    def test_aligned_engines_agree_on_single_inert_mixes(self):
+        for mixes in ([(0.21, 0.0), (0.32, 0.0)], [(0.18, 0.45), (0.21, 0.35)]):
+            result = bench.agreement(self._segments(mixes), aligned=True)
+            self.assertLess(result["max_tension_diff_bar"], 1e-12)
+            self.assertLess(result["max_ceiling_diff_m"], 1e-9)
+
+    def test_native_models_drift_by_their_surface_constants(self):
+        result = bench.agreement(self._segments([(0.21, 0.0)]), aligned=False)
+        self.assertGreater(result["max_tension_diff_bar"], 1e-3)
+        self.assertLess(result["max_ceiling_diff_m"], 0.5)
+
+
+class ThroughputTest(unittest.TestCase):
+    def test_reports_every_engine_metric(self):
+        result = bench.throughput(bench.random_segments(1, 20),
+                                  bench.schedule_sample(2), number=1)
+        self.assertEqual(set(result), {"tissue_state", "golden"})
+        self.assertEqual(set(result["golden"]),
+                         {"updates_per_sec", "ceilings_per_sec", "schedules_per_sec"})
+        for engine in result.values():
+            for ops in engine.values():
+                self.assertGreater(ops, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Benchmark the UDDF test data generator.
+
+Times each phase of generate_uddf_test_data.py across a grid of dive counts and
+sample intervals, records peak RSS per case, and micro-benchmarks the per-sample
+hot spots (TissueState.update/ceiling, PerlinNoise.noise). Results are JSON so a
+run can be stored as a baseline and later runs compared against it:
+
+    python3 scripts/benchmark_uddf_generator.py --output baseline.json
+    python3 scripts/benchmark_uddf_generator.py --baseline baseline.json
+
+Phases per case:
+- plan: dive scheduling (plan_dives)
+- profile: profile synthesis (generate_dive_records)
+- xml_build: <dive> construction and serialization (serialize_dive)
+- write: file write (UddfStreamWriter.write_fragment)
+
+Each case runs in a fresh interpreter so its peak RSS is its own. Exit code 1
+means at least one metric regressed by more than --tolerance vs the baseline.
+Pure stdlib; peak RSS uses the Unix-only resource module.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_uddf_test_data as gen  # noqa: E402
+
+DEFAULT_DIVE_COUNTS = [10, 500, 5000]
+DEFAULT_SAMPLE_INTERVALS = [1, 5, 30]
+DEFAULT_TOLERANCE = 0.25
+PHASES = ["plan", "profile", "xml_build", "write"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(num_dives: int, sample_interval: int, seed: int = 42) -> dict:
+    """Run the generator pipeline once, timing each phase."""
+    seconds = dict.fromkeys(PHASES, 0.0)
+    random.seed(seed)
+    end_date = datetime(2026, 1, 1)
+    start_date = end_date - timedelta(days=5 * 365)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        buddies = gen.generate_buddies(50)
+        trips = gen.generate_trips(start_date, end_date, num_trips=20)
+        started = time.perf_counter()
+        plans, _ = gen.plan_dives(
+            num_dives, gen.DIVE_SITES, gen.DIVE_CENTERS, buddies, trips, start_date, end_date
+        )
+        seconds["plan"] = time.perf_counter() - started
+
+    samples = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "bench.uddf")
+        with open(output_path, "wb") as f:
+            writer = gen.UddfStreamWriter(f)
+            writer.start(gen.ET.Element("uddf", {"xmlns": gen.UDDF_NS, "version": "3.2.1"}))
+            writer.open_section("profiledata")
+            records = gen.generate_dive_records(plans, sample_interval)
+            while True:
+                started = time.perf_counter()
+                record = next(records, None)
+                seconds["profile"] += time.perf_counter() - started
+                if record is None:
+                    break
+                samples += len(record["profile"])
+
+                started = time.perf_counter()
+                fragment = gen.serialize_dive(record, gen.DIVE_SITES[record["site_idx"]])
+                seconds["xml_build"] += time.perf_counter() - started
+
+                started = time.perf_counter()
+                writer.write_fragment(fragment)
+                seconds["write"] += time.perf_counter() - started
+            writer.close_section("profiledata")
+            writer.end()
+        output_bytes = os.path.getsize(output_path)
+
+    seconds["total"] = sum(seconds.values())
+    return {
+        "dives": len(plans),
+        "sample_interval": sample_interval,
+        "samples": samples,
+        "seconds": {name: round(value, 4) for name, value in seconds.items()},
+        "output_bytes": output_bytes,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_micro(number: int = 20000) -> dict:
+    """Operations per second for the per-sample hot spots."""
+    tissue = gen.TissueState()
+    tissue.update(30.0, 20 * 60, 0.21, 0.0)
+    noise = gen.PerlinNoise(seed=42)
+    benches = {
+        "tissue_update": lambda: tissue.update(30.0, 5, 0.21, 0.0),
+        "tissue_ceiling": lambda: tissue.ceiling(0.85),
+        "tissue_gf_ceiling": lambda: tissue.gf_ceiling(0.35, 0.85, 12.0),
+        "perlin_noise": lambda: noise.noise(123.456),
+    }
+    results = {}
+    for name, bench in benches.items():
+        elapsed = min(timeit.repeat(bench, number=number, repeat=3))
+        results[name] = {"ops_per_sec": round(number / elapsed)}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """List regressions of results vs baseline beyond tolerance.
+
+    Phase seconds and peak RSS regress when they grow; micro-benchmark
+    throughput regresses when it shrinks. Cases and metrics missing from either
+    side are skipped.
+
+    Returns:
+        List of human-readable regression descriptions (empty = no regression)
+    """
+    regressions = []
+
+    baseline_cases = {(c["dives"], c["sample_interval"]): c for c in baseline.get("cases", [])}
+    for case in results.get("cases", []):
+        key = (case["dives"], case["sample_interval"])
+        base = baseline_cases.get(key)
+        if base is None:
+            continue
+        metrics = [(f"seconds.{name}", value, base["seconds"].get(name)) for name, value in case["seconds"].items()]
+        metrics.append(("peak_rss_mb", case["peak_rss_mb"], base.get("peak_rss_mb")))
+        for name, value, base_value in metrics:
+            if base_value and value > base_value * (1 + tolerance):
+                regressions.append(
+                    f"{key[0]} dives @ {key[1]}s {name}: {base_value} -> {value} "
+                    f"(+{(value / base_value - 1) * 100:.0f}%)"
+                )
+
+    for name, micro in results.get("micro", {}).items():
+        base_value = baseline.get("micro", {}).get(name, {}).get("ops_per_sec")
+        value = micro["ops_per_sec"]
+        if base_value and value < base_value * (1 - tolerance):
+            regressions.append(
+                f"{name} ops/sec: {base_value} -> {value} (-{(1 - value / base_value) * 100:.0f}%)"
+            )
+
+    return regressions
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark generate_uddf_test_data.py phases, memory and hot spots",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_uddf_generator.py --quick
+  python benchmark_uddf_generator.py --output baseline.json
+  python benchmark_uddf_generator.py --baseline baseline.json --tolerance 0.2
+        """,
+    )
+    parser.add_argument("--dives", type=_int_list, default=DEFAULT_DIVE_COUNTS,
+                        help="Comma-separated dive counts (default: 10,500,5000)")
+    parser.add_argument("--intervals", type=_int_list, default=DEFAULT_SAMPLE_INTERVALS,
+                        help="Comma-separated sample intervals in seconds (default: 1,5,30)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Only 10 dives at 5 and 30 second intervals")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Compare against a stored results JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional slowdown before flagging (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.dives, args.intervals = [10], [5, 30]
+
+    cases = []
+    spawn = multiprocessing.get_context("spawn")
+    for num_dives in args.dives:
+        for interval in args.intervals:
+            # A fresh interpreter per case keeps peak RSS attributable to it
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                case = pool.submit(run_case, num_dives, interval, args.seed).result()
+            sys.stderr.write(
+                f"{num_dives:>6} dives @ {interval:>2}s: {case['seconds']['total']:.2f}s, "
+                f"{case['peak_rss_mb']} MB peak\n"
+            )
+            cases.append(case)
+
+    results = {
+        "generator": "scripts/benchmark_uddf_generator.py",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "micro": run_micro(),
+        "cases": cases,
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            sys.stderr.write(f"REGRESSION: {line}\n")
+        if regressions:
+            return 1
+        sys.stderr.write("No regressions vs baseline.\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
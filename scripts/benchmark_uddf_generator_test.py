@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Unit tests for benchmark_uddf_generator.py."""
+
+import importlib.util
+import os
+import unittest
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_spec = importlib.util.spec_from_file_location(
+    "benchmark_uddf_generator",
+    os.path.join(_HERE, "benchmark_uddf_generator.py"),
+)
+bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench)
+
+
+def _results(total=1.0, rss=40.0, ops=1000):
+    return {
+        "micro": {"tissue_update": {"ops_per_sec": ops}},
+        "cases": [
+            {
+                "dives": 10,
+                "sample_interval": 5,
+                "seconds": {"profile": total, "total": total},
+                "peak_rss_mb": rss,
+            }
+        ],
+    }
+
+
+class CompareTest(unittest.TestCase):
+    def test_within_tolerance_is_clean(self):
+        self.assertEqual(bench.compare(_results(total=1.2), _results(), 0.25), [])
+
+    def test_slower_phase_is_flagged(self):
+        regressions = bench.compare(_results(total=1.5), _results(), 0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("seconds.profile", regressions[0])
+
+    def test_memory_growth_is_flagged(self):
+        regressions = bench.compare(_results(rss=60.0), _results(), 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("peak_rss_mb", regressions[0])
+
+    def test_lower_throughput_is_flagged(self):
+        self.assertEqual(bench.compare(_results(ops=2000), _results(), 0.25), [])
+        regressions = bench.compare(_results(ops=500), _results(), 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("tissue_update", regressions[0])
+
+    def test_cases_missing_from_baseline_are_skipped(self):
+        baseline = _results()
+        baseline["cases"][0]["dives"] = 500
+        self.assertEqual(bench.compare(_results(total=9.0), baseline), [])
+
+
+class RunCaseTest(unittest.TestCase):
+    def test_reports_every_phase(self):
+        case = bench.run_case(3, 30)
+        self.assertEqual(case["dives"], 3)
+        self.assertGreater(case["samples"], 0)
+        self.assertGreater(case["output_bytes"], 0)
+        self.assertEqual(set(case["seconds"]), set(bench.PHASES) | {"total"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,9 +8,31 @@ Regenerate with:
 
     python3 scripts/deco_golden/generate_vectors.py \
         > test/core/deco/golden/vectors.json
+
+Write a columnar corpus over the depth x bottom time x GF x gas x
+environment grid (SWEEP_* below) for bulk regression runs:
+
+    python3 scripts/deco_golden/generate_vectors.py --sweep sweep.json.gz
+
+Check whether the committed vectors are stale (exit 1 if so):
+
+    python3 scripts/deco_golden/generate_vectors.py --check
+
+--check caches each case's expected output under a hash of the case
+definition plus the engine (tables and the source of the functions below),
+so only cases whose inputs or engine changed are recomputed.
 """
+import argparse
+import concurrent.futures
+import functools
+import gzip
+import hashlib
+import inspect
 import json
 import math
+import os
+import sys
+import time
 
 # ZH-L16C tables: copied VERBATIM from
 # lib/core/deco/constants/buhlmann_coefficients.dart
@@ -62,59 +84,98 @@ class State:
         return s
 
 
-def schreiner(p0, pi, minutes, half):
-    k = math.log(2) / half
-    return pi + (p0 - pi) * math.exp(-k * minutes)
+@functools.lru_cache(maxsize=None)
+def decay(minutes):
+    """Schreiner factors exp(-k * minutes) for all 16 compartments.
 
+    Returned as (n2, he) tuples so a whole tissue vector advances with one
+    multiply-add per compartment; loads and stop trials of equal length
+    share them.
+    """
+    return (tuple(math.exp(-(math.log(2) / h) * minutes) for h in N2_HALF),
+            tuple(math.exp(-(math.log(2) / h) * minutes) for h in HE_HALF))
 
-def ceiling_pressure(state, i, gf):
-    pn, ph = state.n2[i], state.he[i]
-    total = pn + ph
-    if total == 0:
-        a, b = N2_A[i], N2_B[i]
-    else:
-        a = (pn * N2_A[i] + ph * HE_A[i]) / total
-        b = (pn * N2_B[i] + ph * HE_B[i]) / total
-    return (total - a * gf) / (gf / b + 1 - gf)
+
+def advance(n2, he, i_n2, i_he, minutes):
+    """Tissue vectors after `minutes` at constant inspired pressures."""
+    k_n2, k_he = decay(minutes)
+    return ([i_n2 + (p - i_n2) * k for p, k in zip(n2, k_n2)],
+            [i_he + (p - i_he) * k for p, k in zip(he, k_he)])
+
+
+def ceiling_pressures(n2, he, gf):
+    """Per-compartment tolerated ambient pressure at gradient factor gf."""
+    out = []
+    for pn, ph, an, bn, ah, bh in zip(n2, he, N2_A, N2_B, HE_A, HE_B):
+        total = pn + ph
+        if total == 0:
+            a, b = an, bn
+        else:
+            a = (pn * an + ph * ah) / total
+            b = (pn * bn + ph * bh) / total
+        out.append((total - a * gf) / (gf / b + 1 - gf))
+    return out
+
+
+def tissue_ceiling(env, n2, he, gf):
+    # depth_at is increasing, so the deepest compartment ceiling is the
+    # one with the highest tolerated pressure.
+    return max(0.0, env.depth_at(max(ceiling_pressures(n2, he, gf))))
 
 
 def ceiling_m(state, gf):
     """Max over compartments of the (>=0 clamped) ceiling in meters."""
-    worst = 0.0
-    for i in range(16):
-        m = state.env.depth_at(ceiling_pressure(state, i, gf))
-        if m < 0:
-            m = 0.0
-        worst = max(worst, m)
-    return worst
+    return tissue_ceiling(state.env, state.n2, state.he, gf)
 
 
-def interp_gf(state, depth, gf_low, gf_high):
-    if depth <= 0 or state.anchor <= 0:
+def gf_at(anchor, depth, gf_low, gf_high):
+    if depth <= 0 or anchor <= 0:
         return gf_high
-    if depth >= state.anchor:
+    if depth >= anchor:
         return gf_low
-    return gf_high - (gf_high - gf_low) * (depth / state.anchor)
+    return gf_high - (gf_high - gf_low) * (depth / anchor)
 
 
-def load(state, depth, seconds, f_n2, f_he, gf_low, setpoint=None):
-    amb = state.env.p_at(depth)
+def interp_gf(state, depth, gf_low, gf_high):
+    return gf_at(state.anchor, depth, gf_low, gf_high)
+
+
+def inspired(env, depth, f_n2, f_he, setpoint=None):
+    amb = env.p_at(depth)
     p_alv = max(amb - WV, 0.0)
     if setpoint is None:
-        i_n2, i_he = p_alv * f_n2, p_alv * f_he
-    else:
-        p_o2 = min(setpoint, p_alv)
-        inert = max(p_alv - p_o2, 0.0)
-        tot = f_n2 + f_he
-        share = f_n2 / tot if tot > 0 else 0.0
-        i_n2, i_he = inert * share, inert * (1 - share)
-    minutes = seconds / 60.0
-    for i in range(16):
-        state.n2[i] = schreiner(state.n2[i], i_n2, minutes, N2_HALF[i])
-        state.he[i] = schreiner(state.he[i], i_he, minutes, HE_HALF[i])
+        return p_alv * f_n2, p_alv * f_he
+    p_o2 = min(setpoint, p_alv)
+    inert = max(p_alv - p_o2, 0.0)
+    tot = f_n2 + f_he
+    share = f_n2 / tot if tot > 0 else 0.0
+    return inert * share, inert * (1 - share)
+
+
+def load(state, depth, seconds, f_n2, f_he, gf_low, setpoint=None):
+    i_n2, i_he = inspired(state.env, depth, f_n2, f_he, setpoint)
+    state.n2, state.he = advance(state.n2, state.he, i_n2, i_he,
+                                 seconds / 60.0)
     state.anchor = max(state.anchor, ceiling_m(state, gf_low))
 
 
+def hold_trial(state, depth, gas, gf_low, gf_high, nxt, minutes):
+    """What-if trial: holding at `depth` for `minutes` whole minutes.
+
+    Returns (ceiling_m, n2, he, anchor), the ceiling taken at the GF
+    interpolated for `nxt`. The hold is one closed-form load, so a trial
+    costs the same however long it is. The anchor takes the GF-low ceiling
+    at the end of the hold; it cannot peak mid-stop while the stop gas
+    off-gasses the leading compartments. `state` is left untouched.
+    """
+    env = state.env
+    i_n2, i_he = inspired(env, depth, gas["f_n2"], gas["f_he"])
+    n2, he = advance(state.n2, state.he, i_n2, i_he, float(minutes))
+    anchor = max(state.anchor, tissue_ceiling(env, n2, he, gf_low))
+    gf = gf_at(anchor, nxt, gf_low, gf_high)
+    return tissue_ceiling(env, n2, he, gf), n2, he, anchor
+
+
 def gas_at(gases, depth):
     """Highest-O2 gas eligible at depth (depth <= mod + eps)."""
     best = None
@@ -164,24 +225,41 @@ def _leg_load(state, frm, to, rate, gases, gf_low):
     load(state, (frm + to) / 2.0, secs, g["f_n2"], g["f_he"], gf_low)
 
 
-def stop_time(state, depth, gases, gf_low, gf_high, last_stop, incr):
+def stop_time(state, depth, gases, gf_low, gf_high, last_stop, incr,
+              limit=120):
     """Minutes-at-stop search, mirroring _calculateStopTime.
 
+    Dart adds one-minute trials until the next stop clears (at most
+    `limit`); this finds the same first clearing minute by doubling the
+    trial length, then bisecting between the last blocked and first clear
+    trial, in O(log minutes) evaluations. Like the anchor in hold_trial,
+    that relies on a stop only getting clearer the longer it is held.
+
     Applies the found minutes to `state` (equivalent to Dart's restore +
     _loadStopMinutes single-call application: exponential loading composes).
     """
     nxt = 0.0 if depth <= last_stop else depth - incr
     g = gas_at(gases, depth)
-    t = 0
-    while t < 120 * 60:
-        trial = state.clone()
-        load(trial, depth, 60, g["f_n2"], g["f_he"], gf_low)
-        gf = interp_gf(trial, nxt, gf_low, gf_high)
-        if ceiling_m(trial, gf) <= nxt:
-            break
-        state.n2, state.he, state.anchor = trial.n2, trial.he, trial.anchor
-        t += 60
-    return t
+
+    blocked, held = 0, None  # longest hold known not to clear, its trial
+    clear, probe = None, 1  # shortest hold known to clear
+    while clear is None and blocked < limit:
+        result = hold_trial(state, depth, g, gf_low, gf_high, nxt, probe)
+        if result[0] <= nxt:
+            clear = probe
+        else:
+            blocked, held = probe, result
+            probe = min(probe * 2, limit)
+    while clear is not None and clear - blocked > 1:
+        mid = (blocked + clear) // 2
+        result = hold_trial(state, depth, g, gf_low, gf_high, nxt, mid)
+        if result[0] <= nxt:
+            clear = mid
+        else:
+            blocked, held = mid, result
+    if held is not None:
+        _, state.n2, state.he, state.anchor = held
+    return blocked * 60
 
 
 def schedule(state, depth, gases, gf_low, gf_high,
@@ -235,6 +313,16 @@ def run_case(name, env, gf, segments, sched_depth, gases,
     if ccr_ceiling_at is not None:
         gf_here = interp_gf(st, ccr_ceiling_at, gf[0] / 100.0, gf[1] / 100.0)
         expected["ceiling_m"] = round(ceiling_m(st, gf_here), 3)
+    return case_result(expected, name, env, gf, segments, sched_depth, gases)
+
+
+def case_result(expected, name, env, gf, segments, sched_depth, gases,
+                **_options):
+    """run_case's output for a case definition and its expected values.
+
+    Options that only shape `expected` (tissues, ccr_ceiling_at) are
+    accepted and ignored, so a cached `expected` rebuilds with **spec.
+    """
     return {
         "name": name,
         "environment": {"surface_pressure_bar": env.surface,
@@ -247,59 +335,357 @@ def run_case(name, env, gf, segments, sched_depth, gases,
     }
 
 
+def case(name, env, gf, segments, sched_depth, gases,
+         tissues=False, ccr_ceiling_at=None):
+    """A case definition: run_case's arguments, hashed by --check."""
+    return {"name": name, "env": env, "gf": gf, "segments": segments,
+            "sched_depth": sched_depth, "gases": gases, "tissues": tissues,
+            "ccr_ceiling_at": ccr_ceiling_at}
+
+
 AIR = {"f_n2": 0.7902, "f_he": 0.0, "mod_m": 66.0}
 EAN32 = {"f_n2": 0.68, "f_he": 0.0, "mod_m": 40.0}
 EAN50 = {"f_n2": 0.50, "f_he": 0.0, "mod_m": 22.0}   # ppO2 1.6
 O2 = {"f_n2": 0.0, "f_he": 0.0, "mod_m": 6.0}        # ppO2 1.6
 TX1845 = {"f_n2": 0.37, "f_he": 0.45, "mod_m": 78.0}
 
+
+def isa_surface(altitude_m):
+    """ISA surface pressure (bar) at altitude_m."""
+    return 1.01325 * (1 - 0.0000225577 * altitude_m) ** 5.25588
+
+
 STD = Env()
-ISA_2000M = 1.01325 * (1 - 0.0000225577 * 2000.0) ** 5.25588
-
-cases = [
-    run_case("air-30m-25min-gf5080", STD, [50, 80],
-             [{"avg_depth_m": 15.0, "seconds": 100,
-               "f_n2": 0.7902, "f_he": 0.0},
-              {"avg_depth_m": 30.0, "seconds": 1500,
-               "f_n2": 0.7902, "f_he": 0.0}],
-             30.0, [AIR], tissues=True),
-    run_case("air-40m-20min-gf3070", STD, [30, 70],
-             [{"avg_depth_m": 20.0, "seconds": 133,
-               "f_n2": 0.7902, "f_he": 0.0},
-              {"avg_depth_m": 40.0, "seconds": 1200,
-               "f_n2": 0.7902, "f_he": 0.0}],
-             40.0, [AIR]),
-    run_case("ean32-30m-40min-gf5080", STD, [50, 80],
-             [{"avg_depth_m": 15.0, "seconds": 100,
-               "f_n2": 0.68, "f_he": 0.0},
-              {"avg_depth_m": 30.0, "seconds": 2400,
-               "f_n2": 0.68, "f_he": 0.0}],
-             30.0, [EAN32]),
-    run_case("tx1845-60m-25min-ean50-o2-gf5080", STD, [50, 80],
-             [{"avg_depth_m": 30.0, "seconds": 200,
-               "f_n2": 0.37, "f_he": 0.45},
-              {"avg_depth_m": 60.0, "seconds": 1500,
-               "f_n2": 0.37, "f_he": 0.45}],
-             60.0, [TX1845, EAN50, O2]),
-    run_case("air-30m-20min-altitude2000m", Env(surface=ISA_2000M), [50, 80],
-             [{"avg_depth_m": 15.0, "seconds": 100,
-               "f_n2": 0.7902, "f_he": 0.0},
-              {"avg_depth_m": 30.0, "seconds": 1200,
-               "f_n2": 0.7902, "f_he": 0.0}],
-             30.0, [AIR]),
-    run_case("air-30m-25min-freshwater", Env(density=1000.0), [50, 80],
-             [{"avg_depth_m": 15.0, "seconds": 100,
-               "f_n2": 0.7902, "f_he": 0.0},
-              {"avg_depth_m": 30.0, "seconds": 1500,
-               "f_n2": 0.7902, "f_he": 0.0}],
-             30.0, [AIR]),
-    run_case("ccr-sp13-dil1845-60m-25min-loading", STD, [50, 80],
-             [{"avg_depth_m": 30.0, "seconds": 200, "f_n2": 0.37,
-               "f_he": 0.45, "setpoint": 1.3},
-              {"avg_depth_m": 60.0, "seconds": 1500, "f_n2": 0.37,
-               "f_he": 0.45, "setpoint": 1.3}],
-             None, [], tissues=True, ccr_ceiling_at=60.0),
+ISA_2000M = isa_surface(2000.0)
+
+CASES = [
+    case("air-30m-25min-gf5080", STD, [50, 80],
+         [{"avg_depth_m": 15.0, "seconds": 100,
+           "f_n2": 0.7902, "f_he": 0.0},
+          {"avg_depth_m": 30.0, "seconds": 1500,
+           "f_n2": 0.7902, "f_he": 0.0}],
+         30.0, [AIR], tissues=True),
+    case("air-40m-20min-gf3070", STD, [30, 70],
+         [{"avg_depth_m": 20.0, "seconds": 133,
+           "f_n2": 0.7902, "f_he": 0.0},
+          {"avg_depth_m": 40.0, "seconds": 1200,
+           "f_n2": 0.7902, "f_he": 0.0}],
+         40.0, [AIR]),
+    case("ean32-30m-40min-gf5080", STD, [50, 80],
+         [{"avg_depth_m": 15.0, "seconds": 100,
+           "f_n2": 0.68, "f_he": 0.0},
+          {"avg_depth_m": 30.0, "seconds": 2400,
+           "f_n2": 0.68, "f_he": 0.0}],
+         30.0, [EAN32]),
+    case("tx1845-60m-25min-ean50-o2-gf5080", STD, [50, 80],
+         [{"avg_depth_m": 30.0, "seconds": 200,
+           "f_n2": 0.37, "f_he": 0.45},
+          {"avg_depth_m": 60.0, "seconds": 1500,
+           "f_n2": 0.37, "f_he": 0.45}],
+         60.0, [TX1845, EAN50, O2]),
+    case("air-30m-20min-altitude2000m", Env(surface=ISA_2000M), [50, 80],
+         [{"avg_depth_m": 15.0, "seconds": 100,
+           "f_n2": 0.7902, "f_he": 0.0},
+          {"avg_depth_m": 30.0, "seconds": 1200,
+           "f_n2": 0.7902, "f_he": 0.0}],
+         30.0, [AIR]),
+    case("air-30m-25min-freshwater", Env(density=1000.0), [50, 80],
+         [{"avg_depth_m": 15.0, "seconds": 100,
+           "f_n2": 0.7902, "f_he": 0.0},
+          {"avg_depth_m": 30.0, "seconds": 1500,
+           "f_n2": 0.7902, "f_he": 0.0}],
+         30.0, [AIR]),
+    case("ccr-sp13-dil1845-60m-25min-loading", STD, [50, 80],
+         [{"avg_depth_m": 30.0, "seconds": 200, "f_n2": 0.37,
+           "f_he": 0.45, "setpoint": 1.3},
+          {"avg_depth_m": 60.0, "seconds": 1500, "f_n2": 0.37,
+           "f_he": 0.45, "setpoint": 1.3}],
+         None, [], tissues=True, ccr_ceiling_at=60.0),
 ]
 
-print(json.dumps({"generator": "scripts/deco_golden/generate_vectors.py",
-                  "semantics_version": 1, "cases": cases}, indent=2))
+SEMANTICS_VERSION = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+VECTORS = os.path.join(HERE, "..", "..", "test", "core", "deco", "golden",
+                       "vectors.json")
+CACHE = os.path.join(HERE, ".vectors_cache.json")
+
+# Everything a case's expected output depends on besides its own definition.
+ENGINE_TABLES = (N2_HALF, HE_HALF, N2_A, N2_B, HE_A, HE_B, WV, AIR_N2, G)
+
+
+def engine_code(*roots):
+    """This module's functions and classes that `roots` reach, by name.
+
+    Follows the global names in each function's bytecode (and in nested
+    code objects and class members), so a new engine helper is hashed as
+    soon as run_case can call it.
+    """
+    found, todo = {}, list(roots)
+    while todo:
+        obj = todo.pop()
+        if obj.__name__ in found:
+            continue
+        found[obj.__name__] = obj
+        members = vars(obj).values() if inspect.isclass(obj) else [obj]
+        codes = []
+        for member in members:
+            member = inspect.unwrap(getattr(member, "fget", member))
+            if inspect.isfunction(member):
+                codes.append(member.__code__)
+        while codes:
+            code = codes.pop()
+            codes.extend(c for c in code.co_consts if inspect.iscode(c))
+            for name in code.co_names:
+                value = inspect.unwrap(globals().get(name))
+                if (inspect.isfunction(value) or inspect.isclass(value)) \
+                        and value.__module__ == __name__:
+                    todo.append(value)
+    return tuple(found[name] for name in sorted(found))
+
+
+# Env reaches the engine as an argument, never by name, so it is a root too
+ENGINE_CODE = engine_code(run_case, Env)
+
+
+def engine_hash():
+    h = hashlib.sha256()
+    h.update(json.dumps([SEMANTICS_VERSION, ENGINE_TABLES]).encode())
+    for obj in ENGINE_CODE:
+        # Classes go method by method: inspect.getsource on a class parses
+        # the whole file, which would dominate a cached --check.
+        members = vars(obj).values() if inspect.isclass(obj) else [obj]
+        for member in members:
+            member = inspect.unwrap(getattr(member, "fget", member))
+            if inspect.isfunction(member):
+                h.update(inspect.getsource(member).encode())
+    return h.hexdigest()
+
+
+def case_key(spec, engine):
+    env = spec["env"]
+    inputs = dict(spec, env=[env.surface, env.density])
+    text = json.dumps(inputs, sort_keys=True)
+    return hashlib.sha256((engine + text).encode()).hexdigest()
+
+
+def document(cases):
+    return {"generator": "scripts/deco_golden/generate_vectors.py",
+            "semantics_version": SEMANTICS_VERSION, "cases": cases}
+
+
+def render(cases):
+    return json.dumps(document(cases), indent=2) + "\n"
+
+
+def cached_cases(specs, cache_path):
+    """run_case for every spec, reusing cached expected outputs.
+
+    Returns (cases, number recomputed). The cache is rewritten with exactly
+    the current keys, so entries for edited or removed cases drop out.
+    """
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except ValueError:
+            cache = {}
+    engine = engine_hash()
+    cases, fresh, recomputed = [], {}, 0
+    for spec in specs:
+        key = case_key(spec, engine)
+        if key in cache:
+            result = case_result(cache[key], **spec)
+        else:
+            result = run_case(**spec)
+            recomputed += 1
+        fresh[key] = result["expected"]
+        cases.append(result)
+    if cache_path and fresh != cache:
+        tmp = cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(fresh, f)
+        os.replace(tmp, cache_path)
+    return cases, recomputed
+
+
+def stale_cases(cases, committed):
+    """Describe how `committed` (parsed vectors.json) differs from `cases`."""
+    problems = []
+    if committed.get("semantics_version") != SEMANTICS_VERSION:
+        problems.append("semantics_version: %r != %r" % (
+            committed.get("semantics_version"), SEMANTICS_VERSION))
+    old = {c.get("name"): c for c in committed.get("cases", [])}
+    new = {c["name"]: c for c in cases}
+    for name, c in new.items():
+        if name not in old:
+            problems.append("missing: " + name)
+        elif old[name] != c:
+            fields = sorted(k for k in c if old[name].get(k) != c[k])
+            problems.append("stale: %s (%s)" % (name, ", ".join(fields)))
+    for name in old:
+        if name not in new:
+            problems.append("removed: " + name)
+    if not problems and [c.get("name") for c in committed["cases"]] != \
+            list(new):
+        problems.append("case order differs")
+    return problems
+
+
+def check(vectors_path, cache_path):
+    started = time.perf_counter()
+    cases, recomputed = cached_cases(CASES, cache_path)
+    with open(vectors_path) as f:
+        text = f.read()
+    problems = stale_cases(cases, json.loads(text))
+    if not problems and text != render(cases):
+        problems.append("formatting differs from generator output")
+    ms = (time.perf_counter() - started) * 1000
+    for line in problems:
+        sys.stderr.write(line + "\n")
+    sys.stderr.write("%s: %s (%d cases, %d recomputed, %.1f ms)\n" % (
+        os.path.relpath(vectors_path),
+        "STALE, regenerate it" if problems else "up to date",
+        len(cases), recomputed, ms))
+    return 1 if problems else 0
+
+
+# --sweep grid: every combination whose bottom gas is breathable at depth.
+SWEEP_DEPTHS_M = [float(d) for d in range(12, 91, 3)]
+SWEEP_BOTTOM_MIN = [10, 15, 20, 25, 30, 40, 50, 60]
+SWEEP_GF = [[30, 70], [30, 85], [40, 85], [50, 80], [70, 85], [100, 100]]
+SWEEP_GASES = {  # bottom gas first
+    "air": [AIR],
+    "air-ean50": [AIR, EAN50],
+    "ean32": [EAN32],
+    "ean32-o2": [EAN32, O2],
+    "tx1845-ean50-o2": [TX1845, EAN50, O2],
+}
+SWEEP_ENVS = {
+    "sea": STD,
+    "fresh": Env(density=1000.0),
+    "altitude1000m": Env(surface=isa_surface(1000.0)),
+    "altitude2000m": Env(surface=ISA_2000M),
+}
+
+
+def sweep_points():
+    """The --sweep grid in corpus order."""
+    points = []
+    for gas_set, gases in SWEEP_GASES.items():
+        for depth in SWEEP_DEPTHS_M:
+            if depth > gases[0]["mod_m"]:
+                continue
+            for minutes in SWEEP_BOTTOM_MIN:
+                for gf in SWEEP_GF:
+                    for env_name in SWEEP_ENVS:
+                        points.append((gas_set, depth, minutes, gf, env_name))
+    return points
+
+
+def sweep_schedule(point):
+    """(tts_seconds, stops) for one grid point, via run_case."""
+    gas_set, depth, minutes, gf, env_name = point
+    bottom = SWEEP_GASES[gas_set][0]
+    gas = {"f_n2": bottom["f_n2"], "f_he": bottom["f_he"]}
+    # Descent at 18 m/min loaded at half depth, as in the hand-written cases.
+    segments = [
+        dict(gas, avg_depth_m=depth / 2, seconds=round(depth / 18 * 60)),
+        dict(gas, avg_depth_m=depth, seconds=minutes * 60),
+    ]
+    expected = run_case("", SWEEP_ENVS[env_name], gf, segments, depth,
+                        SWEEP_GASES[gas_set])["expected"]
+    return expected["tts_seconds"], [(s["depth_m"], s["seconds"])
+                                     for s in expected["stops"]]
+
+
+def sweep(workers=None):
+    """Columnar corpus for the whole --sweep grid.
+
+    One list per column, one row per grid point; each row's stops are
+    stops_depth_m/stops_seconds[stop_offset[i]:stop_offset[i + 1]].
+    Points are computed across a process pool but kept in grid order, so
+    the corpus is identical for any worker count.
+    """
+    points = sweep_points()
+    if workers == 1:
+        results = list(map(sweep_schedule, points))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(sweep_schedule, points, chunksize=64))
+    gas_sets, env_names = list(SWEEP_GASES), list(SWEEP_ENVS)
+    columns = {"gas_set": [], "environment": [], "depth_m": [],
+               "bottom_seconds": [], "gf_low": [], "gf_high": [],
+               "tts_seconds": [], "stop_offset": [0],
+               "stops_depth_m": [], "stops_seconds": []}
+    for (gas_set, depth, minutes, gf, env_name), (tts, stops) in zip(
+            points, results):
+        columns["gas_set"].append(gas_sets.index(gas_set))
+        columns["environment"].append(env_names.index(env_name))
+        columns["depth_m"].append(depth)
+        columns["bottom_seconds"].append(minutes * 60)
+        columns["gf_low"].append(gf[0])
+        columns["gf_high"].append(gf[1])
+        columns["tts_seconds"].append(tts)
+        for stop_depth, seconds in stops:
+            columns["stops_depth_m"].append(stop_depth)
+            columns["stops_seconds"].append(seconds)
+        columns["stop_offset"].append(len(columns["stops_seconds"]))
+    return {
+        "generator": "scripts/deco_golden/generate_vectors.py --sweep",
+        "semantics_version": SEMANTICS_VERSION,
+        "rows": len(points),
+        "gas_sets": [{"name": n, "gases": SWEEP_GASES[n]} for n in gas_sets],
+        "environments": [{"name": n,
+                          "surface_pressure_bar": SWEEP_ENVS[n].surface,
+                          "water_density_kg_m3": SWEEP_ENVS[n].density}
+                         for n in env_names],
+        "descent": "avg_depth_m=depth/2 for round(depth/18*60) s, "
+                   "same gas as bottom",
+        "columns": columns,
+    }
+
+
+def write_sweep(path, workers=None):
+    """Write the sweep corpus as compact JSON, gzipped if path ends .gz."""
+    data = json.dumps(sweep(workers), separators=(",", ":")).encode()
+    if path.endswith(".gz"):
+        data = gzip.compress(data, mtime=0)  # byte-stable across runs
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate or check the deco engine golden vectors")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare against --vectors instead of printing;"
+                             " exit 1 if stale")
+    parser.add_argument("--vectors", default=VECTORS,
+                        help="Committed vectors.json (default: %(default)s)")
+    parser.add_argument("--cache", default=CACHE,
+                        help="--check cache file (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute every case in --check")
+    parser.add_argument("--sweep", metavar="PATH",
+                        help="Write the GF x gas x environment sweep corpus"
+                             " to PATH (.json or .json.gz)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="--sweep worker processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+    if args.sweep:
+        started = time.perf_counter()
+        size = write_sweep(args.sweep, args.workers)
+        sys.stderr.write("%s: %d schedules, %d bytes, %.1f s\n" % (
+            args.sweep, len(sweep_points()), size,
+            time.perf_counter() - started))
+        return 0
+    if args.check:
+        return check(args.vectors, None if args.no_cache else args.cache)
+    sys.stdout.write(render([run_case(**spec) for spec in CASES]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Unit tests for generate_vectors.py.
+
+Run: python3 scripts/deco_golden/generate_vectors_test.py
+
+The committed vectors.json must be exactly what the generator prints, and
+--check must notice when it is not while recomputing only the cases whose
+definition (or the engine) changed.
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import tempfile
+import unittest
+
+# Load the sibling script by path so the test runs from any working directory.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_spec = importlib.util.spec_from_file_location(
+    "generate_vectors",
+    os.path.join(_HERE, "generate_vectors.py"),
+)
+gv = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(gv)
+
+
+class CommittedVectorsTest(unittest.TestCase):
+    def test_committed_vectors_are_current(self):
+        with open(gv.VECTORS) as f:
+            committed = f.read()
+        cases = [gv.run_case(**spec) for spec in gv.CASES]
+        self.assertEqual(committed, gv.render(cases))
+
+
+def _linear_stop_time(state, depth, gases, gf_low, gf_high, last_stop, incr):
+    """The original one-minute-at-a-time _calculateStopTime scan."""
+    nxt = 0.0 if depth <= last_stop else depth - incr
+    g = gv.gas_at(gases, depth)
+    t = 0
+    while t < 120 * 60:
+        trial = state.clone()
+        gv.load(trial, depth, 60, g["f_n2"], g["f_he"], gf_low)
+        gf = gv.interp_gf(trial, nxt, gf_low, gf_high)
+        if gv.ceiling_m(trial, gf) <= nxt:
+            break
+        state.n2, state.he, state.anchor = trial.n2, trial.he, trial.anchor
+        t += 60
+    return t
+
+
+class KernelTest(unittest.TestCase):
+    def test_hold_trial_matches_cloned_loads(self):
+        state = gv.State(gv.STD)
+        gv.load(state, 60.0, 1500, 0.37, 0.45, 0.3)
+        before = (list(state.n2), list(state.he), state.anchor)
+        trial = state.clone()
+        for minutes in range(1, 13):
+            ceiling, n2, he, anchor = gv.hold_trial(
+                state, 21.0, gv.EAN50, 0.3, 0.8, 18.0, minutes)
+            gv.load(trial, 21.0, 60, gv.EAN50["f_n2"], gv.EAN50["f_he"], 0.3)
+            gf = gv.interp_gf(trial, 18.0, 0.3, 0.8)
+            self.assertAlmostEqual(ceiling, gv.ceiling_m(trial, gf), places=9)
+            for got, want in zip(n2 + he, trial.n2 + trial.he):
+                self.assertAlmostEqual(got, want, places=12)
+            self.assertAlmostEqual(anchor, trial.anchor, places=9)
+        self.assertEqual((state.n2, state.he, state.anchor), before)
+
+    def test_stop_time_matches_linear_scan(self):
+        tx1070 = {"f_n2": 0.2, "f_he": 0.7, "mod_m": 150.0}
+        profiles = [
+            (40.0, 30, [gv.AIR], 0.7902, 0.0),
+            (60.0, 120, [gv.AIR], 0.7902, 0.0),  # stops near the 120 cap
+            (60.0, 25, [gv.TX1845, gv.EAN50, gv.O2], 0.37, 0.45),
+            (100.0, 60, [tx1070, gv.EAN50, gv.O2], 0.2, 0.7),
+        ]
+        for depth, minutes, gases, f_n2, f_he in profiles:
+            for gf_low, gf_high in [(0.3, 0.7), (0.5, 0.8), (1.0, 1.0)]:
+                fast, slow = gv.State(gv.STD), gv.State(gv.STD)
+                for st in (fast, slow):
+                    gv.load(st, depth, minutes * 60, f_n2, f_he, gf_low)
+                stop = 3.0 * math.ceil(gv.ceiling_m(fast, gf_low) / 3.0)
+                while stop >= 3.0:
+                    with self.subTest(depth=depth, gf=gf_low, stop=stop):
+                        self.assertEqual(
+                            gv.stop_time(fast, stop, gases, gf_low, gf_high,
+                                         3.0, 3.0),
+                            _linear_stop_time(slow, stop, gases, gf_low,
+                                              gf_high, 3.0, 3.0))
+                    slow.n2, slow.he = list(fast.n2), list(fast.he)
+                    slow.anchor = fast.anchor
+                    stop -= 3.0
+
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        grid = {"SWEEP_DEPTHS_M": [21.0, 45.0], "SWEEP_BOTTOM_MIN": [20, 40],
+                "SWEEP_GF": [[30, 70], [50, 80]]}
+        for name, value in grid.items():
+            self.addCleanup(setattr, gv, name, getattr(gv, name))
+            setattr(gv, name, value)
+
+    def test_columns_decode_to_run_case_schedules(self):
+        corpus = gv.sweep(workers=1)
+        cols = corpus["columns"]
+        points = gv.sweep_points()
+        self.assertEqual(corpus["rows"], len(points))
+        # ean32 (MOD 40 m) is not swept at 45 m
+        self.assertNotIn(("ean32", 45.0, 20, [30, 70], "sea"), points)
+        for i, point in enumerate(points):
+            tts, stops = gv.sweep_schedule(point)
+            lo, hi = cols["stop_offset"][i], cols["stop_offset"][i + 1]
+            self.assertEqual(cols["tts_seconds"][i], tts)
+            self.assertEqual(list(zip(cols["stops_depth_m"][lo:hi],
+                                      cols["stops_seconds"][lo:hi])), stops)
+            gas_set = corpus["gas_sets"][cols["gas_set"][i]]["name"]
+            env = corpus["environments"][cols["environment"][i]]["name"]
+            self.assertEqual(
+                (gas_set, cols["depth_m"][i], cols["bottom_seconds"][i] // 60,
+                 [cols["gf_low"][i], cols["gf_high"][i]], env), point)
+
+    def test_gzip_output_is_byte_stable(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = [os.path.join(tmp.name, n) for n in ("a.json.gz", "b.json.gz")]
+        for path in paths:
+            gv.write_sweep(path, workers=1)
+        with open(paths[0], "rb") as a, open(paths[1], "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+
+class CheckModeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = os.path.join(tmp.name, "cache.json")
+        self.vectors = os.path.join(tmp.name, "vectors.json")
+
+    def _check(self):
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            code = gv.check(self.vectors, self.cache)
+        return code, err.getvalue()
+
+    def test_cache_recomputes_only_changed_cases(self):
+        _, recomputed = gv.cached_cases(gv.CASES, self.cache)
+        self.assertEqual(recomputed, len(gv.CASES))
+        cases, recomputed = gv.cached_cases(gv.CASES, self.cache)
+        self.assertEqual(recomputed, 0)
+        self.assertEqual(gv.render(cases),
+                         gv.render([gv.run_case(**s) for s in gv.CASES]))
+
+        edited = list(gv.CASES)
+        edited[1] = dict(edited[1], gf=[40, 85])
+        _, recomputed = gv.cached_cases(edited, self.cache)
+        self.assertEqual(recomputed, 1)
+
+    def test_engine_change_invalidates_every_case(self):
+        gv.cached_cases(gv.CASES, self.cache)
+        tables = gv.ENGINE_TABLES
+        self.addCleanup(setattr, gv, "ENGINE_TABLES", tables)
+        gv.ENGINE_TABLES = ([5.0] + tables[0][1:],) + tables[1:]
+        _, recomputed = gv.cached_cases(gv.CASES, self.cache)
+        self.assertEqual(recomputed, len(gv.CASES))
+
+    def test_cache_hits_share_run_case_envelope(self):
+        original = gv.case_result
+        self.addCleanup(setattr, gv, "case_result", original)
+        gv.case_result = lambda *a, **kw: dict(original(*a, **kw), extra=1)
+        for _ in range(2):
+            cases, _ = gv.cached_cases(gv.CASES, self.cache)
+            self.assertTrue(all(c["extra"] == 1 for c in cases))
+
+    def test_engine_code_follows_new_helpers(self):
+        self.assertIn(gv.case_result, gv.ENGINE_CODE)
+        self.assertIn(gv.decay.__wrapped__, gv.ENGINE_CODE)
+        namespace = vars(gv)
+        exec("def probe(x):\n    return [helper(y) for y in x]\n"
+             "def helper(y):\n    return gas_at([], y)\n", namespace)
+        self.addCleanup(namespace.pop, "probe")
+        self.addCleanup(namespace.pop, "helper")
+        names = [obj.__name__ for obj in gv.engine_code(gv.probe)]
+        self.assertEqual(names, ["gas_at", "helper", "probe"])
+
+    def test_check_passes_on_current_vectors(self):
+        with open(gv.VECTORS) as src, open(self.vectors, "w") as dst:
+            dst.write(src.read())
+        code, err = self._check()
+        self.assertEqual(code, 0, err)
+        self.assertIn("up to date", err)
+
+    def test_check_names_stale_and_missing_cases(self):
+        with open(gv.VECTORS) as f:
+            doc = json.load(f)
+        doc["cases"][0]["expected"]["tts_seconds"] += 60
+        removed = doc["cases"].pop()["name"]
+        with open(self.vectors, "w") as f:
+            json.dump(doc, f, indent=2)
+        code, err = self._check()
+        self.assertEqual(code, 1)
+        self.assertIn("stale: %s (expected)" % doc["cases"][0]["name"], err)
+        self.assertIn("missing: " + removed, err)
+
+    def test_check_flags_reformatted_file(self):
+        with open(gv.VECTORS) as f:
+            doc = json.load(f)
+        with open(self.vectors, "w") as f:
+            json.dump(doc, f)
+        code, err = self._check()
+        self.assertEqual(code, 1)
+        self.assertIn("formatting differs", err)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,9 +21,24 @@ multiplier array {1.0, 1.05, 1.12, 1.22, 1.35} on the 0.55/0.45 micron base
 (see lib/core/deco/vpm_b.dart). Units: msw (the app's internal metric).
 
 Validation tripwire: air 50 m / 25 min at +3 must give first stop 27 m.
+
+Schedules run across a process pool (--workers) and are cached on disk
+(--cache-dir, default .vpmb_cache next to this script) under a hash of the
+settings, altitude block, dive dict, vpmb.py and this script's own
+settings()/schedule() source, so adding a scenario only runs the new one.
+--sweep writes a broader reference corpus (SWEEP_* below) in the same
+layout:
+
+    python3 vpmb_generate.py --sweep vpmb_sweep.json
 """
+import argparse
+import concurrent.futures
+import hashlib
+import inspect
 import json
+import os
 import sys
+import time
 
 try:
     from vpmb import DiveState
@@ -117,14 +132,130 @@ SCENARIOS = [
 ]
 
 
-def main():
-    golden = {}
-    for name, kwargs in SCENARIOS:
-        golden[name] = {
-            "dive": kwargs,
-            "schedules": {str(lvl): schedule(lvl, dive(**kwargs))
-                          for lvl in range(5)},
-        }
+SWEEP_DEPTHS_M = list(range(18, 61, 3))
+SWEEP_BOTTOM_MIN = [10, 20, 30, 40, 50, 60]
+SWEEP_GASES = {  # name: (o2, he, max depth)
+    "air": (0.21, 0.0, 40),
+    "ean32": (0.32, 0.0, 33),
+    "tx2135": (0.21, 0.35, 60),
+    "tx1845": (0.18, 0.45, 60),
+}
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         ".vpmb_cache")
+
+
+def sweep_scenarios():
+    out = []
+    for gas, (o2, he, max_depth) in SWEEP_GASES.items():
+        for depth in SWEEP_DEPTHS_M:
+            if depth > max_depth:
+                continue
+            for minutes in SWEEP_BOTTOM_MIN:
+                out.append(("%s_%dm_%dmin" % (gas, depth, minutes),
+                            dict(desc="%s %dm %dmin" % (gas, depth, minutes),
+                                 depth_m=depth, bottom_min=minutes,
+                                 o2=o2, he=he)))
+    return out
+
+
+# Code that shapes a cached schedule besides vpmb.py: the settings block
+# and the parsing of VPMDECO's output table.
+SCHEDULE_CODE = (settings, schedule)
+
+
+def engine_hash():
+    h = hashlib.sha256()
+    with open(inspect.getfile(DiveState), "rb") as f:
+        h.update(f.read())
+    for func in SCHEDULE_CODE:
+        h.update(inspect.getsource(func).encode())
+    return h.hexdigest()
+
+
+def cache_key(engine, level, d):
+    text = json.dumps({"settings": settings(level), "altitude": SEA_LEVEL,
+                       "dive": d}, sort_keys=True)
+    return hashlib.sha256((engine + text).encode()).hexdigest()
+
+
+def _schedule_job(job):
+    return schedule(*job)
+
+
+def run_grid(scenarios, workers=None, cache_dir=CACHE_DIR):
+    """{name: {"dive": kwargs, "schedules": {level: stops}}} for scenarios.
+
+    Cached schedules are reused; the rest run across a process pool and
+    are written back to the cache. Output order never depends on which
+    worker finished first.
+    """
+    engine = engine_hash()
+    jobs = [(name, lvl, dive(**kwargs))
+            for name, kwargs in scenarios for lvl in range(5)]
+    results, misses = {}, []
+    for name, lvl, d in jobs:
+        path = None
+        if cache_dir:
+            path = os.path.join(cache_dir,
+                                cache_key(engine, lvl, d) + ".json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    results[name, lvl] = json.load(f)
+                continue
+        misses.append((name, lvl, d, path))
+
+    if misses:
+        args = [(lvl, d) for _, lvl, d, _ in misses]
+        if workers == 1:
+            computed = list(map(_schedule_job, args))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                computed = list(pool.map(_schedule_job, args))
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        for (name, lvl, _, path), stops in zip(misses, computed):
+            results[name, lvl] = stops
+            if path:
+                with open(path + ".tmp", "w") as f:
+                    json.dump(stops, f)
+                os.replace(path + ".tmp", path)
+
+    sys.stderr.write("%d schedules: %d cached, %d computed\n" % (
+        len(jobs), len(jobs) - len(misses), len(misses)))
+    return {
+        name: {"dive": kwargs,
+               "schedules": {str(lvl): results[name, lvl]
+                             for lvl in range(5)}}
+        for name, kwargs in scenarios
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Regenerate VPM-B golden vectors with bwaite/vpmb")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: all CPUs)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help="Schedule cache (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Recompute every schedule")
+    parser.add_argument("--sweep", metavar="PATH",
+                        help="Write the SWEEP_* corpus to PATH instead of"
+                             " printing the golden vectors")
+    args = parser.parse_args(argv)
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    if args.sweep:
+        started = time.perf_counter()
+        corpus = run_grid(sweep_scenarios(), args.workers, cache_dir)
+        with open(args.sweep, "w") as f:
+            json.dump(corpus, f, separators=(",", ":"))
+            f.write("\n")
+        sys.stderr.write("%s: %d scenarios in %.1f s\n" % (
+            args.sweep, len(corpus), time.perf_counter() - started))
+        return
+
+    golden = run_grid(SCENARIOS, args.workers, cache_dir)
     assert golden["air_50m_25min"]["schedules"]["3"][0][0] == 27, \
         "config mismatch: air 50m/25min +3 first stop must be 27 m"
     json.dump(golden, sys.stdout, indent=1)
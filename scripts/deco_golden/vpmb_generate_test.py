@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Unit tests for vpmb_generate.py.
+
+Run: python3 scripts/deco_golden/vpmb_generate_test.py
+
+Needs bwaite/vpmb next to the script (see vpmb_generate.py's docstring);
+without it every test is skipped. run_grid must reuse cached schedules,
+compute only the missing ones, and give the same result from the pool as
+from a serial run.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+# Import by name from the script's directory (where vpmb.py is fetched) so
+# pool workers can unpickle vpmb_generate._schedule_job under any start
+# method.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _HERE)
+try:
+    import vpmb_generate as vg
+except ImportError:
+    vg = None
+
+
+@unittest.skipIf(vg is None, "bwaite/vpmb not fetched")
+class RunGridTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = os.path.join(tmp.name, "cache")
+
+    def run_grid(self, scenarios, workers=1, cache_dir=None):
+        """run_grid's result and its "N schedules: ..." summary line."""
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            grid = vg.run_grid(scenarios, workers, cache_dir)
+        return grid, err.getvalue().strip()
+
+    def test_cache_recomputes_only_new_scenarios(self):
+        first, second = vg.SCENARIOS[:1], vg.SCENARIOS[:2]
+        cold, summary = self.run_grid(first, cache_dir=self.cache_dir)
+        self.assertEqual(summary, "5 schedules: 0 cached, 5 computed")
+        warm, summary = self.run_grid(first, cache_dir=self.cache_dir)
+        self.assertEqual(summary, "5 schedules: 5 cached, 0 computed")
+        self.assertEqual(warm, cold)
+        grown, summary = self.run_grid(second, cache_dir=self.cache_dir)
+        self.assertEqual(summary, "10 schedules: 5 cached, 5 computed")
+        self.assertEqual(grown[first[0][0]], cold[first[0][0]])
+
+    def test_schedule_code_is_in_cache_key(self):
+        self.assertIn(vg.schedule, vg.SCHEDULE_CODE)
+        self.assertIn(vg.settings, vg.SCHEDULE_CODE)
+
+    def test_pool_matches_serial(self):
+        serial, _ = self.run_grid(vg.SCENARIOS, workers=1)
+        pooled, _ = self.run_grid(vg.SCENARIOS, workers=2)
+        self.assertEqual(pooled, serial)
+        self.assertEqual(list(pooled), [name for name, _ in vg.SCENARIOS])
+        self.assertEqual(serial["air_50m_25min"]["schedules"]["3"][0][0], 27)
+
+
+if __name__ == "__main__":
+    unittest.main()
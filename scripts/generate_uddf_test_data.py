@@ -22,12 +22,32 @@ Features:
 - Proper tankpressure ref attributes for multi-tank support
 """
 
+import ast
+import bisect
+import concurrent.futures
+import copy
+import functools
+import glob
+import gzip
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import tokenize
+from array import array
 import random
 import math
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Iterator, Tuple
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
 
 # UDDF namespace
 UDDF_NS = "http://www.streit.cc/uddf/3.2"
@@ -248,7 +268,8 @@ def calculate_temperature_at_depth(
     depth: float,
     profile: Dict,
     surface_temp: float,
-    temp_offset: float = 0.0
+    temp_offset: float = 0.0,
+    rng: random.Random = None,
 ) -> float:
     """
     Calculate water temperature at a given depth with thermocline modeling.
@@ -262,10 +283,12 @@ def calculate_temperature_at_depth(
         profile: Thermocline profile dict.
         surface_temp: Surface water temperature in Celsius.
         temp_offset: Per-dive temperature offset in Celsius (+/- 0.2 typical).
+        rng: Random stream to draw from (None = the global random module).
 
     Returns:
         Temperature in Celsius at the given depth.
     """
+    rng = rng or random
     thermo_start = profile["thermocline_start"]
     thermo_thick = profile["thermocline_thickness"]
     temp_drop = profile["temp_drop"]
@@ -273,7 +296,7 @@ def calculate_temperature_at_depth(
     thermo_end = thermo_start + thermo_thick
 
     # Tiny random sensor noise (not depth-correlated)
-    sensor_noise = random.uniform(-0.05, 0.05)
+    sensor_noise = rng.uniform(-0.05, 0.05)
 
     if depth < thermo_start:
         # Surface layer - stable temperature
@@ -293,6 +316,61 @@ def calculate_temperature_at_depth(
         return temp + temp_offset + sensor_noise
 
 
+# Grid spacing (m) of the tabulated thermocline S-curve
+THERMOCLINE_GRID_STEP = 0.01
+
+
+@functools.lru_cache(maxsize=None)
+def thermocline_drop_table(thermo_thick: float, temp_drop: float) -> array:
+    """Temperature drop through a thermocline, one entry per grid step.
+
+    Depends only on the layer's thickness and total drop, so every dive in the
+    same water shares one table. The last entry is repeated so interpolation
+    never needs a bounds check.
+    """
+    steps = max(1, round(thermo_thick / THERMOCLINE_GRID_STEP))
+    drops = array("d", (temp_drop * (1 - math.cos(k / steps * math.pi)) / 2 for k in range(steps + 1)))
+    drops.append(drops[-1])
+    return drops
+
+
+class ThermoclineField:
+    """Water temperature vs depth for one dive, without per-sample curve math.
+
+    Same layers as calculate_temperature_at_depth, minus the sensor noise,
+    which the caller adds. The surface layer and the deep gradient evaluate
+    exactly as there; the thermocline (or cenote halocline) S-curve is
+    interpolated from thermocline_drop_table, within 1e-4 °C of the cosine
+    even across the cenote's 8 °C in 3 m.
+    """
+
+    __slots__ = ("surface_temp", "temp_offset", "thermo_start", "thermo_end",
+                 "deep_temp", "deep_gradient", "drops", "scale")
+
+    def __init__(self, profile: Dict, surface_temp: float, temp_offset: float = 0.0):
+        thermo_thick = profile["thermocline_thickness"]
+        self.surface_temp = surface_temp
+        self.temp_offset = temp_offset
+        self.thermo_start = profile["thermocline_start"]
+        self.thermo_end = self.thermo_start + thermo_thick
+        self.deep_temp = surface_temp - profile["temp_drop"]
+        self.deep_gradient = profile["deep_gradient"]
+        self.drops = thermocline_drop_table(thermo_thick, profile["temp_drop"])
+        self.scale = (len(self.drops) - 2) / thermo_thick
+
+    def at(self, depth: float) -> float:
+        """Temperature in Celsius at depth, before sensor noise."""
+        if depth < self.thermo_start:
+            return self.surface_temp + self.temp_offset
+        if depth < self.thermo_end:
+            position = (depth - self.thermo_start) * self.scale
+            i = int(position)
+            drops = self.drops
+            lower = drops[i]
+            return self.surface_temp - (lower + (drops[i + 1] - lower) * (position - i)) + self.temp_offset
+        return self.deep_temp - (depth - self.thermo_end) * self.deep_gradient + self.temp_offset
+
+
 # =============================================================================
 # MARINE SPECIES BY REGION
 # =============================================================================
@@ -416,7 +494,9 @@ def get_region_for_species(site: Dict) -> str:
     return "Caribbean"  # Default fallback
 
 
-def generate_sightings(site: Dict, site_type: str, num_sightings: int = None) -> List[Dict]:
+def generate_sightings(
+    site: Dict, site_type: str, num_sightings: int = None, rng: random.Random = None
+) -> List[Dict]:
     """
     Generate realistic marine life sightings for a dive.
 
@@ -424,49 +504,51 @@ def generate_sightings(site: Dict, site_type: str, num_sightings: int = None) ->
         site: Dive site dictionary
         site_type: Type of dive site (reef, wall, wreck, etc.)
         num_sightings: Number of species to include (random if None)
+        rng: Random stream to draw from (None = the global random module)
 
     Returns:
         List of sighting dictionaries with species name and count
     """
+    rng = rng or random
     region = get_region_for_species(site)
     species_list = SPECIES_BY_REGION.get(region, SPECIES_BY_REGION["Caribbean"])
 
     if num_sightings is None:
         # Vary sightings by site type
         if site_type == "manta":
-            num_sightings = random.randint(2, 5)
+            num_sightings = rng.randint(2, 5)
         elif site_type == "cenote":
-            num_sightings = random.randint(0, 2)
+            num_sightings = rng.randint(0, 2)
         elif site_type in ["reef", "wall"]:
-            num_sightings = random.randint(3, 7)
+            num_sightings = rng.randint(3, 7)
         else:
-            num_sightings = random.randint(2, 5)
+            num_sightings = rng.randint(2, 5)
 
     sightings = []
     available_species = species_list.copy()
 
     for _ in range(min(num_sightings, len(available_species))):
         # Weighted random selection based on probability
-        candidates = [(sp, prob) for sp, prob in available_species if random.random() < prob * 2]
+        candidates = [(sp, prob) for sp, prob in available_species if rng.random() < prob * 2]
         if not candidates:
             candidates = available_species[:3]  # Fallback to most common
 
         if candidates:
             if isinstance(candidates[0], tuple):
-                species, _ = random.choice(candidates)
+                species, _ = rng.choice(candidates)
             else:
-                species = random.choice(candidates)
+                species = rng.choice(candidates)
 
             # Remove selected species to avoid duplicates
             available_species = [(s, p) for s, p in available_species if s != species]
 
             # Generate count based on species type
             if any(x in species.lower() for x in ["shark", "manta", "turtle", "whale", "seal", "lion", "iguana"]):
-                count = random.randint(1, 3)  # Large animals seen in small numbers
+                count = rng.randint(1, 3)  # Large animals seen in small numbers
             elif any(x in species.lower() for x in ["fish", "tang", "snapper", "parrot"]):
-                count = random.randint(5, 50)  # Schooling fish
+                count = rng.randint(5, 50)  # Schooling fish
             else:
-                count = random.randint(1, 8)  # Other species
+                count = rng.randint(1, 8)  # Other species
 
             sightings.append({
                 "species": species,
@@ -484,54 +566,55 @@ CURRENT_DIRECTIONS = ["north", "northEast", "east", "southEast", "south", "south
 ENTRY_METHODS = ["shore", "boat", "giantStride", "backRoll", "ladder"]
 
 
-def generate_dive_conditions(site: Dict, site_type: str) -> Dict:
+def generate_dive_conditions(site: Dict, site_type: str, rng: random.Random = None) -> Dict:
     """
     Generate realistic dive conditions based on site type and location.
 
     Returns a dictionary with visibility, current, swell, entry method, etc.
     """
+    rng = rng or random
     country = site.get("country", "")
     region = site.get("region", "")
 
     # Visibility based on region and site type
     if site_type == "cenote":
-        visibility = random.randint(25, 60)  # Crystal clear in cenotes
+        visibility = rng.randint(25, 60)  # Crystal clear in cenotes
     elif country in ["Maldives", "Egypt", "Palau"]:
-        visibility = random.randint(20, 40)  # Great tropical visibility
+        visibility = rng.randint(20, 40)  # Great tropical visibility
     elif country in ["Thailand", "Indonesia", "Malaysia"]:
-        visibility = random.randint(10, 30)  # Variable
+        visibility = rng.randint(10, 30)  # Variable
     elif country in ["USA"] and "California" in region:
-        visibility = random.randint(5, 20)  # Temperate, kelp
+        visibility = rng.randint(5, 20)  # Temperate, kelp
     else:
-        visibility = random.randint(12, 30)  # Average tropical
+        visibility = rng.randint(12, 30)  # Average tropical
 
     # Current based on site type
     if site_type == "drift":
-        current_strength = random.choice(["moderate", "strong", "strong"])
+        current_strength = rng.choice(["moderate", "strong", "strong"])
     elif site_type in ["cenote", "wreck", "shallow"]:
-        current_strength = random.choice(["none", "none", "light"])
+        current_strength = rng.choice(["none", "none", "light"])
     else:
-        current_strength = random.choice(["none", "light", "light", "moderate"])
+        current_strength = rng.choice(["none", "light", "light", "moderate"])
 
-    current_direction = random.choice(CURRENT_DIRECTIONS) if current_strength != "none" else None
+    current_direction = rng.choice(CURRENT_DIRECTIONS) if current_strength != "none" else None
 
     # Swell for ocean sites
     if site_type == "cenote" or site.get("water_type") == "freshwater":
         swell_height = 0.0
     else:
-        swell_height = random.choice([0.0, 0.3, 0.5, 0.8, 1.0, 1.2])
+        swell_height = rng.choice([0.0, 0.3, 0.5, 0.8, 1.0, 1.2])
 
     # Entry method based on site
     if site_type in ["shallow", "cenote"]:
         entry_method = "shore"
     elif site_type == "wreck":
-        entry_method = random.choice(["boat", "giantStride", "backRoll"])
+        entry_method = rng.choice(["boat", "giantStride", "backRoll"])
     elif "Pier" in site.get("name", "") or "Bridge" in site.get("name", ""):
         entry_method = "shore"
     else:
-        entry_method = random.choice(["boat", "giantStride", "backRoll", "ladder"])
+        entry_method = rng.choice(["boat", "giantStride", "backRoll", "ladder"])
 
-    exit_method = entry_method if entry_method == "shore" else random.choice([entry_method, "ladder"])
+    exit_method = entry_method if entry_method == "shore" else rng.choice([entry_method, "ladder"])
 
     # Water type from site or inferred
     water_type = site.get("water_type", "saltwater")
@@ -585,21 +668,25 @@ CHALLENGES = [
 ]
 
 
-def generate_dive_notes(site: Dict, site_type: str, sightings: List[Dict], buddy_name: str, conditions: Dict) -> str:
+def generate_dive_notes(
+    site: Dict, site_type: str, sightings: List[Dict], buddy_name: str, conditions: Dict,
+    rng: random.Random = None,
+) -> str:
     """Generate natural-sounding dive notes."""
-    template = random.choice(DIVE_NOTES_TEMPLATES)
+    rng = rng or random
+    template = rng.choice(DIVE_NOTES_TEMPLATES)
 
     # Pick a highlight species if we have sightings
     if sightings:
-        highlight_sighting = random.choice(sightings)
+        highlight_sighting = rng.choice(sightings)
         species = highlight_sighting["species"]
     else:
         species = "fish"
 
-    highlight_template = random.choice(HIGHLIGHTS)
+    highlight_template = rng.choice(HIGHLIGHTS)
     highlight = highlight_template.format(species=species)
 
-    challenge = random.choice(CHALLENGES)
+    challenge = rng.choice(CHALLENGES)
 
     notes = template.format(
         site=site.get("name", "this site"),
@@ -617,17 +704,71 @@ def generate_dive_notes(site: Dict, site_type: str, sightings: List[Dict], buddy
 # =============================================================================
 # DIVE SESSION FOR REPETITIVE DIVING
 # =============================================================================
+class TissueHistory:
+    """
+    Tissue loadings of one diving day, recorded at the end of each dive.
+
+    Rows of a flat array('d') matrix hold the 16 N2 then 16 He loadings of
+    each dive, in recording order. residual_at() finds the most recently
+    recorded dive that ended by the query time and off-gasses its row
+    analytically over the elapsed surface time, so any point of the day can be
+    queried without replaying the day's dives. (Training dives are inserted at
+    their course dates, so recording order is not always time order.)
+    """
+
+    ROW_WIDTH = 32
+
+    def __init__(self):
+        self.end_times: List[datetime] = []
+        self.loadings = array("d")
+
+    def __len__(self) -> int:
+        return len(self.end_times)
+
+    def record(self, end_time: datetime, tissue: "TissueState"):
+        """Append the loading at the end of a dive."""
+        self.end_times.append(end_time)
+        self.loadings.extend(tissue.n2_loadings)
+        self.loadings.extend(tissue.he_loadings)
+
+    def row(self, index: int) -> "TissueState":
+        """Tissue state at the end of the index-th recorded dive."""
+        start = index * self.ROW_WIDTH
+        tissue = TissueState()
+        tissue.n2_loadings = self.loadings[start:start + 16].tolist()
+        tissue.he_loadings = self.loadings[start + 16:start + self.ROW_WIDTH].tolist()
+        return tissue
+
+    def residual_at(self, when: datetime) -> "TissueState":
+        """
+        Residual tissue loading at a time on the surface.
+
+        Returns surface-saturated tissue before the first recorded dive.
+        """
+        index = next((i for i in range(len(self.end_times) - 1, -1, -1) if self.end_times[i] <= when), None)
+        if index is None:
+            return TissueState()
+        tissue = self.row(index)
+        surface_minutes = (when - self.end_times[index]).total_seconds() / 60
+        if surface_minutes > 0:
+            # Surface pressure, breathing air: one exact Schreiner step
+            tissue.update(0.0, surface_minutes * 60, 0.21, 0.0)
+        return tissue
+
+
 class DiveSession:
     """
     Tracks tissue state across multiple dives in a day for repetitive diving.
 
-    Handles surface interval off-gassing and calculates reduced NDLs for
-    subsequent dives.
+    Each dive's end loading is recorded in the day's TissueHistory; the
+    residual loading for the next dive is derived from it at that dive's start
+    time, and reduced NDLs are calculated from that residual loading.
     """
 
     def __init__(self):
         """Initialize a fresh dive session."""
         self.tissue = TissueState()
+        self.history = TissueHistory()
         self.last_dive_end: datetime = None
         self.dive_count_today = 0
         self.dives_today: List[Dict] = []
@@ -635,6 +776,7 @@ class DiveSession:
     def start_new_day(self):
         """Reset for a new diving day (after sufficient surface interval)."""
         self.tissue = TissueState()
+        self.history = TissueHistory()
         self.last_dive_end = None
         self.dive_count_today = 0
         self.dives_today = []
@@ -645,23 +787,14 @@ class DiveSession:
             return float('inf')
         return (current_time - self.last_dive_end).total_seconds() / 60
 
-    def apply_surface_interval(self, interval_minutes: float):
+    def resume_at(self, dive_start: datetime):
         """
-        Off-gas tissues during surface interval.
+        Load the residual tissue state for a dive starting at dive_start.
 
-        Tissues continue to off-gas nitrogen while on the surface,
+        Tissues keep off-gassing on the surface after the last recorded dive,
         reducing tissue loading for the next dive.
         """
-        if interval_minutes <= 0:
-            return
-
-        # Update tissues at surface pressure, breathing air
-        self.tissue.update(
-            depth=0.0,
-            time_seconds=interval_minutes * 60,
-            o2_fraction=0.21,
-            he_fraction=0.0
-        )
+        self.tissue = self.history.residual_at(dive_start)
 
     def get_adjusted_ndl(self, depth: float, gf_high: float = 0.85) -> float:
         """
@@ -672,7 +805,8 @@ class DiveSession:
         return self.tissue.ndl(depth, o2_fraction=0.21, gf_high=gf_high)
 
     def record_dive_end(self, end_time: datetime, dive_summary: Dict):
-        """Record that a dive has ended for surface interval tracking."""
+        """Record that a dive has ended, with the current tissue as its end loading."""
+        self.history.record(end_time, self.tissue)
         self.last_dive_end = end_time
         self.dive_count_today += 1
         self.dives_today.append(dive_summary)
@@ -716,6 +850,90 @@ WATER_VAPOR_PRESSURE = 0.0627
 # Surface atmospheric pressure in bar
 SURFACE_PRESSURE = 1.01325
 
+# Column views of BUHLMANN_ZHL16C, built once at import time.
+# Rate constants are k = ln(2) / half_time (per minute), computed with the same
+# expression the per-sample loops used to evaluate, so loadings are bit-identical.
+ZHL16C_K_N2 = tuple(math.log(2) / c[0] for c in BUHLMANN_ZHL16C)
+ZHL16C_K_HE = tuple(math.log(2) / c[1] for c in BUHLMANN_ZHL16C)
+ZHL16C_A_N2 = tuple(c[2] for c in BUHLMANN_ZHL16C)
+ZHL16C_B_N2 = tuple(c[3] for c in BUHLMANN_ZHL16C)
+ZHL16C_A_HE = tuple(c[4] for c in BUHLMANN_ZHL16C)
+ZHL16C_B_HE = tuple(c[5] for c in BUHLMANN_ZHL16C)
+ZHL16C_COEFFICIENTS = tuple(zip(ZHL16C_A_N2, ZHL16C_B_N2, ZHL16C_A_HE, ZHL16C_B_HE))
+
+# NDL search cap and bisection resolution, in minutes
+NDL_MAX_MINUTES = 200.0
+NDL_BISECT_TOLERANCE = 1.0 / 600  # 0.1 seconds
+NDL_BRACKET_MINUTES = 5.0
+
+# Clean-tissue NDL tables: depth grid step (m) and deepest tabulated depth (m)
+NDL_DEPTH_RESOLUTION = 0.1
+NDL_TABLE_MAX_DEPTH = 100.0
+
+
+@functools.lru_cache(maxsize=256)
+def decay_factors(time_minutes: float) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """
+    Per-compartment Schreiner decay factors e^(-k*t) for N2 and He.
+
+    The profile loop updates tissues with the same sample interval thousands of
+    times per dive, so the 32 exponentials are cached per distinct duration.
+
+    Returns:
+        Tuple of (n2_factors, he_factors), one entry per compartment
+    """
+    return (
+        tuple(math.exp(-k * time_minutes) for k in ZHL16C_K_N2),
+        tuple(math.exp(-k * time_minutes) for k in ZHL16C_K_HE),
+    )
+
+
+def max_ceiling_depth(n2_loadings: List[float], he_loadings: List[float], gf: float) -> float:
+    """
+    Deepest compartment ceiling for the given loadings, in meters (0 = surface).
+
+    Args:
+        n2_loadings: Nitrogen loading per compartment in bar
+        he_loadings: Helium loading per compartment in bar
+        gf: Gradient factor (0-1), where 1.0 = 100% of M-value
+
+    Returns:
+        Ceiling depth in meters, never negative
+    """
+    max_ceiling = 0.0
+
+    for p_n2, p_he, (a_n2, b_n2, a_he, b_he) in zip(n2_loadings, he_loadings, ZHL16C_COEFFICIENTS):
+        # Total inert gas pressure in this compartment
+        p_inert = p_n2 + p_he
+
+        if p_inert <= 0:
+            continue
+
+        # Calculate weighted a and b values for mixed gas
+        if p_he > 0.001:
+            # Weighted by gas fractions in tissue
+            he_frac = p_he / p_inert
+            n2_frac = p_n2 / p_inert
+            a = (a_n2 * n2_frac) + (a_he * he_frac)
+            b = (b_n2 * n2_frac) + (b_he * he_frac)
+        else:
+            a = a_n2
+            b = b_n2
+
+        # M-value at surface: M0 = a + (1/b) * P_ambient
+        # With gradient factor applied:
+        # Allowed P_ambient = (P_inert - a * gf) / (gf / b - gf + 1)
+        gf_adjusted = gf / b - gf + 1
+        if gf_adjusted > 0:
+            p_ceiling = (p_inert - a * gf) / gf_adjusted
+
+            # Convert pressure to depth
+            ceiling_depth = (p_ceiling - SURFACE_PRESSURE) * 10.0
+            if ceiling_depth > max_ceiling:
+                max_ceiling = ceiling_depth
+
+    return max_ceiling
+
 
 class TissueState:
     """
@@ -723,6 +941,11 @@ class TissueState:
 
     Tracks nitrogen and helium loading in 16 tissue compartments and calculates
     the decompression ceiling based on gradient factors.
+
+    Loadings are held as flat per-compartment lists and updated with whole-list
+    expressions over the precomputed ZHL16C_* columns and cached decay factors.
+    Results are bit-identical to evaluating the Schreiner equation compartment
+    by compartment (tolerance 0.0; the tests allow 1e-12 bar).
     """
 
     def __init__(self):
@@ -752,75 +975,138 @@ class TissueState:
         pp_n2_inspired = inspired_pressure * n2_fraction
         pp_he_inspired = inspired_pressure * he_fraction
 
-        time_minutes = time_seconds / 60.0
+        n2_factors, he_factors = decay_factors(time_seconds / 60.0)
 
-        for i, compartment in enumerate(BUHLMANN_ZHL16C):
-            ht_n2, ht_he, _, _, _, _ = compartment
+        # Schreiner equation: P_tissue = P_inspired + (P_tissue_0 - P_inspired) * e^(-t/tau)
+        self.n2_loadings = [
+            pp_n2_inspired + (p - pp_n2_inspired) * f
+            for p, f in zip(self.n2_loadings, n2_factors)
+        ]
 
-            # Schreiner equation: P_tissue = P_inspired + (P_tissue_0 - P_inspired) * e^(-t/tau)
-            # where tau = half_time / ln(2)
+        if he_fraction > 0:
+            self.he_loadings = [
+                pp_he_inspired + (p - pp_he_inspired) * f
+                for p, f in zip(self.he_loadings, he_factors)
+            ]
+        else:
+            # Off-gassing helium while breathing non-helium mix
+            self.he_loadings = [
+                p * f if p > 0.001 else p
+                for p, f in zip(self.he_loadings, he_factors)
+            ]
 
-            # Nitrogen loading
-            k_n2 = math.log(2) / ht_n2
-            self.n2_loadings[i] = pp_n2_inspired + (self.n2_loadings[i] - pp_n2_inspired) * math.exp(-k_n2 * time_minutes)
+    def update_segment(self, depths, time_seconds: float, o2_fraction: float, he_fraction: float):
+        """
+        Apply update() once per depth, in order, for a run of equally spaced
+        samples breathed on one gas.
 
-            # Helium loading (only if breathing helium mix)
-            if he_fraction > 0:
-                k_he = math.log(2) / ht_he
-                self.he_loadings[i] = pp_he_inspired + (self.he_loadings[i] - pp_he_inspired) * math.exp(-k_he * time_minutes)
-            elif self.he_loadings[i] > 0.001:
-                # Off-gassing helium while breathing non-helium mix
-                k_he = math.log(2) / ht_he
-                self.he_loadings[i] = self.he_loadings[i] * math.exp(-k_he * time_minutes)
+        Loops compartment by compartment instead of sample by sample, so a
+        segment costs no per-sample list allocations. Results are identical to
+        calling update() for each depth.
 
-    def ceiling(self, gf: float = 1.0) -> float:
+        Args:
+            depths: Depth in meters of each sample
+            time_seconds: Time spent at each depth in seconds
+            o2_fraction: Oxygen fraction in breathing gas (0-1)
+            he_fraction: Helium fraction in breathing gas (0-1)
         """
-        Calculate the current decompression ceiling depth.
+        if not depths:
+            return
 
-        Args:
-            gf: Gradient factor (0-1), where 1.0 = 100% of M-value
+        # Same operation order as update(), so every step rounds identically
+        inspired = [SURFACE_PRESSURE + (depth / 10.0) - WATER_VAPOR_PRESSURE for depth in depths]
+        n2_fraction = 1.0 - o2_fraction - he_fraction
+        n2_factors, he_factors = decay_factors(time_seconds / 60.0)
+
+        pp_n2 = [p * n2_fraction for p in inspired]
+        n2_loadings = []
+        for p, f in zip(self.n2_loadings, n2_factors):
+            for pp in pp_n2:
+                p = pp + (p - pp) * f
+            n2_loadings.append(p)
+        self.n2_loadings = n2_loadings
+
+        he_loadings = []
+        if he_fraction > 0:
+            pp_he = [p * he_fraction for p in inspired]
+            for p, f in zip(self.he_loadings, he_factors):
+                for pp in pp_he:
+                    p = pp + (p - pp) * f
+                he_loadings.append(p)
+        else:
+            steps = len(depths)
+            for p, f in zip(self.he_loadings, he_factors):
+                for _ in range(steps):
+                    if p <= 0.001:
+                        break
+                    p = p * f
+                he_loadings.append(p)
+        self.he_loadings = he_loadings
 
-        Returns:
-            Ceiling depth in meters (0 = surface is safe)
+    def update_linear(
+        self, start_depth: float, end_depth: float, time_seconds: float, o2_fraction: float, he_fraction: float
+    ):
         """
-        max_ceiling = 0.0
-
-        for i, compartment in enumerate(BUHLMANN_ZHL16C):
-            _, _, a_n2, b_n2, a_he, b_he = compartment
+        Update tissue loadings for a constant-rate depth change on one gas.
 
-            # Total inert gas pressure in this compartment
-            p_inert = self.n2_loadings[i] + self.he_loadings[i]
+        Closed-form Schreiner equation: with the inspired pressure starting at
+        Pi and changing at R bar/min,
+            P(t) = Pi + R * (t - 1/k) - (Pi - P0 - R/k) * e^(-k*t)
+        so a whole descent, ascent leg or level costs one step however many
+        samples it spans. A level (start_depth == end_depth) reduces to
+        update().
 
-            if p_inert <= 0:
-                continue
+        Args:
+            start_depth: Depth in meters at the start of the segment
+            end_depth: Depth in meters at the end of the segment
+            time_seconds: Duration of the segment in seconds
+            o2_fraction: Oxygen fraction in breathing gas (0-1)
+            he_fraction: Helium fraction in breathing gas (0-1)
+        """
+        minutes = time_seconds / 60.0
+        if minutes <= 0:
+            return
+        inspired = SURFACE_PRESSURE + (start_depth / 10.0) - WATER_VAPOR_PRESSURE
+        rate = (end_depth - start_depth) / 10.0 / minutes
+        n2_fraction = 1.0 - o2_fraction - he_fraction
+        n2_factors, he_factors = decay_factors(minutes)
 
-            # Calculate weighted a and b values for mixed gas
-            if self.he_loadings[i] > 0.001:
-                # Weighted by gas fractions in tissue
-                he_frac = self.he_loadings[i] / p_inert
-                n2_frac = self.n2_loadings[i] / p_inert
-                a = (a_n2 * n2_frac) + (a_he * he_frac)
-                b = (b_n2 * n2_frac) + (b_he * he_frac)
-            else:
-                a = a_n2
-                b = b_n2
+        pi, r = inspired * n2_fraction, rate * n2_fraction
+        self.n2_loadings = [
+            pi + r * (minutes - 1 / k) - (pi - p - r / k) * f
+            for p, k, f in zip(self.n2_loadings, ZHL16C_K_N2, n2_factors)
+        ]
 
-            # M-value at surface: M0 = a + (1/b) * P_ambient
-            # Ceiling: P_ambient_min = (P_tissue - a * gf) / (gf / b - gf + 1)
-            # Simplified: P_ceiling = (P_tissue - a * gf) * b / gf
-            # Then convert to depth
+        if he_fraction > 0:
+            pi, r = inspired * he_fraction, rate * he_fraction
+            self.he_loadings = [
+                pi + r * (minutes - 1 / k) - (pi - p - r / k) * f
+                for p, k, f in zip(self.he_loadings, ZHL16C_K_HE, he_factors)
+            ]
+        else:
+            self.he_loadings = [
+                p * f if p > 0.001 else p
+                for p, f in zip(self.he_loadings, he_factors)
+            ]
+
+    def copy(self) -> "TissueState":
+        """Independent copy of the current loadings."""
+        clone = TissueState.__new__(TissueState)
+        clone.n2_loadings = list(self.n2_loadings)
+        clone.he_loadings = list(self.he_loadings)
+        return clone
 
-            # With gradient factor applied:
-            # Allowed P_ambient = (P_inert - a * gf) / (gf / b - gf + 1)
-            gf_adjusted = gf / b - gf + 1
-            if gf_adjusted > 0:
-                p_ceiling = (p_inert - a * gf) / gf_adjusted
+    def ceiling(self, gf: float = 1.0) -> float:
+        """
+        Calculate the current decompression ceiling depth.
 
-                # Convert pressure to depth
-                ceiling_depth = (p_ceiling - SURFACE_PRESSURE) * 10.0
-                max_ceiling = max(max_ceiling, ceiling_depth)
+        Args:
+            gf: Gradient factor (0-1), where 1.0 = 100% of M-value
 
-        return max(0.0, max_ceiling)
+        Returns:
+            Ceiling depth in meters (0 = surface is safe)
+        """
+        return max_ceiling_depth(self.n2_loadings, self.he_loadings, gf)
 
     def gf_ceiling(self, gf_low: float, gf_high: float, current_depth: float, first_stop_depth: float = None) -> float:
         """
@@ -858,66 +1144,178 @@ class TissueState:
 
         return self.ceiling(effective_gf)
 
-    def ndl(self, depth: float, o2_fraction: float = 0.21, he_fraction: float = 0.0, gf_high: float = 0.85) -> float:
+    def ndl(
+        self,
+        depth: float,
+        o2_fraction: float = 0.21,
+        he_fraction: float = 0.0,
+        gf_high: float = 0.85,
+        exact: bool = False,
+    ) -> float:
         """
         Calculate No Decompression Limit at a given depth.
 
+        At constant depth each compartment follows the Schreiner curve, so the
+        time at which it reaches its GF-high M-value is solved in closed form.
+        Tissues carrying helium (or breathing it) weight a/b by the changing
+        N2/He ratio, so those fall back to a bisection over the closed-form
+        loadings instead.
+
         Args:
             depth: Target depth in meters
             o2_fraction: O2 fraction in breathing gas
             he_fraction: He fraction in breathing gas
             gf_high: Gradient factor for ceiling calculation
+            exact: Return fractional minutes (sub-second precision) instead of
+                whole minutes
 
         Returns:
-            NDL in minutes (time until deco is required)
+            NDL in minutes (time until deco is required), capped at 200. Whole
+            minutes match the previous 1-minute forward simulation: the last
+            whole minute after which the ceiling is still at the surface.
         """
-        # Create a copy to simulate without affecting current state
-        sim_n2 = self.n2_loadings.copy()
-        sim_he = self.he_loadings.copy()
-
         ambient_pressure = SURFACE_PRESSURE + (depth / 10.0)
         inspired_pressure = ambient_pressure - WATER_VAPOR_PRESSURE
         n2_fraction = 1.0 - o2_fraction - he_fraction
         pp_n2_inspired = inspired_pressure * n2_fraction
         pp_he_inspired = inspired_pressure * he_fraction
 
-        ndl_minutes = 0.0
-        time_step = 1.0  # 1 minute steps
-
-        while ndl_minutes < 200:  # Max 200 minutes
-            # Update simulated tissue loadings
-            for i, compartment in enumerate(BUHLMANN_ZHL16C):
-                ht_n2, ht_he, _, _, _, _ = compartment
-                k_n2 = math.log(2) / ht_n2
-                sim_n2[i] = pp_n2_inspired + (sim_n2[i] - pp_n2_inspired) * math.exp(-k_n2 * time_step)
-                if he_fraction > 0:
-                    k_he = math.log(2) / ht_he
-                    sim_he[i] = pp_he_inspired + (sim_he[i] - pp_he_inspired) * math.exp(-k_he * time_step)
-
-            # Check if any compartment requires deco
-            for i, compartment in enumerate(BUHLMANN_ZHL16C):
-                _, _, a_n2, b_n2, a_he, b_he = compartment
-                p_inert = sim_n2[i] + sim_he[i]
-                if p_inert > 0:
-                    if sim_he[i] > 0.001:
-                        he_frac = sim_he[i] / p_inert
-                        n2_frac = sim_n2[i] / p_inert
-                        a = (a_n2 * n2_frac) + (a_he * he_frac)
-                        b = (b_n2 * n2_frac) + (b_he * he_frac)
-                    else:
-                        a = a_n2
-                        b = b_n2
+        if he_fraction > 0 or any(p > 0.001 for p in self.he_loadings):
+            return self._ndl_bisect(pp_n2_inspired, pp_he_inspired, he_fraction > 0, gf_high, exact)
+
+        # Pure-N2 a/b: compartment i needs deco once
+        #   P_n2(t) + P_he > a*gf + SURFACE_PRESSURE * (gf/b - gf + 1)
+        # with P_n2(t) = Pi + (P0 - Pi) * e^(-k*t), giving t = -ln((limit - Pi) / (P0 - Pi)) / k.
+        ndl_minutes = NDL_MAX_MINUTES
+        for p0, p_he, k, (a, b, _, _) in zip(self.n2_loadings, self.he_loadings, ZHL16C_K_N2, ZHL16C_COEFFICIENTS):
+            gf_adjusted = gf_high / b - gf_high + 1
+            if gf_adjusted <= 0:
+                continue
+            limit = a * gf_high + SURFACE_PRESSURE * gf_adjusted - p_he
+            if p0 > limit:
+                # Already past the M-value; the first 1-minute check fails
+                # unless the compartment off-gasses below it within that minute.
+                if pp_n2_inspired >= limit:
+                    return 0.0
+                clear_time = -math.log((limit - pp_n2_inspired) / (p0 - pp_n2_inspired)) / k
+                if exact or clear_time > 1.0:
+                    return 0.0
+            elif pp_n2_inspired > limit:
+                cross_time = -math.log((limit - pp_n2_inspired) / (p0 - pp_n2_inspired)) / k
+                ndl_minutes = min(ndl_minutes, cross_time if exact else float(math.floor(cross_time)))
+
+        return ndl_minutes
+
+    def _ndl_bisect(
+        self,
+        pp_n2_inspired: float,
+        pp_he_inspired: float,
+        breathing_he: bool,
+        gf_high: float,
+        exact: bool,
+    ) -> float:
+        """Bisection NDL search over closed-form loadings for mixed N2/He tissues."""
+
+        def requires_deco(minutes: float) -> bool:
+            n2_factors, he_factors = decay_factors(minutes)
+            sim_n2 = [pp_n2_inspired + (p - pp_n2_inspired) * f for p, f in zip(self.n2_loadings, n2_factors)]
+            if breathing_he:
+                sim_he = [pp_he_inspired + (p - pp_he_inspired) * f for p, f in zip(self.he_loadings, he_factors)]
+            else:
+                sim_he = self.he_loadings
+            return max_ceiling_depth(sim_n2, sim_he, gf_high) > 0
+
+        # Helium weighting can make the ceiling rise and fall again, so bracket
+        # the first crossing on a coarse grid before bisecting inside it.
+        low = NDL_BISECT_TOLERANCE if exact else 1.0
+        if requires_deco(low):
+            return 0.0
+        high = None
+        while low < NDL_MAX_MINUTES:
+            candidate = min(NDL_MAX_MINUTES, math.floor(low / NDL_BRACKET_MINUTES + 1) * NDL_BRACKET_MINUTES)
+            if requires_deco(candidate):
+                high = candidate
+                break
+            low = candidate
+        if high is None:
+            return NDL_MAX_MINUTES
+
+        if exact:
+            while high - low > NDL_BISECT_TOLERANCE:
+                mid = (low + high) / 2
+                if requires_deco(mid):
+                    high = mid
+                else:
+                    low = mid
+            return low
+
+        # Whole minutes: the first minute m that needs deco gives NDL m - 1
+        low, high = int(low), int(high)
+        while high - low > 1:
+            mid = (low + high) // 2
+            if requires_deco(float(mid)):
+                high = mid
+            else:
+                low = mid
+        return float(high - 1)
+
+
+class NdlTable:
+    """
+    NDLs for surface-saturated tissue on a 0.1 m depth grid.
+
+    One table covers one gas (any GAS_MIXES entry) at one GF high; GF low does
+    not affect the no-deco limit. Whole-minute lookups return exactly what
+    TissueState.ndl returns; fractional ones interpolate linearly between grid
+    depths. Depths past NDL_TABLE_MAX_DEPTH are solved directly.
+    """
 
-                    gf_adjusted = gf_high / b - gf_high + 1
-                    if gf_adjusted > 0:
-                        p_ceiling = (p_inert - a * gf_high) / gf_adjusted
-                        ceiling_depth = (p_ceiling - SURFACE_PRESSURE) * 10.0
-                        if ceiling_depth > 0:
-                            return ndl_minutes
+    def __init__(self, o2_fraction: float, he_fraction: float, gf_high: float):
+        self.o2_fraction = o2_fraction
+        self.he_fraction = he_fraction
+        self.gf_high = gf_high
+        surface = TissueState()
+        depths = [
+            step * NDL_DEPTH_RESOLUTION for step in range(int(round(NDL_TABLE_MAX_DEPTH / NDL_DEPTH_RESOLUTION)) + 1)
+        ]
+        self._ndl = [surface.ndl(depth, o2_fraction, he_fraction, gf_high, exact=True) for depth in depths]
+        self._ndl_minutes = [surface.ndl(depth, o2_fraction, he_fraction, gf_high) for depth in depths]
+
+    def lookup(self, depth: float, exact: bool = False) -> float:
+        """
+        NDL at depth for clean tissue.
 
-            ndl_minutes += time_step
+        Args:
+            depth: Depth in meters
+            exact: Return fractional minutes instead of whole minutes
 
-        return 200.0  # Max NDL
+        Returns:
+            NDL in minutes. Whole minutes equal TissueState().ndl(depth);
+            fractional minutes are within 1.5% of the exact solve (the
+            error peaks where the 200-minute cap kinks the curve).
+        """
+        if depth >= NDL_TABLE_MAX_DEPTH:
+            return TissueState().ndl(depth, self.o2_fraction, self.he_fraction, self.gf_high, exact)
+        position = max(0.0, depth) / NDL_DEPTH_RESOLUTION
+        step = int(position)
+        fraction = position - step
+        if exact:
+            value = self._ndl[step]
+            if fraction > 0:
+                value += (self._ndl[step + 1] - value) * fraction
+            return value
+        # NDL only shortens with depth, so the answer lies between the grid
+        # depths on either side; solve directly only when they disagree
+        shallower = self._ndl_minutes[step]
+        if fraction == 0 or shallower == self._ndl_minutes[step + 1]:
+            return shallower
+        return TissueState().ndl(depth, self.o2_fraction, self.he_fraction, self.gf_high)
+
+
+@functools.lru_cache(maxsize=None)
+def get_ndl_table(o2_fraction: float, he_fraction: float = 0.0, gf_high: float = 0.85) -> NdlTable:
+    """Shared NdlTable for a gas and GF high, built on first use."""
+    return NdlTable(o2_fraction, he_fraction, gf_high)
 
 
 def ease_in_out_cubic(t: float) -> float:
@@ -969,6 +1367,41 @@ class PerlinNoise:
         u = self._fade(xf)
         return d0 + u * (d1 - d0)
 
+    def noise_batch(self, xs) -> array:
+        """Return noise at every position in xs, equal to [noise(x) for x in xs].
+
+        The table lookups and fade are inlined so a whole track costs one
+        Python loop instead of a method call (plus a _fade call) per value.
+        """
+        perm = self._perm
+        gradients = self._gradients
+        size = self._size
+        floor = math.floor
+        values = array("d")
+        append = values.append
+        for x in xs:
+            x_floor = floor(x)
+            xi = int(x_floor) % size
+            xf = x - x_floor
+            d0 = gradients[perm[xi]] * xf
+            d1 = gradients[perm[xi + 1]] * (xf - 1)
+            u = xf * xf * xf * (xf * (xf * 6 - 15) + 10)
+            append(d0 + u * (d1 - d0))
+        return values
+
+    def track(self, frequency: float, sample_interval: int, num_samples: int) -> array:
+        """Pre-render noise(t * frequency) for sample times t = 0, sample_interval, ...
+
+        Args:
+            frequency: Noise cycles per second of dive time
+            sample_interval: Seconds between samples
+            num_samples: Number of samples to render
+
+        Returns:
+            Values indexed by sample number
+        """
+        return self.noise_batch(t * frequency for t in range(0, num_samples * sample_interval, sample_interval))
+
 
 class DiverPersonality:
     """Per-dive randomized diver behavior parameters.
@@ -982,12 +1415,13 @@ class DiverPersonality:
         self.activity_level = max(0.0, min(1.0, activity_level))
 
     @staticmethod
-    def generate(dive_number: int, total_dives: int) -> "DiverPersonality":
+    def generate(dive_number: int, total_dives: int, rng: random.Random = None) -> "DiverPersonality":
         """Generate personality with skill trending upward over career."""
+        rng = rng or random
         progress = dive_number / max(1, total_dives)
         base_skill = 0.2 + progress * 0.7
-        skill = base_skill + random.uniform(-0.1, 0.1)
-        activity = random.uniform(0.2, 0.9)
+        skill = base_skill + rng.uniform(-0.1, 0.1)
+        activity = rng.uniform(0.2, 0.9)
         return DiverPersonality(skill_level=skill, activity_level=activity)
 
     @property
@@ -1155,11 +1589,43 @@ def apply_micro_event(event: Dict, current_time: float) -> float:
     return event["depth_offset"] * envelope
 
 
+class MicroEventTimeline:
+    """A depth level's micro-events as time windows, for a forward-moving sample loop.
+
+    active() returns only the events whose window contains the query time, in
+    their original order. Inactive events contribute exactly 0.0, so summing
+    apply_micro_event over the active ones gives the same depth as summing
+    over all of them. Query times must not decrease.
+    """
+
+    def __init__(self, events: List[Dict]):
+        self._queue = sorted(enumerate(events), key=lambda item: item[1]["start_time"])
+        self._next = 0
+        self._active = []
+
+    def active(self, current_time: float) -> List[Dict]:
+        """Events in progress at current_time."""
+        started = False
+        while self._next < len(self._queue) and self._queue[self._next][1]["start_time"] <= current_time:
+            self._active.append(self._queue[self._next])
+            self._next += 1
+            started = True
+        if started:
+            self._active.sort(key=lambda item: item[0])
+        if self._active:
+            self._active = [
+                item for item in self._active
+                if current_time <= item[1]["start_time"] + item[1]["duration"]
+            ]
+        return [event for _, event in self._active]
+
+
 def calculate_gas_duration(
     max_depth: float,
     tank_configs: List[Dict],
     is_tech: bool = False,
-    reserve_fraction: float = 0.25
+    reserve_fraction: float = 0.25,
+    rng: random.Random = None,
 ) -> float:
     """
     Calculate maximum dive duration based on available gas supply.
@@ -1169,10 +1635,12 @@ def calculate_gas_duration(
         tank_configs: List of tank configurations
         is_tech: Whether this is a technical dive
         reserve_fraction: Fraction of gas to keep as reserve (default 25%)
+        rng: Random stream to draw from (None = the global random module)
 
     Returns:
         Maximum dive duration in minutes
     """
+    rng = rng or random
     # Sum up total available gas from main tanks
     main_tanks = [tc for tc in tank_configs if tc.get("role", "main") == "main"]
     total_gas_liters = sum(
@@ -1192,7 +1660,7 @@ def calculate_gas_duration(
 
     # SAC rate (liters per minute at surface)
     # Tech divers typically have better air consumption
-    base_sac = random.uniform(14, 17) if is_tech else random.uniform(16, 20)
+    base_sac = rng.uniform(14, 17) if is_tech else rng.uniform(16, 20)
 
     # Account for descent (higher consumption) and ascent (lower consumption)
     # Average consumption rate including all phases
@@ -1623,17 +2091,19 @@ PADI_COURSES = [
 ]
 
 
-def generate_training_dives(course: Dict, dive_start_index: int) -> List[Dict]:
+def generate_training_dives(course: Dict, dive_start_index: int, rng: random.Random = None) -> List[Dict]:
     """Generate training dive metadata for a course.
 
     Args:
         course: Course dict from PADI_COURSES.
         dive_start_index: Starting index for dive numbering.
+        rng: Random stream to draw from (None = the global random module).
 
     Returns:
         List of training dive dicts with datetime, max_depth, duration,
         site_type, skill_level, course_id.
     """
+    rng = rng or random
     cert = next(c for c in PADI_CERTIFICATIONS if c["id"] == course["certification_id"])
     completion_date = datetime.strptime(cert["date"], "%Y-%m-%d")
     start_date = completion_date - timedelta(days=course["course_duration_days"])
@@ -1653,15 +2123,15 @@ def generate_training_dives(course: Dict, dive_start_index: int) -> List[Dict]:
 
         if adventure_dives and i < len(adventure_dives):
             adv = adventure_dives[i]
-            max_depth = random.uniform(adv["min_depth"], adv["max_depth"])
-            duration = random.randint(*adv["duration_range"])
+            max_depth = rng.uniform(adv["min_depth"], adv["max_depth"])
+            duration = rng.randint(*adv["duration_range"])
             site_type = adv["site_type"]
         else:
-            max_depth = random.uniform(course["min_depth"], course["max_depth"])
-            duration = random.randint(*course["dive_duration_range"])
+            max_depth = rng.uniform(course["min_depth"], course["max_depth"])
+            duration = rng.randint(*course["dive_duration_range"])
             site_type = course["site_type"]
 
-        skill = random.uniform(*course["skill_level_range"])
+        skill = rng.uniform(*course["skill_level_range"])
 
         dives.append({
             "datetime": dive_datetime,
@@ -1979,83 +2449,75 @@ def calculate_mod(o2_fraction: float, max_ppo2: float = 1.4) -> float:
     return ((max_ppo2 / o2_fraction) - 1) * 10
 
 
-def generate_dive_profile(
-    max_depth: float,
-    duration_minutes: int,
-    surface_temp: float,
-    bottom_temp: float,
-    tank_configs: List[Dict],
-    is_tech: bool = False,
-    gf_low: float = 0.35,
-    gf_high: float = 0.85,
-    site_type: str = "reef",
-    thermocline_profile: Dict = None,
-    tissue_state: TissueState = None,
-    sample_interval: int = 5,
-    temp_offset: float = 0.0,
-    personality: "DiverPersonality" = None,
-) -> Tuple[List[Dict], List[Dict], TissueState]:
-    """Generate realistic depth, temperature, and pressure profiles using Bühlmann ZHL-16C.
-
-    Features:
-    - Smooth curved descent/ascent using easing functions
-    - Multi-level profiles for recreational dives
-    - Site-specific depth patterns (wall, wreck, drift, reef, cenote, manta, shallow)
-    - Thermocline temperature modeling with smooth transitions
-    - Tissue compartment tracking with gradient factor support
-    - Proper deco ceiling respect during ascent
-    - Realistic gas consumption that won't exceed available supply
-    - Optional tissue state input for repetitive diving
-
-    Site-specific patterns:
-    - wall: Steep descent to max depth, hug wall with minimal horizontal movement
-    - wreck: Descend to deck, explore exterior/interior at various levels
-    - drift: Gradual depth changes following current, less precise depth control
-    - cenote: Sharp thermocline, layer exploration
-    - manta: Hover at cleaning station depth (12-18m), minimal movement
-    - shallow: Stay in 3-10m range, extended bottom times
-
-    Consumption patterns by configuration:
-    - Single tank: straightforward consumption
-    - Sidemount: alternate between tanks every ~15-20 bar for balance
-    - Doubles (manifolded): consume both tanks equally
-    - Staged deco: use bottom gas until ascent, then switch to appropriate deco gas based on MOD
+class DiveProfile:
+    """Columnar dive profile samples.
 
-    Returns:
-        Tuple of (profile_points, gas_switches, final_tissue_state)
+    Parallel typed arrays for time (s), depth (m) and temperature (K), plus one
+    pressure column (Pa) per tank, so tank_pressures is a tanks x samples
+    matrix. About 8 bytes per value instead of a dict per sample and per tank
+    reading.
     """
 
-    profile_points = []
-    total_seconds = duration_minutes * 60
+    __slots__ = ("divetime", "depth", "temperature", "tank_pressures")
+
+    def __init__(self, num_tanks: int):
+        self.divetime = array("l")
+        self.depth = array("d")
+        self.temperature = array("d")
+        self.tank_pressures = [array("l") for _ in range(num_tanks)]
+
+    def __len__(self) -> int:
+        return len(self.divetime)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DiveProfile):
+            return NotImplemented
+        return (
+            self.divetime == other.divetime
+            and self.depth == other.depth
+            and self.temperature == other.temperature
+            and self.tank_pressures == other.tank_pressures
+        )
 
-    # Create personality if not provided
-    if personality is None:
-        personality = DiverPersonality(skill_level=0.5, activity_level=0.5)
+    def append(self, divetime: int, depth: float, temperature: float, tank_states: List[Dict]):
+        """Record one sample, reading each tank's current_pressure."""
+        self.divetime.append(divetime)
+        self.depth.append(depth)
+        self.temperature.append(temperature)
+        for column, ts in zip(self.tank_pressures, tank_states):
+            column.append(int(ts["current_pressure"]))
 
-    # Create Perlin noise generator for this dive
-    perlin = PerlinNoise(seed=random.randint(0, 100000))
+    def append_row(self, divetime: int, depth: float, temperature: float, pressures: Tuple[float, ...]):
+        """Record one sample from per-tank pressures (Pa)."""
+        self.divetime.append(divetime)
+        self.depth.append(depth)
+        self.temperature.append(temperature)
+        for column, pressure in zip(self.tank_pressures, pressures):
+            column.append(int(pressure))
 
-    # Breathing parameters for this dive
-    breath_rate = 18 - personality.skill_level * 6 + random.uniform(-1, 1)
+    def rows(self) -> Iterator[Tuple[int, float, float, Tuple[int, ...]]]:
+        """Iterate samples as (divetime, depth, temperature, tank_pressures)."""
+        pressures = zip(*self.tank_pressures) if self.tank_pressures else itertools.repeat(())
+        return zip(self.divetime, self.depth, self.temperature, pressures)
 
-    # Depth target variety: +/- 5-10% jitter on actual max depth
-    depth_jitter = random.uniform(-0.10, 0.05)
-    max_depth = max_depth * (1.0 + depth_jitter)
-    max_depth = max(5, max_depth)
 
-    # Descent/ascent rates
-    descent_rate = random.uniform(*personality.descent_rate_range)
-    ascent_rate = personality.ascent_rate
+# Width (m) of the Perlin depth band around a level, by site type (default 2 m)
+SITE_DEPTH_BANDS = {"wall": 1.0, "manta": 0.5, "drift": 3.0, "wreck": 1.5}
 
-    # Calculate phase durations
-    descent_time_seconds = (max_depth / descent_rate) * 60
-    safety_stop_depth = 5
-    safety_stop_duration = 180  # 3 minutes
 
-    # Determine tank configuration type
-    config_type = get_tank_config_type(tank_configs)
+def init_tank_states(
+    tank_configs: List[Dict], personality: "DiverPersonality", is_tech: bool, config_type: str
+) -> List[Dict]:
+    """
+    Starting pressure, SAC rate and gas of each tank for one dive.
 
-    # Initialize tank states with realistic SAC rates
+    Manifolded doubles share one starting pressure and SAC rate; every other
+    tank draws its own.
+
+    Returns:
+        One dict per tank with start/current pressure (Pa), sac_rate, role,
+        mix_id, o2, he, mod and volume
+    """
     tank_states = []
     base_sac = personality.base_sac if not is_tech else random.uniform(12, 15)
 
@@ -2085,40 +2547,18 @@ def generate_dive_profile(
             "mod": mod,
             "volume": tank["volume"],
         })
+    return tank_states
 
-    # Initialize tissue state for decompression tracking
-    # If tissue_state is provided (repetitive diving), use it; otherwise create fresh
-    if tissue_state is not None:
-        tissue = tissue_state
-    else:
-        tissue = TissueState()
-
-    # Get primary gas mix for tissue calculations
-    main_tank_indices = [i for i, tc in enumerate(tank_configs) if tc.get("role") == "main"]
-    stage_tank_indices = [i for i, tc in enumerate(tank_configs) if tc.get("role") == "stage"]
-
-    if main_tank_indices:
-        primary_gas = tank_states[main_tank_indices[0]]
-    else:
-        primary_gas = tank_states[0] if tank_states else {"o2": 0.21, "he": 0.0}
-
-    # Sidemount tracking
-    sidemount_active_tank = 0
-    sidemount_switch_threshold = random.uniform(12, 18)
-    last_sidemount_switch_pressure = tank_states[main_tank_indices[0]]["current_pressure"] if main_tank_indices else 0
 
-    # Gas switches tracking
-    gas_switches = []
-    active_stage_tank = None
-    current_gas = primary_gas
+def site_level_depths(site_type: str, max_depth: float, is_tech: bool) -> List[float]:
+    """
+    Depths of the levels a dive works through at a site, in dive order.
 
-    # Sort stage tanks by O2 content (lower O2 first for deeper use)
-    stage_tank_indices_sorted = sorted(
-        stage_tank_indices,
-        key=lambda i: tank_states[i]["o2"]
-    )
+    Site-specific patterns are described in generate_dive_profile.
 
-    # Generate site-specific depth profiles
+    Returns:
+        At least one level depth in meters
+    """
     level_depths = []
 
     if site_type == "wall":
@@ -2181,50 +2621,208 @@ def generate_dive_profile(
     # Ensure we have at least one level
     if not level_depths:
         level_depths = [max_depth]
+    return level_depths
 
-    current_time = 0
-    current_depth = 0.0
-    dive_phase = "descent"  # descent, bottom, ascent
-    level_index = 0
-    level_start_time = descent_time_seconds
-    first_stop_depth = None  # Track for GF slope calculation
-    safety_stop_start_time = None  # Track when safety stop begins
 
-    # Calculate approximate bottom time per level
-    estimated_ascent_time = (max_depth / ascent_rate) * 60 + safety_stop_duration
-    available_bottom_time = total_seconds - descent_time_seconds - estimated_ascent_time
-    time_per_level = max(60, available_bottom_time / len(level_depths))
+def split_bottom_time(level_depths: List[float], available_bottom_time: float) -> List[float]:
+    """
+    Share the bottom time between levels: half to the first, 30% to the
+    second and the rest split evenly, each jittered by +/-10%.
 
-    # Pre-compute level durations (deeper levels get more time)
-    if len(level_depths) > 1:
-        level_weights = []
-        for li in range(len(level_depths)):
-            if li == 0:
-                level_weights.append(0.5)
-            elif li == 1:
-                level_weights.append(0.3)
-            else:
-                level_weights.append(0.2 / max(1, len(level_depths) - 2))
-        total_weight = sum(level_weights)
-        level_weights = [w / total_weight for w in level_weights]
-        level_durations = [
-            available_bottom_time * level_weights[i] * random.uniform(0.9, 1.1)
-            for i in range(len(level_depths))
-        ]
-    else:
-        level_durations = [available_bottom_time]
+    Returns:
+        Seconds per level
+    """
+    if len(level_depths) == 1:
+        return [available_bottom_time]
+    level_weights = []
+    for li in range(len(level_depths)):
+        if li == 0:
+            level_weights.append(0.5)
+        elif li == 1:
+            level_weights.append(0.3)
+        else:
+            level_weights.append(0.2 / max(1, len(level_depths) - 2))
+    total_weight = sum(level_weights)
+    level_weights = [w / total_weight for w in level_weights]
+    return [
+        available_bottom_time * level_weights[i] * random.uniform(0.9, 1.1)
+        for i in range(len(level_depths))
+    ]
 
-    # Pre-generate equalization pauses for descent
-    eq_pauses = []
-    num_eq_pauses = personality.eq_pause_count
-    if num_eq_pauses > 0 and descent_time_seconds > 20:
-        for i in range(num_eq_pauses):
-            pause_depth = random.uniform(3, 9)
-            pause_progress = pause_depth / (level_depths[0] if level_depths else max_depth)
-            pause_start = pause_progress * descent_time_seconds
-            pause_dur = random.uniform(3, 8)
-            eq_pauses.append((pause_depth, pause_start, pause_dur))
-    personality._eq_pauses = eq_pauses
+
+def adjust_micro_events_for_site(all_level_events: List[List[Dict]], site_type: str):
+    """
+    Tune each level's micro-events to the site in place: fewer on walls,
+    small and rare at manta stations, long and gentle in drifts, short
+    around wrecks.
+    """
+    if site_type == "wall":
+        for events in all_level_events:
+            while len(events) > 2:
+                events.pop()
+    elif site_type == "manta":
+        for events in all_level_events:
+            while len(events) > 1:
+                events.pop()
+            for e in events:
+                e["depth_offset"] *= 0.3
+    elif site_type == "drift":
+        for events in all_level_events:
+            for e in events:
+                e["duration"] = max(e["duration"], 60)
+                e["depth_offset"] *= 0.7
+    elif site_type == "wreck":
+        for events in all_level_events:
+            for e in events:
+                e["duration"] = max(15, e["duration"] * 0.6)
+
+
+def generate_dive_profile(
+    max_depth: float,
+    duration_minutes: int,
+    surface_temp: float,
+    bottom_temp: float,
+    tank_configs: List[Dict],
+    is_tech: bool = False,
+    gf_low: float = 0.35,
+    gf_high: float = 0.85,
+    site_type: str = "reef",
+    thermocline_profile: Dict = None,
+    tissue_state: TissueState = None,
+    sample_interval: int = 5,
+    temp_offset: float = 0.0,
+    personality: "DiverPersonality" = None,
+) -> Tuple["DiveProfile", List[Dict], TissueState]:
+    """Generate realistic depth, temperature, and pressure profiles using Bühlmann ZHL-16C.
+
+    Features:
+    - Smooth curved descent/ascent using easing functions
+    - Multi-level profiles for recreational dives
+    - Site-specific depth patterns (wall, wreck, drift, reef, cenote, manta, shallow)
+    - Thermocline temperature modeling with smooth transitions
+    - Tissue compartment tracking with gradient factor support
+    - Proper deco ceiling respect during ascent
+    - Realistic gas consumption that won't exceed available supply
+    - Optional tissue state input for repetitive diving
+
+    Site-specific patterns:
+    - wall: Steep descent to max depth, hug wall with minimal horizontal movement
+    - wreck: Descend to deck, explore exterior/interior at various levels
+    - drift: Gradual depth changes following current, less precise depth control
+    - cenote: Sharp thermocline, layer exploration
+    - manta: Hover at cleaning station depth (12-18m), minimal movement
+    - shallow: Stay in 3-10m range, extended bottom times
+
+    Consumption patterns by configuration:
+    - Single tank: straightforward consumption
+    - Sidemount: alternate between tanks every ~15-20 bar for balance
+    - Doubles (manifolded): consume both tanks equally
+    - Staged deco: use bottom gas until ascent, then switch to appropriate deco gas based on MOD
+
+    Returns:
+        Tuple of (profile, gas_switches, final_tissue_state), where profile is
+        a columnar DiveProfile
+    """
+
+    profile = DiveProfile(len(tank_configs))
+    total_seconds = duration_minutes * 60
+
+    # Create personality if not provided
+    if personality is None:
+        personality = DiverPersonality(skill_level=0.5, activity_level=0.5)
+
+    # Create Perlin noise generator for this dive
+    perlin = PerlinNoise(seed=random.randint(0, 100000))
+
+    thermocline = None
+    if thermocline_profile is not None:
+        thermocline = ThermoclineField(thermocline_profile, surface_temp, temp_offset)
+
+    # Breathing parameters for this dive
+    breath_rate = 18 - personality.skill_level * 6 + random.uniform(-1, 1)
+
+    # Depth target variety: +/- 5-10% jitter on actual max depth
+    depth_jitter = random.uniform(-0.10, 0.05)
+    max_depth = max_depth * (1.0 + depth_jitter)
+    max_depth = max(5, max_depth)
+
+    # Descent/ascent rates
+    descent_rate = random.uniform(*personality.descent_rate_range)
+    ascent_rate = personality.ascent_rate
+
+    # Calculate phase durations
+    descent_time_seconds = (max_depth / descent_rate) * 60
+    safety_stop_depth = 5
+    safety_stop_duration = 180  # 3 minutes
+
+    # Determine tank configuration type
+    config_type = get_tank_config_type(tank_configs)
+
+    # Initialize tank states with realistic SAC rates
+    tank_states = init_tank_states(tank_configs, personality, is_tech, config_type)
+
+    # Initialize tissue state for decompression tracking
+    # If tissue_state is provided (repetitive diving), use it; otherwise create fresh
+    if tissue_state is not None:
+        tissue = tissue_state
+    else:
+        tissue = TissueState()
+
+    # Get primary gas mix for tissue calculations
+    main_tank_indices = [i for i, tc in enumerate(tank_configs) if tc.get("role") == "main"]
+    stage_tank_indices = [i for i, tc in enumerate(tank_configs) if tc.get("role") == "stage"]
+
+    if main_tank_indices:
+        primary_gas = tank_states[main_tank_indices[0]]
+    else:
+        primary_gas = tank_states[0] if tank_states else {"o2": 0.21, "he": 0.0}
+
+    # Sidemount tracking
+    sidemount_active_tank = 0
+    sidemount_switch_threshold = random.uniform(12, 18)
+    last_sidemount_switch_pressure = tank_states[main_tank_indices[0]]["current_pressure"] if main_tank_indices else 0
+
+    # Gas switches tracking
+    gas_switches = []
+    active_stage_tank = None
+    current_gas = primary_gas
+
+    # Sort stage tanks by O2 content (lower O2 first for deeper use)
+    stage_tank_indices_sorted = sorted(
+        stage_tank_indices,
+        key=lambda i: tank_states[i]["o2"]
+    )
+
+    # Generate site-specific depth profiles
+    level_depths = site_level_depths(site_type, max_depth, is_tech)
+
+    current_time = 0
+    current_depth = 0.0
+    dive_phase = "descent"  # descent, bottom, ascent
+    level_index = 0
+    level_start_time = descent_time_seconds
+    first_stop_depth = None  # Track for GF slope calculation
+    safety_stop_start_time = None  # Track when safety stop begins
+
+    # Calculate approximate bottom time per level
+    estimated_ascent_time = (max_depth / ascent_rate) * 60 + safety_stop_duration
+    available_bottom_time = total_seconds - descent_time_seconds - estimated_ascent_time
+    time_per_level = max(60, available_bottom_time / len(level_depths))
+
+    # Pre-compute level durations (deeper levels get more time)
+    level_durations = split_bottom_time(level_depths, available_bottom_time)
+
+    # Pre-generate equalization pauses for descent
+    eq_pauses = []
+    num_eq_pauses = personality.eq_pause_count
+    if num_eq_pauses > 0 and descent_time_seconds > 20:
+        for i in range(num_eq_pauses):
+            pause_depth = random.uniform(3, 9)
+            pause_progress = pause_depth / (level_depths[0] if level_depths else max_depth)
+            pause_start = pause_progress * descent_time_seconds
+            pause_dur = random.uniform(3, 8)
+            eq_pauses.append((pause_depth, pause_start, pause_dur))
+    personality._eq_pauses = eq_pauses
 
     # Buddy check pause (30% chance)
     buddy_check_pause = None
@@ -2247,25 +2845,7 @@ def generate_dive_profile(
         level_start_est += lvl_dur
 
     # Site-type specific micro-event adjustments
-    if site_type == "wall":
-        for events in all_level_events:
-            while len(events) > 2:
-                events.pop()
-    elif site_type == "manta":
-        for events in all_level_events:
-            while len(events) > 1:
-                events.pop()
-            for e in events:
-                e["depth_offset"] *= 0.3
-    elif site_type == "drift":
-        for events in all_level_events:
-            for e in events:
-                e["duration"] = max(e["duration"], 60)
-                e["depth_offset"] *= 0.7
-    elif site_type == "wreck":
-        for events in all_level_events:
-            for e in events:
-                e["duration"] = max(15, e["duration"] * 0.6)
+    adjust_micro_events_for_site(all_level_events, site_type)
 
     # Pre-generate exertion spikes for gas consumption
     num_spikes = random.randint(2, 4)
@@ -2293,6 +2873,25 @@ def generate_dive_profile(
     # Maximum allowed dive time (safety limit to prevent infinite loops)
     max_dive_time = total_seconds + 1800  # Allow up to 30 extra minutes for deco
 
+    # Micro-events are visited only while active
+    level_timelines = [MicroEventTimeline(events) for events in all_level_events]
+
+    # Descent and bottom samples are all breathed on the primary gas and
+    # nothing reads the tissues before the ascent's ceiling checks, so their
+    # loading is integrated as one segment when the ascent starts
+    pending_depths = []
+
+    def flush_pending_depths():
+        tissue.update_segment(pending_depths, sample_interval, primary_gas["o2"], primary_gas.get("he", 0.0))
+        pending_depths.clear()
+
+    # Pre-render the descent wobble and bottom depth-band noise for every
+    # sample those phases can reach (descent ends by descent_time_seconds, the
+    # bottom by total_seconds); the short safety stop still samples per call
+    descent_noise = perlin.track(0.05, sample_interval, int(descent_time_seconds // sample_interval) + 1)
+    bottom_noise = perlin.track(0.015, sample_interval, int(total_seconds // sample_interval) + 1)
+    sample_index = 0
+
     while current_depth >= 0:
         # =================================================================
         # PHASE-BASED DEPTH CALCULATION
@@ -2322,7 +2921,7 @@ def generate_dive_profile(
                     eased_progress = ease_in_out_cubic(progress)
                     current_depth = target_depth_descent * eased_progress
                     # Slight wobble during descent
-                    current_depth += perlin.noise(current_time * 0.05) * personality.noise_amplitude * 0.3
+                    current_depth += descent_noise[sample_index] * personality.noise_amplitude * 0.3
             else:
                 dive_phase = "bottom"
                 level_start_time = current_time
@@ -2345,26 +2944,18 @@ def generate_dive_profile(
 
             if dive_phase == "bottom":
                 # Depth band width varies by site type
-                band_width = 2.0
-                if site_type == "wall":
-                    band_width = 1.0
-                elif site_type == "manta":
-                    band_width = 0.5
-                elif site_type == "drift":
-                    band_width = 3.0
-                elif site_type == "wreck":
-                    band_width = 1.5
+                band_width = SITE_DEPTH_BANDS.get(site_type, 2.0)
 
                 # Base depth from Perlin noise within band
-                noise_val = perlin.noise(current_time * 0.015) * band_width
+                noise_val = bottom_noise[sample_index] * band_width
                 current_depth = target_depth + noise_val
 
                 # Add breathing oscillation
                 current_depth += breathing_oscillation(current_time, personality.skill_level, breath_rate)
 
                 # Apply micro-events
-                if level_index < len(all_level_events):
-                    for event in all_level_events[level_index]:
+                if level_index < len(level_timelines):
+                    for event in level_timelines[level_index].active(current_time):
                         current_depth += apply_micro_event(event, current_time)
 
                 # Buoyancy slip anomaly
@@ -2390,6 +2981,8 @@ def generate_dive_profile(
                 current_depth = max(3, min(max_depth + 2, current_depth))
 
         elif dive_phase == "ascent":
+            flush_pending_depths()
+
             # Calculate ceiling from tissue loading
             ceiling = tissue.gf_ceiling(gf_low, gf_high, current_depth, first_stop_depth)
 
@@ -2441,15 +3034,17 @@ def generate_dive_profile(
         # =================================================================
         # TISSUE LOADING UPDATE
         # =================================================================
-        tissue.update(current_depth, sample_interval, current_gas["o2"], current_gas.get("he", 0.0))
+        if dive_phase == "ascent":
+            flush_pending_depths()
+            tissue.update(current_depth, sample_interval, current_gas["o2"], current_gas.get("he", 0.0))
+        else:
+            pending_depths.append(current_depth)
 
         # =================================================================
         # TEMPERATURE CALCULATION (with thermocline modeling)
         # =================================================================
-        if thermocline_profile is not None:
-            current_temp = calculate_temperature_at_depth(
-                current_depth, thermocline_profile, surface_temp, temp_offset
-            )
+        if thermocline is not None:
+            current_temp = thermocline.at(current_depth) + random.uniform(-0.05, 0.05)
         else:
             temp_gradient = (surface_temp - bottom_temp) / max(max_depth, 1)
             current_temp = surface_temp - (temp_gradient * current_depth)
@@ -2471,14 +3066,14 @@ def generate_dive_profile(
             sac_modifier = 1.0
 
             # Depth change effort
-            if len(profile_points) >= 2:
-                prev_depth = profile_points[-1]["depth"]
+            if len(profile) >= 2:
+                prev_depth = profile.depth[-1]
                 depth_change_rate = abs(current_depth - prev_depth) / sample_interval * 60
                 sac_modifier += depth_change_rate * 0.03
 
             # Micro-event activity boost
-            if level_index < len(all_level_events):
-                for event in all_level_events[level_index]:
+            if level_index < len(level_timelines):
+                for event in level_timelines[level_index].active(current_time):
                     event_offset = apply_micro_event(event, current_time)
                     if abs(event_offset) > 0.1:
                         sac_modifier += 0.15
@@ -2561,23 +3156,11 @@ def generate_dive_profile(
                 ts["current_pressure"] = max(ts["current_pressure"], 40 * 100000)
 
         # =================================================================
-        # BUILD PROFILE POINT
+        # RECORD SAMPLE
         # =================================================================
-        point = {
-            "divetime": current_time,
-            "depth": current_depth,
-            "temperature": current_temp_kelvin,
-            "tankpressures": []
-        }
-
-        for i, ts in enumerate(tank_states):
-            point["tankpressures"].append({
-                "tank_index": i,
-                "pressure": int(ts["current_pressure"])
-            })
-
-        profile_points.append(point)
+        profile.append(current_time, current_depth, current_temp_kelvin, tank_states)
         current_time += sample_interval
+        sample_index += 1
 
         # Check if we've surfaced
         if current_depth <= 0.1 and dive_phase == "ascent":
@@ -2596,83 +3179,2340 @@ def generate_dive_profile(
         if main_tanks_pressure < min_reserve and dive_phase == "bottom":
             dive_phase = "ascent"
 
+    # Dives that never reached the ascent phase (time limit) still owe their loading
+    flush_pending_depths()
+
     # Ensure we end at surface
-    if profile_points and profile_points[-1]["depth"] > 0:
-        final_point = {
-            "divetime": current_time,
-            "depth": 0,
-            "temperature": round(surface_temp + 273.15, 2),
-            "tankpressures": []
-        }
-        for i, ts in enumerate(tank_states):
-            final_point["tankpressures"].append({
-                "tank_index": i,
-                "pressure": int(ts["current_pressure"])
-            })
-        profile_points.append(final_point)
+    if len(profile) and profile.depth[-1] > 0:
+        profile.append(current_time, 0.0, round(surface_temp + 273.15, 2), tank_states)
 
     # Set final pressures
     for i, ts in enumerate(tank_states):
         tank_configs[i]["start_pressure_actual"] = int(ts["start_pressure"])
         tank_configs[i]["end_pressure_actual"] = int(ts["current_pressure"])
 
-    return profile_points, gas_switches, tissue
-
+    return profile, gas_switches, tissue
 
-def prettify_xml(elem):
-    """Return a pretty-printed XML string."""
-    rough_string = ET.tostring(elem, encoding='unicode')
-    reparsed = minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="  ")
 
+class SegmentTimeline:
+    """
+    A dive as a list of depth segments, rendered to samples only on output.
+
+    Segment i runs from times[i] to times[i + 1] (s) and from depths[i] to
+    depths[i + 1] (m); pressures[i] holds every tank's pressure (Pa) at
+    times[i]. The shape only changes how sample() draws the segment between
+    its ends: "linear", "ease" (ease_in_out_cubic), "cosine" (half a raised
+    cosine; two make a micro-event's bump) or "stop". Every shape is symmetric
+    about the chord, so tissue loading and gas use can be integrated over the
+    straight line between the ends whatever the shape.
+    """
 
-def generate_trips(start_date: datetime, end_date: datetime, num_trips: int = 20) -> List[Dict]:
-    """Generate trip data with dates spread across the dive date range."""
-    trips = []
+    SHAPES = {
+        "linear": lambda f: f,
+        "stop": lambda f: f,
+        "ease": ease_in_out_cubic,
+        "cosine": lambda f: (1 - math.cos(math.pi * f)) / 2,
+    }
 
-    # Calculate total available days and distribute trips evenly
-    total_days = (end_date - start_date).days
-    if total_days < num_trips * 14:  # Need at least 2 weeks per trip cycle
-        num_trips = max(1, total_days // 14)
+    def __init__(self, pressures: List[float]):
+        self.times = [0.0]
+        self.depths = [0.0]
+        self.shapes = []
+        self.pressures = [tuple(pressures)]
 
-    # Calculate average gap between trips to fill the date range
-    avg_gap = total_days / (num_trips + 1) if num_trips > 0 else total_days
+    @property
+    def end(self) -> float:
+        return self.times[-1]
 
-    # Start first trip after initial gap
-    date_cursor = start_date + timedelta(days=int(avg_gap * 0.5))
+    @property
+    def depth(self) -> float:
+        return self.depths[-1]
 
-    for i in range(num_trips):
-        dest = TRIP_DESTINATIONS[i % len(TRIP_DESTINATIONS)]
-        duration = random.randint(4, 7)
+    def add(self, seconds: float, depth: float, shape: str, pressures: List[float]):
+        """Append a segment ending `seconds` from now at `depth` with these tank pressures."""
+        self.times.append(self.end + seconds)
+        self.depths.append(depth)
+        self.shapes.append(shape)
+        self.pressures.append(tuple(pressures))
 
-        # Don't let trip extend past end_date
-        trip_end = min(date_cursor + timedelta(days=duration - 1), end_date - timedelta(days=1))
+    def sample(self, times) -> Iterator[Tuple[float, str, Tuple[float, ...]]]:
+        """
+        Yield (depth, shape, tank pressures) at each of `times`, which must not
+        decrease. Pressures are interpolated linearly within a segment; times
+        at or past the end repeat the final values with shape "surface".
+        """
+        last = len(self.shapes) - 1
+        i = 0
+        for t in times:
+            while i < last and t >= self.times[i + 1]:
+                i += 1
+            if t >= self.times[-1]:
+                yield self.depths[-1], "surface", self.pressures[-1]
+                continue
+            t0 = self.times[i]
+            f = (t - t0) / (self.times[i + 1] - t0)
+            d0 = self.depths[i]
+            depth = d0 + (self.depths[i + 1] - d0) * self.SHAPES[self.shapes[i]](f)
+            p0, p1 = self.pressures[i], self.pressures[i + 1]
+            yield depth, self.shapes[i], tuple(a + (b - a) * f for a, b in zip(p0, p1))
 
-        # Skip if there's no room for this trip
-        if date_cursor >= end_date - timedelta(days=3):
-            break
 
-        trip = {
-            "id": f"trip{i+1:03d}",
-            "name": dest["name"],
-            "location": dest["location"],
-            "start_date": date_cursor,
-            "end_date": trip_end,
-            "center_indices": dest["center_indices"],
-            "site_indices": dest.get("site_indices", []),
-            "resort_name": dest.get("resort_name"),
-            "liveaboard_name": dest.get("liveaboard_name"),
-        }
-        trips.append(trip)
+def generate_segment_profile(
+    max_depth: float,
+    duration_minutes: int,
+    surface_temp: float,
+    bottom_temp: float,
+    tank_configs: List[Dict],
+    is_tech: bool = False,
+    gf_low: float = 0.35,
+    gf_high: float = 0.85,
+    site_type: str = "reef",
+    thermocline_profile: Dict = None,
+    tissue_state: TissueState = None,
+    sample_interval: int = 5,
+    temp_offset: float = 0.0,
+    personality: "DiverPersonality" = None,
+) -> Tuple["DiveProfile", List[Dict], TissueState]:
+    """Segment-based alternative to generate_dive_profile (--profile-engine segments).
+
+    The dive is planned as a SegmentTimeline: descent legs with equalization
+    pauses, level holds with eased transitions, micro-events as raised-cosine
+    bumps, 3 m ascent legs and whole-minute stops. Tissue loading
+    (TissueState.update_linear) and gas use are integrated in closed form once
+    per segment, and stop lengths come from a bisection on the ceiling rather
+    than a minute-by-minute scan, so planning cost does not depend on
+    sample_interval. Samples, with the Perlin depth band, breathing and
+    temperature, are only rendered at the end.
+
+    Takes the same arguments and returns the same tuple as
+    generate_dive_profile, drawing from the same site, tank and personality
+    helpers, but the profiles are not sample-for-sample identical: descents
+    run at a constant rate between pauses, stops are held for whole minutes
+    and gas switches are stamped on the first sample at or after the switch.
 
-        # Move to next trip with some randomized gap
-        gap_variation = random.uniform(0.7, 1.3)
-        date_cursor = trip["end_date"] + timedelta(days=int(avg_gap * gap_variation))
+    Returns:
+        Tuple of (profile, gas_switches, final_tissue_state), where profile is
+        a columnar DiveProfile
+    """
 
-    return trips
+    total_seconds = duration_minutes * 60
 
+    if personality is None:
+        personality = DiverPersonality(skill_level=0.5, activity_level=0.5)
+
+    perlin = PerlinNoise(seed=random.randint(0, 100000))
+
+    thermocline = None
+    if thermocline_profile is not None:
+        thermocline = ThermoclineField(thermocline_profile, surface_temp, temp_offset)
+
+    breath_rate = 18 - personality.skill_level * 6 + random.uniform(-1, 1)
+
+    max_depth = max(5, max_depth * (1.0 + random.uniform(-0.10, 0.05)))
+
+    descent_rate = random.uniform(*personality.descent_rate_range)
+    ascent_rate = personality.ascent_rate
+    safety_stop_depth = 5
+    safety_stop_duration = 180
+
+    config_type = get_tank_config_type(tank_configs)
+    tank_states = init_tank_states(tank_configs, personality, is_tech, config_type)
+    tissue = tissue_state if tissue_state is not None else TissueState()
+
+    main_tank_indices = [i for i, tc in enumerate(tank_configs) if tc.get("role") == "main"]
+    stage_tank_indices = sorted(
+        (i for i, tc in enumerate(tank_configs) if tc.get("role") == "stage"),
+        key=lambda i: tank_states[i]["o2"]
+    )
+    primary_gas = tank_states[main_tank_indices[0] if main_tank_indices else 0]
+    min_reserve = 60 * 100000 * len(main_tank_indices)  # 60 bar per tank
+
+    # Sidemount divers swap regulators every threshold bar
+    sidemount_active_tank = 0
+    sidemount_switch_threshold = random.uniform(12, 18) * 100000
+    last_sidemount_switch_pressure = primary_gas["current_pressure"]
+
+    level_depths = site_level_depths(site_type, max_depth, is_tech)
+    descent_seconds = level_depths[0] / descent_rate * 60
+
+    # Equalization pauses (occasionally a long one) and a buddy check, as
+    # (depth, seconds) holds on the way down
+    pauses = []
+    if descent_seconds > 20:
+        pauses = [(random.uniform(3, 9), random.uniform(3, 8)) for _ in range(personality.eq_pause_count)]
+        if pauses and random.random() < 0.10:
+            idx = random.randrange(len(pauses))
+            pauses[idx] = (pauses[idx][0], pauses[idx][1] + random.uniform(8, 15))
+    if random.random() < 0.3:
+        pauses.append((random.uniform(3, 5), random.uniform(5, 10)))
+    pauses = sorted(pause for pause in pauses if pause[0] < level_depths[0])
+
+    if random.random() < 0.03:
+        total_seconds = int(total_seconds * random.uniform(0.7, 0.8))
+    max_dive_time = total_seconds + 1800  # Allow up to 30 extra minutes for deco
+
+    estimated_ascent_time = (max_depth / ascent_rate) * 60 + safety_stop_duration
+    available_bottom_time = total_seconds - descent_seconds - estimated_ascent_time
+    level_durations = [max(0.0, d) for d in split_bottom_time(level_depths, available_bottom_time)]
+
+    all_level_events = []
+    level_start = descent_seconds
+    for level_depth, level_duration in zip(level_depths, level_durations):
+        all_level_events.append(generate_micro_events(
+            level_start_time=level_start,
+            level_duration=level_duration,
+            target_depth=level_depth,
+            activity_level=personality.activity_level,
+            max_depth=max_depth,
+        ))
+        level_start += level_duration
+    adjust_micro_events_for_site(all_level_events, site_type)
+
+    exertion_spikes = []
+    for _ in range(random.randint(2, 4)):
+        spike_start = random.uniform(descent_seconds, total_seconds * 0.8)
+        exertion_spikes.append((spike_start, spike_start + random.uniform(30, 60), random.uniform(1.2, 1.4)))
+
+    # A buoyancy slip is one more micro-event, in whichever level it falls
+    if random.random() < 0.05:
+        slip_time = random.uniform(descent_seconds + 60, total_seconds * 0.6)
+        level_end = descent_seconds
+        for events, level_duration in zip(all_level_events, level_durations):
+            level_end += level_duration
+            if slip_time < level_end or events is all_level_events[-1]:
+                events.append({"start_time": slip_time, "duration": 15, "depth_offset": -2.5,
+                               "event_type": "buoyancy_slip"})
+                break
+
+    timeline = SegmentTimeline([ts["current_pressure"] for ts in tank_states])
+    gas_switches = []
+    active_stage_tank = None
+    current_gas = primary_gas
+
+    def draw(tank_idx: int, pascals: float):
+        """Breathe from a tank down to its ~50 bar reserve, never below 40 bar."""
+        ts = tank_states[tank_idx]
+        if ts["current_pressure"] > 50 * 100000:
+            ts["current_pressure"] = max(ts["current_pressure"] - pascals, 40 * 100000)
+
+    def breathe(seconds: float, mean_depth: float, sac_modifier: float):
+        """Take a segment's gas: SAC x mean ambient pressure x time, split by configuration."""
+        nonlocal sidemount_active_tank, last_sidemount_switch_pressure
+        # Liters per liter of SAC; a tank drops liters / volume bar
+        minutes_ambient = seconds / 60 * (1 + mean_depth / 10) * sac_modifier
+        if active_stage_tank is not None:
+            ts = tank_states[active_stage_tank]
+            draw(active_stage_tank, ts["sac_rate"] * minutes_ambient / ts["volume"] * 100000)
+        elif config_type == "sidemount" and main_tank_indices:
+            remaining = 1.0
+            while remaining > 0:
+                idx = main_tank_indices[sidemount_active_tank % len(main_tank_indices)]
+                ts = tank_states[idx]
+                drop = ts["sac_rate"] * minutes_ambient * remaining / ts["volume"] * 100000
+                room = max(0.0, sidemount_switch_threshold - (last_sidemount_switch_pressure - ts["current_pressure"]))
+                if drop <= room or ts["current_pressure"] <= 50 * 100000:
+                    draw(idx, drop)
+                    break
+                draw(idx, room)
+                remaining -= remaining * room / drop
+                sidemount_active_tank = (sidemount_active_tank + 1) % len(main_tank_indices)
+                last_sidemount_switch_pressure = tank_states[main_tank_indices[sidemount_active_tank]]["current_pressure"]
+        else:
+            if config_type in ["doubles", "doubles_staged"]:
+                tanks = main_tank_indices
+            else:
+                tanks = main_tank_indices[:1] if main_tank_indices else [0]
+            share = 2 if config_type in ["doubles", "doubles_staged"] and len(tanks) == 2 else 1
+            for idx in tanks:
+                ts = tank_states[idx]
+                draw(idx, ts["sac_rate"] * minutes_ambient / share / ts["volume"] * 100000)
+
+    def advance(seconds: float, depth: float, shape: str = "linear", sac_modifier: float = 1.0,
+                turn_on_reserve: bool = False) -> bool:
+        """
+        Append one segment, integrating tissue loading and gas use over it.
+
+        With turn_on_reserve, a segment that would take the main tanks below
+        60 bar each is cut short where they reach it (gas is drawn at a
+        constant rate along a segment) and False is returned, so the bottom
+        phase ends there.
+        """
+        nonlocal sidemount_active_tank, last_sidemount_switch_pressure
+        if seconds <= 0:
+            return True
+        start_depth = timeline.depth
+        saved = ([ts["current_pressure"] for ts in tank_states], sidemount_active_tank, last_sidemount_switch_pressure)
+        breathe(seconds, (start_depth + depth) / 2, sac_modifier)
+        on_gas = True
+        if turn_on_reserve and main_tank_indices:
+            before = sum(saved[0][i] for i in main_tank_indices)
+            after = sum(tank_states[i]["current_pressure"] for i in main_tank_indices)
+            if after < min_reserve:
+                on_gas = False
+                fraction = max(0.0, (before - min_reserve) / (before - after)) if before > after else 0.0
+                for ts, pressure in zip(tank_states, saved[0]):
+                    ts["current_pressure"] = pressure
+                sidemount_active_tank, last_sidemount_switch_pressure = saved[1], saved[2]
+                seconds *= fraction
+                depth = start_depth + (depth - start_depth) * fraction
+                if seconds <= 0:
+                    return False
+                breathe(seconds, (start_depth + depth) / 2, sac_modifier)
+        tissue.update_linear(start_depth, depth, seconds, current_gas["o2"], current_gas.get("he", 0.0))
+        timeline.add(seconds, depth, shape, [ts["current_pressure"] for ts in tank_states])
+        return on_gas
+
+    def bottom_modifier(seconds: float, depth: float, event: bool = False) -> float:
+        """Workload SAC modifier for a bottom segment ending at depth."""
+        if seconds <= 0:
+            return 1.0
+        start = timeline.end
+        modifier = 1.0 + abs(depth - timeline.depth) / seconds * 60 * 0.03
+        if event:
+            modifier += 0.15
+        for spike_start, spike_end, spike_mag in exertion_spikes:
+            overlap = min(spike_end, start + seconds) - max(spike_start, start)
+            if overlap > 0:
+                modifier *= 1 + (spike_mag - 1) * overlap / seconds
+                break
+        return modifier + random.uniform(-0.08, 0.08) * (1.0 - personality.sac_consistency)
+
+    # =================================================================
+    # DESCENT: constant-rate legs between the pauses, eased into the first level
+    # =================================================================
+    descent_modifier = 1.15 + (1.0 - personality.skill_level) * 0.1
+    for pause_depth, pause_seconds in pauses:
+        advance((pause_depth - timeline.depth) / descent_rate * 60, pause_depth, sac_modifier=descent_modifier)
+        advance(pause_seconds, pause_depth, "stop", descent_modifier)
+    advance((level_depths[0] - timeline.depth) / descent_rate * 60, level_depths[0], "ease", descent_modifier)
+    descent_end = timeline.end
+
+    # =================================================================
+    # BOTTOM: level holds, eased transitions and micro-event bumps, cut short
+    # when the main tanks reach the turn reserve
+    # =================================================================
+    on_gas = True
+    planned_start = descent_seconds
+    for level_index, (level_depth, level_duration) in enumerate(zip(level_depths, level_durations)):
+        level_start = timeline.end
+        level_end = level_start + level_duration
+        if level_index > 0:
+            transition = min(90.0, level_duration)
+            on_gas = advance(transition, level_depth, "ease", bottom_modifier(transition, level_depth), True)
+        for event in sorted(all_level_events[level_index], key=lambda e: e["start_time"]):
+            if not on_gas:
+                break
+            start = max(level_start + event["start_time"] - planned_start, timeline.end)
+            half = event["duration"] / 2
+            if start + 2 * half > level_end:
+                continue
+            peak = max(3, min(max_depth + 2, level_depth + event["depth_offset"]))
+            on_gas = (
+                advance(start - timeline.end, level_depth, "linear", bottom_modifier(start - timeline.end, level_depth), True)
+                and advance(half, peak, "cosine", bottom_modifier(half, peak, True), True)
+                and advance(half, level_depth, "cosine", bottom_modifier(half, level_depth, True), True)
+            )
+        if on_gas:
+            hold = level_end - timeline.end
+            on_gas = advance(hold, level_depth, "linear", bottom_modifier(hold, level_depth), True)
+        planned_start += level_duration
+        if not on_gas:
+            break
+    ascent_start = timeline.end
+
+    # =================================================================
+    # ASCENT: 3 m legs, deco gas switches at each leg and whole-minute stops
+    # =================================================================
+    ceiling = tissue.gf_ceiling(gf_low, gf_high, timeline.depth)
+    first_stop_depth = math.ceil(ceiling / 3) * 3 if ceiling > 0 else None
+
+    def switch_gas():
+        """Move to the richest stage gas breathable here, or back to the bottom gas."""
+        nonlocal active_stage_tank, current_gas
+        best_stage = None
+        for idx in stage_tank_indices:
+            ts = tank_states[idx]
+            if timeline.depth <= ts["mod"] - 3 and ts["current_pressure"] > 50 * 100000:
+                if best_stage is None or ts["o2"] > tank_states[best_stage]["o2"]:
+                    best_stage = idx
+        if best_stage == active_stage_tank:
+            return
+        if best_stage is not None and best_stage not in [gs["tank"] for gs in gas_switches]:
+            gas_switches.append({
+                "time": int(math.ceil(timeline.end / sample_interval) * sample_interval),
+                "tank": best_stage,
+                "depth": round(timeline.depth, 2),
+                "mix_id": tank_states[best_stage]["mix_id"]
+            })
+        active_stage_tank = best_stage
+        current_gas = tank_states[best_stage] if best_stage is not None else primary_gas
+
+    def stop_seconds(next_depth: float) -> float:
+        """Whole minutes (in seconds) to hold the current depth before the ceiling allows next_depth."""
+        def clear(minutes: int) -> bool:
+            trial = tissue.copy()
+            trial.update(timeline.depth, minutes * 60, current_gas["o2"], current_gas.get("he", 0.0))
+            return trial.gf_ceiling(gf_low, gf_high, next_depth, first_stop_depth) <= next_depth
+
+        if clear(0):
+            return 0
+        limit = max(1, int((max_dive_time - timeline.end) // 60))
+        low, high = 0, 1
+        while high < limit and not clear(high):
+            low, high = high, min(high * 2, limit)
+        while high - low > 1:
+            mid = (low + high) // 2
+            if clear(mid):
+                high = mid
+            else:
+                low = mid
+        return high * 60
+
+    def ascend_to(depth: float):
+        advance((timeline.depth - depth) / ascent_rate * 60, depth, sac_modifier=0.85)
+
+    next_stop = 3 * math.ceil(timeline.depth / 3) - 3
+    while next_stop > safety_stop_depth:
+        switch_gas()
+        advance(stop_seconds(next_stop), timeline.depth, "stop", 0.85)
+        ascend_to(next_stop)
+        next_stop -= 3
+    switch_gas()
+    if timeline.depth > safety_stop_depth:
+        advance(stop_seconds(safety_stop_depth), timeline.depth, "stop", 0.85)
+        ascend_to(safety_stop_depth)
+        switch_gas()
+        advance(max(safety_stop_duration, stop_seconds(0)), safety_stop_depth, "stop", 0.85)
+    else:
+        advance(stop_seconds(0), timeline.depth, "stop", 0.85)
+    ascend_to(0.0)
+
+    # =================================================================
+    # RENDER: samples, depth noise and temperature at the output interval
+    # =================================================================
+    profile = DiveProfile(len(tank_configs))
+    band_width = SITE_DEPTH_BANDS.get(site_type, 2.0)
+    num_samples = int(timeline.end // sample_interval) + 1
+    sample_times = range(0, num_samples * sample_interval, sample_interval)
+    descent_noise = perlin.track(0.05, sample_interval, num_samples)
+    bottom_noise = perlin.track(0.015, sample_interval, num_samples)
+    temp_gradient = (surface_temp - bottom_temp) / max(max_depth, 1)
+
+    for i, (t, (depth, shape, pressures)) in enumerate(zip(sample_times, timeline.sample(sample_times))):
+        if t < descent_end:
+            depth += descent_noise[i] * personality.noise_amplitude * 0.3
+        elif t < ascent_start:
+            depth += bottom_noise[i] * band_width
+            depth += breathing_oscillation(t, personality.skill_level, breath_rate)
+            depth = max(3, min(max_depth + 2, depth))
+        elif shape == "stop":
+            depth += perlin.noise(t * 0.1) * 0.3
+        depth = max(0, round(depth, 2))
+
+        if thermocline is not None:
+            temp = thermocline.at(depth) + random.uniform(-0.05, 0.05)
+        else:
+            temp = surface_temp - temp_gradient * depth + random.uniform(-0.05, 0.05)
+        profile.append_row(t, depth, round(temp + 273.15, 2), pressures)
+
+    if profile.depth[-1] > 0:
+        profile.append_row(
+            num_samples * sample_interval, 0.0, round(surface_temp + 273.15, 2), timeline.pressures[-1]
+        )
+
+    for i, ts in enumerate(tank_states):
+        tank_configs[i]["start_pressure_actual"] = int(ts["start_pressure"])
+        tank_configs[i]["end_pressure_actual"] = int(ts["current_pressure"])
+
+    return profile, gas_switches, tissue
+
+
+def prettify_xml(elem):
+    """Return a pretty-printed XML string."""
+    rough_string = ET.tostring(elem, encoding='unicode')
+    reparsed = minidom.parseString(rough_string)
+    return reparsed.toprettyxml(indent="  ")
+
+
+def generate_buddies(num_buddies: int = 50, rng: random.Random = None) -> List[Dict]:
+    """Generate buddy records with random names and matching email addresses."""
+    rng = rng or random
+    buddies = []
+    for i in range(num_buddies):
+        first = rng.choice(BUDDY_FIRST_NAMES)
+        last = rng.choice(BUDDY_LAST_NAMES)
+        buddies.append({
+            "id": sys.intern(f"buddy{i+1:03d}"),
+            "firstname": first,
+            "lastname": last,
+            "email": f"{first.lower()}.{last.lower()}@email.com"
+        })
+    return buddies
+
+
+def generate_trips(
+    start_date: datetime, end_date: datetime, num_trips: int = 20, rng: random.Random = None
+) -> List[Dict]:
+    """Generate trip data with dates spread across the dive date range."""
+    rng = rng or random
+    trips = []
+
+    # Calculate total available days and distribute trips evenly
+    total_days = (end_date - start_date).days
+    if total_days < num_trips * 14:  # Need at least 2 weeks per trip cycle
+        num_trips = max(1, total_days // 14)
+
+    # Calculate average gap between trips to fill the date range
+    avg_gap = total_days / (num_trips + 1) if num_trips > 0 else total_days
+
+    # Start first trip after initial gap
+    date_cursor = start_date + timedelta(days=int(avg_gap * 0.5))
+
+    for i in range(num_trips):
+        dest = TRIP_DESTINATIONS[i % len(TRIP_DESTINATIONS)]
+        duration = rng.randint(4, 7)
+
+        # Don't let trip extend past end_date
+        trip_end = min(date_cursor + timedelta(days=duration - 1), end_date - timedelta(days=1))
+
+        # Skip if there's no room for this trip
+        if date_cursor >= end_date - timedelta(days=3):
+            break
+
+        trip = {
+            "id": f"trip{i+1:03d}",
+            "name": dest["name"],
+            "location": dest["location"],
+            "start_date": date_cursor,
+            "end_date": trip_end,
+            "center_indices": dest["center_indices"],
+            "site_indices": dest.get("site_indices", []),
+            "resort_name": dest.get("resort_name"),
+            "liveaboard_name": dest.get("liveaboard_name"),
+        }
+        trips.append(trip)
+
+        # Move to next trip with some randomized gap
+        gap_variation = rng.uniform(0.7, 1.3)
+        date_cursor = trip["end_date"] + timedelta(days=int(avg_gap * gap_variation))
+
+    return trips
+
+
+# Fraction of max depth used as the square-profile depth when the planner
+# estimates residual loading between repetitive dives (see plan_dives)
+PLANNING_DEPTH_FRACTION = 0.7
+
+DIVE_TYPE_WEIGHTS = [
+    ("recreational_single", 0.25),
+    ("recreational_nitrox", 0.25),
+    ("recreational_al80", 0.15),
+    ("tec_single_stage", 0.12),
+    ("tec_doubles", 0.08),
+    ("tec_doubles_deco", 0.07),
+    ("sidemount", 0.05),
+    ("tec_deep", 0.03),
+]
+
+
+def average_step_days(num_dives: int, start_date: datetime, end_date: datetime) -> float:
+    """Average days between non-trip dives that spreads num_dives over the date range."""
+    total_days = (end_date - start_date).days
+    # Estimate trip dives (multiple dives per day during trips reduce needed steps)
+    # Assume ~30% of dives are during trips with 2-3 dives/day average
+    estimated_trip_dives = num_dives * 0.3
+    estimated_non_trip_dives = num_dives - estimated_trip_dives
+    # Calculate step size to ensure we span the full date range
+    return max(1, total_days / estimated_non_trip_dives)
+
+
+def plan_dives(
+    num_dives: int,
+    sites_to_use: List[Dict],
+    centers_to_use: List[Dict],
+    buddies: List[Dict],
+    trips: List[Dict],
+    start_date: datetime,
+    end_date: datetime,
+    rng: random.Random = None,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """Plan every dive of the logbook without generating profiles (see iter_plans).
+
+    Returns:
+        Tuple of (dive_plans, trip_dive_counts)
+    """
+    trip_dive_counts = {}
+    plans = list(iter_plans(
+        num_dives, sites_to_use, centers_to_use, buddies, trips, start_date, end_date, trip_dive_counts, rng
+    ))
+    return plans, trip_dive_counts
+
+
+def iter_plans(
+    num_dives: int,
+    sites_to_use: List[Dict],
+    centers_to_use: List[Dict],
+    buddies: List[Dict],
+    trips: List[Dict],
+    start_date: datetime,
+    end_date: datetime,
+    trip_dive_counts: Dict[str, int] = None,
+    rng: random.Random = None,
+) -> Iterator[Dict]:
+    """Plan the dives of the logbook one at a time, without generating profiles.
+
+    Draws everything except the depth/gas/temperature samples from rng: dates, sites, trips, buddies, conditions, sightings, notes and
+    a per-dive profile seed. Repetitive-dive durations need residual tissue
+    loading, which the planner estimates by loading its own DiveSession with a
+    square profile at PLANNING_DEPTH_FRACTION of max depth; the real profiles
+    are then generated per session chain (see generate_dive_records).
+
+    Args:
+        trip_dive_counts: If given, filled with the number of dives planned on
+            each trip as plans are yielded
+        rng: Random stream to draw from (None = the global random module)
+
+    Yields:
+        One plan dict per dive, in logbook order
+    """
+    rng = rng or random
+    current_date = start_date
+    dive_number = 1
+    avg_step_days = average_step_days(num_dives, start_date, end_date)
+
+    # Track trip dive counts for multiple dives per trip day
+    if trip_dive_counts is None:
+        trip_dive_counts = {}
+    trip_dive_counts.update({trip["id"]: 0 for trip in trips})
+
+    # Trip index: trips by start date, each with its dive quota (target ~3-4
+    # dives per day for 4-7 day trips) and the site/center indices it can use.
+    # The planning date only moves forward, so trips that have ended drop off
+    # the front and each dive looks at just the trips underway or starting
+    # within a week, whatever the catalog and logbook sizes.
+    trips = sorted(trips, key=lambda t: t["start_date"])
+    trip_starts = [trip["start_date"] for trip in trips]
+    trip_quotas = {trip["id"]: rng.randint(12, 20) for trip in trips}
+    trip_site_indices = {
+        trip["id"]: [i for i in trip["site_indices"] if i < len(sites_to_use)] for trip in trips
+    }
+    trip_center_indices = {
+        trip["id"]: [i for i in trip["center_indices"] if i < len(centers_to_use)] for trip in trips
+    }
+    first_open_trip = 0
+
+    # Planning-time session: tracks surface intervals and estimated residual loading
+    dive_session = DiveSession()
+
+    # Generate training dives from courses
+    training_dives = []
+    for course in PADI_COURSES:
+        course_dives = generate_training_dives(course, dive_start_index=len(training_dives), rng=rng)
+        training_dives.extend(course_dives)
+
+    # Sort training dives by date for chronological insertion
+    training_dives.sort(key=lambda d: d["datetime"])
+
+    for dive_idx in range(num_dives):
+        # Stop if we've exceeded the end date
+        if current_date >= end_date:
+            break
+
+        # Pick dive type
+        r = rng.random()
+        cumulative = 0
+        dive_type = "recreational_single"
+        for dt, prob in DIVE_TYPE_WEIGHTS:
+            cumulative += prob
+            if r <= cumulative:
+                dive_type = dt
+                break
+
+        tank_config = [tc.copy() for tc in TANK_CONFIGS[dive_type]]
+
+        # Check if we should do a trip dive (40% chance if there's an upcoming trip)
+        active_trip = None
+        site = None
+        site_idx = None
+        center = None
+        center_idx = None
+
+        # Check if we're within a trip's date range
+        while first_open_trip < len(trips) and trips[first_open_trip]["end_date"] < current_date:
+            first_open_trip += 1
+        upcoming_end = bisect.bisect_left(trip_starts, current_date + timedelta(days=8))
+        for trip in trips[first_open_trip:upcoming_end]:
+            if trip_dive_counts[trip["id"]] < trip_quotas[trip["id"]]:
+                if trip["start_date"] <= current_date <= trip["end_date"]:
+                    # We're within this trip's dates
+                    active_trip = trip
+                    break
+                elif trip["start_date"] > current_date:
+                    # Next trip is in the future - maybe jump to it if close
+                    days_until_trip = (trip["start_date"] - current_date).days
+                    if days_until_trip <= 7 and rng.random() < 0.5:
+                        # 50% chance to jump to nearby trip
+                        current_date = trip["start_date"]
+                        active_trip = trip
+                        break
+
+        if active_trip:
+            # Pick site from trip's site list
+            valid_site_indices = trip_site_indices[active_trip["id"]]
+            if valid_site_indices:
+                site_idx = rng.choice(valid_site_indices)
+                site = sites_to_use[site_idx]
+            # Pick center from trip's center list
+            valid_center_indices = trip_center_indices[active_trip["id"]]
+            if valid_center_indices:
+                center_idx = rng.choice(valid_center_indices)
+                center = centers_to_use[center_idx]
+            trip_dive_counts[active_trip["id"]] += 1
+
+        # Fall back to random site/center if not in a trip (randrange draws
+        # the same index random.choice would, without searching for it)
+        if site is None:
+            site_idx = rng.randrange(len(sites_to_use))
+            site = sites_to_use[site_idx]
+        if center is None:
+            center_idx = rng.randrange(len(centers_to_use))
+            center = centers_to_use[center_idx]
+
+        num_buddies = rng.randint(1, 3)
+        dive_buddies = rng.sample(buddies, num_buddies)
+
+        is_tech = "tec" in dive_type or "sidemount" in dive_type
+
+        # Determine max depth based on dive type
+        if "deep" in dive_type:
+            max_depth = rng.uniform(50, min(75, site.get("max_depth", 75)))
+        elif "tec" in dive_type:
+            max_depth = rng.uniform(35, min(50, site.get("max_depth", 50)))
+        else:
+            max_depth = rng.uniform(12, min(30, site.get("max_depth", 30)))
+
+        # Calculate realistic duration based on gas supply and NDL
+        gas_limited_duration = calculate_gas_duration(max_depth, tank_config, is_tech, rng=rng)
+
+        # Calculate NDL at max depth for clean tissue (precomputed table)
+        ndl_at_depth = get_ndl_table(0.21, 0.0, 0.85).lookup(max_depth)
+
+        if is_tech:
+            # Tech dives can exceed NDL (planned deco), but limited by gas
+            # Add time for deco stops (rough estimate: 1 min per 3m of depth over 20m)
+            deco_time_estimate = max(0, (max_depth - 20) / 3) * 2
+            target_duration = rng.uniform(35, 55) + deco_time_estimate
+            duration = int(min(gas_limited_duration * 0.85, target_duration))
+        else:
+            # Recreational dives: stay within NDL and gas limits
+            # Use 80% of limits for safety margin
+            max_safe_duration = min(gas_limited_duration * 0.80, ndl_at_depth * 0.85)
+            # Add some randomness but stay within limits
+            target_duration = rng.uniform(30, 50)
+            duration = int(min(max_safe_duration, target_duration))
+
+        # Ensure minimum reasonable dive time
+        duration = max(20, duration)
+
+        # Get site type and thermocline profile
+        site_type = get_site_type(site)
+        thermocline_profile = get_thermocline_profile(site)
+
+        # Surface temperature from thermocline profile
+        temp_range = thermocline_profile["surface_temp"]
+        surface_temp = rng.uniform(temp_range[0], temp_range[1])
+
+        # Per-dive temperature offset for day-to-day variation
+        temp_offset = rng.uniform(-0.2, 0.2)
+        # Bottom temp calculated via thermocline model (for reference in XML)
+        bottom_temp = calculate_temperature_at_depth(
+            max_depth, thermocline_profile, surface_temp, temp_offset, rng=rng
+        )
+
+        air_temp = surface_temp + rng.uniform(-2, 5)
+        air_temp_kelvin = air_temp + 273.15
+
+        # Generate dive conditions based on site type
+        conditions = generate_dive_conditions(site, site_type, rng=rng)
+
+        # Determine dive datetime - ensure chronological order for same-day dives
+        if dive_session.last_dive_end is not None and dive_session.last_dive_end.date() == current_date.date():
+            # Same day as last dive - schedule after previous dive ends + surface interval
+            min_surface_interval = rng.randint(60, 180)  # 1-3 hours between dives
+            dive_datetime = dive_session.last_dive_end + timedelta(minutes=min_surface_interval)
+
+            # If that pushes us past reasonable diving hours, move to next day
+            if dive_datetime.hour >= 18:
+                current_date += timedelta(days=1)
+                hour = rng.choice([7, 8, 9, 10])
+                dive_datetime = current_date.replace(hour=hour, minute=rng.choice([0, 15, 30, 45]))
+        else:
+            # First dive of the day - pick a morning or afternoon start time
+            hour = rng.choice([7, 8, 9, 10, 11, 14, 15, 16])
+            minute = rng.choice([0, 15, 30, 45])
+            dive_datetime = current_date.replace(hour=hour, minute=minute)
+
+        # Check for new diving day and handle surface interval
+        if dive_session.is_new_day(dive_datetime):
+            dive_session.start_new_day()
+            surface_interval_minutes = None
+        else:
+            surface_interval_minutes = dive_session.surface_interval_minutes(dive_datetime)
+            # Only apply positive surface intervals
+            if surface_interval_minutes > 0:
+                dive_session.resume_at(dive_datetime)
+            else:
+                surface_interval_minutes = None
+
+        # First dive of a diving day starts a new session chain
+        starts_session = dive_session.dive_count_today == 0
+
+        # For repetitive dives, use session tissue state with reduced NDL
+        if not starts_session and not is_tech:
+            # Repetitive dive: calculate reduced NDL
+            ndl_at_depth = dive_session.get_adjusted_ndl(max_depth, gf_high=0.85)
+            max_safe_duration = min(gas_limited_duration * 0.80, ndl_at_depth * 0.85)
+            target_duration = rng.uniform(25, 45)  # Slightly shorter for repetitive
+            duration = int(min(max_safe_duration, target_duration))
+            duration = max(20, duration)
+
+        # Check if there's a training dive that should be inserted at this point
+        course_ref = None
+        is_training_dive = False
+        while training_dives and training_dives[0]["datetime"] <= dive_datetime:
+            td = training_dives.pop(0)
+            is_training_dive = True
+            course_ref = td["course_id"]
+            max_depth = td["max_depth"]
+            duration = td["duration"]
+            site_type = td["site_type"]
+            personality = DiverPersonality(
+                skill_level=td["skill_level"],
+                activity_level=rng.uniform(0.3, 0.5),
+            )
+            dive_datetime = td["datetime"]
+            break
+
+        # Generate diver personality for this dive
+        if not is_training_dive:
+            personality = DiverPersonality.generate(dive_number=dive_idx, total_dives=num_dives, rng=rng)
+
+        # Estimate residual loading for the next repetitive dive
+        primary_mix = next((tc["mix_id"] for tc in tank_config if tc.get("role") == "main"), "air")
+        primary_gas = next((m for m in GAS_MIXES if m["id"] == primary_mix), GAS_MIXES[0])
+        dive_session.tissue.update(
+            max_depth * PLANNING_DEPTH_FRACTION, duration * 60, primary_gas["o2"], primary_gas["he"]
+        )
+
+        # Generate marine life sightings
+        sightings = generate_sightings(site, site_type, rng=rng)
+
+        # Generate rating (weighted toward higher ratings)
+        rating = rng.choices([3, 4, 5], weights=[0.15, 0.35, 0.5])[0]
+
+        # Generate notes
+        buddy_name = dive_buddies[0]["firstname"] if dive_buddies else "buddy"
+        notes = generate_dive_notes(site, site_type, sightings, buddy_name, conditions, rng=rng)
+        if is_tech and len(tank_config) > 1:
+            notes += f" {len(tank_config)}-tank tech dive with AI transmitters."
+
+        yield {
+            "dive_idx": dive_idx,
+            "dive_number": dive_number,
+            "dive_type": dive_type,
+            "tank_config": tank_config,
+            "site_idx": site_idx,
+            "center_idx": center_idx,
+            "trip_id": active_trip["id"] if active_trip else None,
+            "course_ref": course_ref,
+            "buddy_ids": [buddy["id"] for buddy in dive_buddies],
+            "is_tech": is_tech,
+            "max_depth": max_depth,
+            "duration": duration,
+            "site_type": site_type,
+            "thermocline_profile": thermocline_profile,
+            "surface_temp": surface_temp,
+            "bottom_temp": bottom_temp,
+            "temp_offset": temp_offset,
+            "air_temp_kelvin": air_temp_kelvin,
+            "conditions": conditions,
+            "datetime": dive_datetime,
+            "starts_session": starts_session,
+            "surface_interval_minutes": surface_interval_minutes,
+            "personality": personality,
+            "profile_seed": rng.getrandbits(32),
+            "sightings": sightings,
+            "rating": rating,
+            "notes": notes,
+            "weight": rng.uniform(4, 8),
+        }
+
+        # Record dive end for session tracking
+        dive_end_time = dive_datetime + timedelta(minutes=duration)
+        dive_session.record_dive_end(dive_end_time, {
+            "max_depth": max_depth,
+            "duration": duration,
+            "site": site["name"],
+        })
+
+        dive_number += 1
+
+        # Move date forward for next dive (if not in a trip, or sometimes within a trip)
+        if active_trip is None:
+            # Always advance the date for non-trip dives to ensure even distribution
+            # Use calculated step size with random variation (0.7x to 1.3x)
+            step = max(1, int(avg_step_days * rng.uniform(0.7, 1.3)))
+            current_date += timedelta(days=step)
+        else:
+            # Multiple dives per day during trips (30% chance to move to next day)
+            if rng.random() < 0.3:
+                current_date += timedelta(days=1)
+                if current_date > active_trip["end_date"]:
+                    current_date = active_trip["end_date"]
+
+
+def iter_session_chains(plans) -> Iterator[List[Dict]]:
+    """Lazily group consecutive plans into diving-day chains that share tissue state."""
+    chain = []
+    for plan in plans:
+        if plan["starts_session"] and chain:
+            yield chain
+            chain = []
+        chain.append(plan)
+    if chain:
+        yield chain
+
+
+def split_session_chains(plans: List[Dict]) -> List[List[Dict]]:
+    """Group consecutive plans into diving-day chains that share tissue state."""
+    return list(iter_session_chains(plans))
+
+
+def generate_session_chain(chain: List[Dict], sample_interval: int) -> List[Dict]:
+    """Generate the profiles for one diving day.
+
+    Each dive reseeds the random module with its planned profile_seed, so a
+    chain's output depends only on its plans, not on which process runs it or
+    what ran before. Tissue loading carries over from dive to dive within the
+    chain through a DiveSession: each dive's end loading is recorded at its
+    planned end time, and the next dive resumes from the residual loading
+    after its planned surface interval. Plans with profile_engine "segments"
+    are drawn by generate_segment_profile, the rest by generate_dive_profile.
+
+    Returns:
+        One record per plan: the plan plus profile, gas_switches and the
+        tank_config with actual start/end pressures
+    """
+    records = []
+    session = DiveSession()
+    for plan in chain:
+        random.seed(plan["profile_seed"])
+        if session.dive_count_today and plan["surface_interval_minutes"] is not None:
+            session.resume_at(session.last_dive_end + timedelta(minutes=plan["surface_interval_minutes"]))
+
+        tank_config = [tc.copy() for tc in plan["tank_config"]]
+        if plan.get("profile_engine") == "segments":
+            synthesize = generate_segment_profile
+        else:
+            synthesize = generate_dive_profile
+        profile, gas_switches, tissue = synthesize(
+            max_depth=plan["max_depth"],
+            duration_minutes=plan["duration"],
+            surface_temp=plan["surface_temp"],
+            bottom_temp=plan["bottom_temp"],
+            tank_configs=tank_config,
+            is_tech=plan["is_tech"],
+            site_type=plan["site_type"],
+            thermocline_profile=plan["thermocline_profile"],
+            tissue_state=session.tissue if session.dive_count_today else None,
+            sample_interval=sample_interval,
+            temp_offset=plan["temp_offset"],
+            personality=plan["personality"],
+        )
+        session.tissue = tissue
+        session.record_dive_end(plan["datetime"] + timedelta(minutes=plan["duration"]), {
+            "max_depth": plan["max_depth"],
+            "duration": plan["duration"],
+        })
+        record = dict(plan)
+        record["tank_config"] = tank_config
+        record["profile"] = profile
+        record["gas_switches"] = gas_switches
+        records.append(record)
+    return records
+
+
+def generate_dive_records(plans: List[Dict], sample_interval: int, workers: int = 1) -> Iterator[Dict]:
+    """Generate profiles for planned dives, yielding records in plan order.
+
+    Args:
+        plans: Output of plan_dives
+        sample_interval: Profile sample interval in seconds
+        workers: Number of worker processes; 1 generates in-process. Output is
+            identical for any worker count.
+    """
+    chains = split_session_chains(plans)
+    generate_chain = functools.partial(generate_session_chain, sample_interval=sample_interval)
+
+    if workers <= 1:
+        for chain in chains:
+            yield from generate_chain(chain)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for records in executor.map(generate_chain, chains, chunksize=max(1, len(chains) // (workers * 8))):
+            yield from records
+
+
+def logbook_date_range(end_date: datetime = None) -> Tuple[datetime, datetime]:
+    """Logbook span: five years ending two weeks ago.
+
+    Anchored to midnight so every run on the same day plans identical dive
+    times (the clock's seconds used to leak into them).
+
+    Args:
+        end_date: Pin the end of the logbook instead (DiveCache.end_date
+            keeps it across days so cached dives stay valid)
+
+    Returns:
+        Tuple of (start_date, end_date)
+    """
+    if end_date is None:
+        end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(weeks=2)
+    return end_date - timedelta(days=5*365), end_date
+
+
+def logbook_catalog(seed: int = 42, num_buddies: int = 50):
+    """Date range, buddies and trips iter_dives plans the logbook around.
+
+    They come from a private stream that draws what generate_uddf draws
+    from the random module after random.seed(seed), so the random module
+    is left alone.
+
+    Returns:
+        (rng, start_date, end_date, buddies, trips), where rng is the stream
+        positioned to plan the dives
+    """
+    rng = random.Random(seed)
+    start_date, end_date = logbook_date_range()
+    buddies = generate_buddies(num_buddies, rng=rng)
+    trips = generate_trips(start_date, end_date, num_trips=20, rng=rng)
+    return rng, start_date, end_date, buddies, trips
+
+
+def iter_dives(
+    num_dives: int = 500,
+    seed: int = 42,
+    sample_interval: int = 5,
+    max_sites: int = None,
+    num_buddies: int = 50,
+    profile_engine: str = "ticks",
+) -> Iterator[Dict]:
+    """Yield the logbook's dives one at a time as complete records.
+
+    The dives are the ones generate_uddf writes for the same arguments. Plans
+    are drawn lazily and profiles generated one diving day at a time, so
+    memory stays flat however many dives are requested.
+
+    Args:
+        num_dives: Number of dives to plan
+        seed: Random seed for the whole logbook
+        sample_interval: Profile sample interval in seconds
+        max_sites: Maximum number of dive sites to use (None = all sites)
+        num_buddies: Size of the buddy list dives draw from
+        profile_engine: "ticks" (generate_dive_profile) or "segments"
+            (generate_segment_profile)
+
+    Yields:
+        Plan fields (datetime, site_idx, buddy_ids, conditions, sightings,
+        notes, ...) plus "profile" (DiveProfile), "tank_config" with actual
+        start/end pressures, "gas_switches", and the "site" and "center" dicts
+    """
+    sites_to_use = DIVE_SITES[:max_sites] if max_sites else DIVE_SITES
+    centers_to_use = DIVE_CENTERS[:max_sites] if max_sites else DIVE_CENTERS
+
+    rng, start_date, end_date, buddies, trips = logbook_catalog(seed, num_buddies)
+    plans = iter_plans(num_dives, sites_to_use, centers_to_use, buddies, trips, start_date, end_date, rng=rng)
+    for chain in iter_session_chains(plans):
+        for plan in chain:
+            plan["profile_engine"] = profile_engine
+        # Profile generation reseeds the random module per dive; hand the
+        # caller's state back afterwards
+        caller_state = random.getstate()
+        records = generate_session_chain(chain, sample_interval)
+        random.setstate(caller_state)
+        for record in records:
+            record["site"] = sites_to_use[record["site_idx"]]
+            record["center"] = centers_to_use[record["center_idx"]]
+            yield record
+
+
+def dive_record_to_json(record: Dict) -> Dict:
+    """JSON-serializable copy of an iter_dives record.
+
+    The profile becomes a dict of sample columns, datetimes become ISO 8601
+    strings and the personality its public attributes.
+    """
+    profile = record["profile"]
+    result = dict(record)
+    result["datetime"] = record["datetime"].strftime("%Y-%m-%dT%H:%M:%S")
+    result["personality"] = {
+        k: v for k, v in vars(record["personality"]).items() if not k.startswith("_")
+    }
+    result["profile"] = {
+        "divetime": profile.divetime.tolist(),
+        "depth": profile.depth.tolist(),
+        "temperature": profile.temperature.tolist(),
+        "tank_pressures": [column.tolist() for column in profile.tank_pressures],
+    }
+    return result
+
+
+def write_dives_jsonl(output_path: str, records: Iterator[Dict]) -> int:
+    """Write one JSON object per dive record, one per line.
+
+    Returns:
+        Number of dives written
+    """
+    count = 0
+    with open(output_path, "w") as f:
+        for record in records:
+            f.write(json.dumps(dive_record_to_json(record)))
+            f.write("\n")
+            count += 1
+    return count
+
+
+# =============================================================================
+# SQLITE DATABASE OUTPUT
+# =============================================================================
+
+# The app's Drift schema, read so the emitted tables match it column for column
+APP_DATABASE_SOURCE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib", "core", "database", "database.dart"
+)
+
+# Columns the emitter fills per Drift table class, in insert order; every
+# other column takes its schema default
+SQLITE_COLUMNS = {
+    "Divers": ("id", "name", "is_default", "created_at", "updated_at"),
+    "DiveSites": (
+        "id", "diver_id", "name", "latitude", "longitude", "max_depth", "country", "region",
+        "water_type", "altitude", "created_at", "updated_at",
+    ),
+    "DiveCenters": (
+        "id", "diver_id", "name", "city", "country", "latitude", "longitude", "phone", "email",
+        "created_at", "updated_at",
+    ),
+    "Buddies": ("id", "diver_id", "name", "email", "created_at", "updated_at"),
+    "Trips": (
+        "id", "diver_id", "name", "start_date", "end_date", "location", "resort_name",
+        "liveaboard_name", "trip_type", "created_at", "updated_at",
+    ),
+    "Dives": (
+        "id", "diver_id", "dive_number", "dive_date_time", "entry_time", "exit_time", "runtime",
+        "max_depth", "avg_depth", "water_temp", "air_temp", "visibility_meters", "dive_type",
+        "notes", "site_id", "rating", "dive_center_id", "trip_id", "current_direction",
+        "current_strength", "swell_height", "entry_method", "exit_method", "water_type",
+        "altitude", "surface_pressure", "surface_interval_seconds", "weight_amount",
+        "import_version", "created_at", "updated_at",
+    ),
+    "DiveTanks": (
+        "id", "dive_id", "volume", "working_pressure", "start_pressure", "end_pressure",
+        "o2_percent", "he_percent", "tank_order", "tank_role", "tank_material",
+    ),
+    "DiveBuddies": ("id", "dive_id", "buddy_id", "role", "created_at"),
+    "DiveProfiles": ("id", "dive_id", "timestamp", "depth", "temperature"),
+    "TankPressureProfiles": ("id", "dive_id", "tank_id", "timestamp", "pressure"),
+    "GasSwitches": ("id", "dive_id", "timestamp", "tank_id", "depth", "created_at"),
+}
+
+# Buffered rows across all tables before an executemany flush
+SQLITE_BATCH_ROWS = 20000
+
+DRIFT_COLUMN_TYPES = {
+    "Text": "TEXT", "Int": "INTEGER", "Real": "REAL", "Bool": "INTEGER", "DateTime": "INTEGER", "Blob": "BLOB",
+}
+
+TANK_ROLES = {"main": "backGas", "stage": "stage"}
+
+
+def drift_sql_name(name: str) -> str:
+    """Drift's snake_case SQL name for a Dart class or getter name."""
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name).lower()
+
+
+def drift_table_ddl(source: str, table_class: str) -> Tuple[List[str], str]:
+    """Parse one Drift table class into its CREATE TABLE statement.
+
+    Handles the column builders database.dart uses: nullable(), constant
+    withDefault(), references() and a primaryKey override. The statement uses
+    IF NOT EXISTS like Drift's own createAll, so the app can still create the
+    remaining tables over the emitted file.
+
+    Args:
+        source: Text of lib/core/database/database.dart
+        table_class: Table class name, e.g. "DiveProfiles"
+
+    Returns:
+        Tuple of (column names in schema order, CREATE TABLE statement)
+    """
+    match = re.search(rf"^class {table_class} extends Table \{{(.*?)^\}}", source, re.S | re.M)
+    if match is None:
+        raise ValueError(f"Table class {table_class} not found in the app schema")
+    body = match.group(1)
+
+    columns, definitions = [], []
+    for kind, getter, chain in re.findall(r"(\w+)Column get (\w+)\s*=>\s*(.*?)\(\);", body, re.S):
+        name = drift_sql_name(getter)
+        parts = [f'"{name}" {DRIFT_COLUMN_TYPES[kind]}']
+        if ".nullable()" not in chain:
+            parts.append("NOT NULL")
+        default = re.search(r"withDefault\(\s*const Constant\((.*?)\),?\s*\)", chain, re.S)
+        if default:
+            value = {"true": "1", "false": "0"}.get(default.group(1), default.group(1))
+            parts.append(f"DEFAULT {value}")
+        if kind == "Bool":
+            parts.append(f'CHECK ("{name}" IN (0, 1))')
+        ref = re.search(r"references\(\s*(\w+),\s*#(\w+)(?:,\s*onDelete:\s*KeyAction\.(\w+))?", chain)
+        if ref:
+            parts.append(f"REFERENCES {drift_sql_name(ref.group(1))} ({drift_sql_name(ref.group(2))})")
+            if ref.group(3):
+                parts.append(f"ON DELETE {drift_sql_name(ref.group(3)).replace('_', ' ').upper()}")
+        columns.append(name)
+        definitions.append(" ".join(parts))
+
+    key = re.search(r"get primaryKey => \{(.*?)\}", body)
+    if key:
+        key_columns = ", ".join(f'"{drift_sql_name(c.strip())}"' for c in key.group(1).split(","))
+        definitions.append(f"PRIMARY KEY ({key_columns})")
+
+    table = drift_sql_name(table_class)
+    return columns, f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(definitions)})'
+
+
+def _epoch_ms(dt: datetime) -> int:
+    """Wall-clock-as-UTC epoch milliseconds, the app's storage convention."""
+    return int(dt.replace(tzinfo=timezone.utc).timestamp()) * 1000
+
+
+def dive_sqlite_rows(record: Dict, diver_id: str = "owner") -> Iterator[Tuple[str, tuple]]:
+    """Rows for one iter_dives record, as (table class, values) pairs.
+
+    Values follow SQLITE_COLUMNS order and the app's storage units: epoch
+    milliseconds, bar and degrees Celsius. IDs match the UDDF output's, so a
+    database and a file generated from the same seed describe the same dives.
+    """
+    dive_id = f"dive{record['dive_idx']+1:04d}"
+    site = record["site"]
+    conditions = record["conditions"]
+    profile = record["profile"]
+    entry_ms = _epoch_ms(record["datetime"])
+    runtime = record["duration"] * 60
+    altitude = site.get("altitude", 0)
+    surface_interval = record["surface_interval_minutes"]
+
+    yield "Dives", (
+        dive_id, diver_id, record["dive_number"], entry_ms, entry_ms, entry_ms + runtime * 1000, runtime,
+        record["max_depth"], sum(profile.depth) / len(profile), record["bottom_temp"],
+        record["air_temp_kelvin"] - 273.15, conditions["visibility"],
+        "technical" if record["is_tech"] else "recreational", record["notes"],
+        f"site{record['site_idx']+1:03d}", record["rating"], f"center_{record['center_idx']+1:03d}",
+        record["trip_id"], conditions["current_direction"], conditions["current_strength"],
+        conditions["swell_height"], conditions["entry_method"], conditions["exit_method"],
+        "fresh" if conditions["water_type"] == "freshwater" else "salt", altitude,
+        (1 - altitude / 44330) ** 5.255 * 1.01325 if altitude > 0 else 1.01325,
+        int(surface_interval * 60) if surface_interval is not None and surface_interval < 720 else None,
+        record["weight"], 1, entry_ms, entry_ms,
+    )
+
+    tank_ids = [f"{dive_id}_tank{i+1}" for i in range(len(record["tank_config"]))]
+    for i, (tank_id, tc) in enumerate(zip(tank_ids, record["tank_config"])):
+        mix = next((m for m in GAS_MIXES if m["id"] == tc["mix_id"]), GAS_MIXES[0])
+        yield "DiveTanks", (
+            tank_id, dive_id, tc["volume"], tc.get("working_pressure", 200),
+            tc.get("start_pressure_actual", 200 * 100000) / 100000,
+            tc.get("end_pressure_actual", 50 * 100000) / 100000,
+            mix["o2"] * 100, mix["he"] * 100, i, TANK_ROLES.get(tc["role"], "stage"), tc.get("material"),
+        )
+
+    for buddy_id in record["buddy_ids"]:
+        yield "DiveBuddies", (f"{dive_id}_{buddy_id}", dive_id, buddy_id, "buddy", entry_ms)
+
+    for j, (divetime, depth, temperature, pressures) in enumerate(profile.rows()):
+        yield "DiveProfiles", (f"{dive_id}_s{j}", dive_id, divetime, depth, temperature - 273.15)
+        for tank_id, pressure in zip(tank_ids, pressures):
+            yield "TankPressureProfiles", (f"{tank_id}_s{j}", dive_id, tank_id, divetime, pressure / 100000)
+
+    for k, gs in enumerate(record["gas_switches"]):
+        yield "GasSwitches", (f"{dive_id}_gs{k+1}", dive_id, gs["time"], tank_ids[gs["tank"]], gs["depth"], entry_ms)
+
+
+def generate_sqlite(
+    num_dives: int = 500,
+    output_path: str = "test_data.db",
+    sample_interval: int = 5,
+    max_sites: int = None,
+    seed: int = 42,
+    schema_source: str = APP_DATABASE_SOURCE,
+    num_buddies: int = 50,
+    profile_engine: str = "ticks",
+) -> Dict[str, int]:
+    """Write the logbook straight into a SQLite database in the app's schema.
+
+    Skips the app's UDDF import (parsing, geolocation lookups) when all a test
+    needs is a populated database. Only the tables the logbook fills are
+    created, from the app's own Drift definitions, and user_version is left at
+    0: on first open the app's onCreate adds the remaining tables, seeds and
+    schema version around the existing rows. Rows go in through batched
+    executemany calls inside a single transaction, in WAL mode.
+
+    Args:
+        num_dives: Number of dives to generate
+        output_path: Database file path (replaced if it exists)
+        sample_interval: Profile sample interval in seconds
+        max_sites: Maximum number of dive sites to include (None = all sites)
+        seed: Random seed for the whole logbook
+        schema_source: The app's database.dart
+        num_buddies: Size of the buddy list dives draw from
+        profile_engine: "ticks" or "segments", as for iter_dives
+
+    Returns:
+        Rows written per table
+    """
+    with open(schema_source, encoding="utf-8") as f:
+        source = f.read()
+    statements = {}
+    for table_class, columns in SQLITE_COLUMNS.items():
+        schema_columns, ddl = drift_table_ddl(source, table_class)
+        missing = sorted(set(columns) - set(schema_columns))
+        if missing:
+            raise ValueError(f"{table_class} has no column(s) {', '.join(missing)} in {schema_source}")
+        placeholders = ", ".join("?" * len(columns))
+        statements[table_class] = (
+            ddl,
+            f'INSERT INTO "{drift_sql_name(table_class)}" ({", ".join(columns)}) VALUES ({placeholders})',
+        )
+
+    for path in (output_path, output_path + "-wal", output_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    sites_to_use = DIVE_SITES[:max_sites] if max_sites else DIVE_SITES
+    centers_to_use = DIVE_CENTERS[:max_sites] if max_sites else DIVE_CENTERS
+
+    # Catalog rows are stamped with the logbook start so reruns are identical
+    _, start_date, _, buddies, trips = logbook_catalog(seed, num_buddies)
+    trips_by_id = {trip["id"]: trip for trip in trips}
+    stamp = _epoch_ms(start_date)
+
+    conn = sqlite3.connect(output_path, isolation_level=None)
+    counts = dict.fromkeys(SQLITE_COLUMNS, 0)
+    pending = {table_class: [] for table_class in SQLITE_COLUMNS}
+    buffered = 0
+
+    def add(table_class, row):
+        nonlocal buffered
+        pending[table_class].append(row)
+        buffered += 1
+        if buffered >= SQLITE_BATCH_ROWS:
+            flush()
+
+    def flush():
+        nonlocal buffered
+        for table_class, rows in pending.items():
+            if rows:
+                conn.executemany(statements[table_class][1], rows)
+                counts[table_class] += len(rows)
+                rows.clear()
+        buffered = 0
+
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("BEGIN")
+        for ddl, _ in statements.values():
+            conn.execute(ddl)
+
+        add("Divers", ("owner", "Test Diver", 1, stamp, stamp))
+        for i, site in enumerate(sites_to_use):
+            add("DiveSites", (
+                f"site{i+1:03d}", "owner", site["name"], site["lat"], site["lon"], site.get("max_depth"),
+                site.get("country"), site.get("region"),
+                "fresh" if site.get("water_type") == "freshwater" else "salt", site.get("altitude"),
+                stamp, stamp,
+            ))
+        for i, center in enumerate(centers_to_use):
+            add("DiveCenters", (
+                f"center_{i+1:03d}", "owner", center["name"], center.get("city"), center.get("country"),
+                center.get("lat"), center.get("lon"), center.get("phone"), center.get("email"), stamp, stamp,
+            ))
+        for buddy in buddies:
+            add("Buddies", (
+                buddy["id"], "owner", f"{buddy['firstname']} {buddy['lastname']}", buddy.get("email"), stamp, stamp,
+            ))
+
+        # Like the UDDF header, only trips that end up with dives. Each goes in
+        # with its first dive; SQLITE_COLUMNS order flushes Trips before Dives
+        trip_ids = set()
+        for record in iter_dives(num_dives, seed, sample_interval, max_sites, num_buddies, profile_engine):
+            if record["trip_id"] and record["trip_id"] not in trip_ids:
+                trip_ids.add(record["trip_id"])
+                trip = trips_by_id[record["trip_id"]]
+                add("Trips", (
+                    trip["id"], "owner", trip["name"], _epoch_ms(trip["start_date"]), _epoch_ms(trip["end_date"]),
+                    trip["location"], trip["resort_name"], trip["liveaboard_name"],
+                    "liveaboard" if trip["liveaboard_name"] else "resort", stamp, stamp,
+                ))
+            for table_class, row in dive_sqlite_rows(record):
+                add(table_class, row)
+        flush()
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+    return {drift_sql_name(table_class): count for table_class, count in counts.items()}
+
+
+def site_equipment_set(site: Dict) -> str:
+    """Name of the EQUIPMENT_SETS entry used at a site, based on water temperature."""
+    is_cold_water = site["country"] == "New Zealand" or \
+                    (site["country"] == "USA" and "California" in site.get("region", ""))
+    return "cold_water" if is_cold_water else "warm_water"
+
+
+class ReferenceCatalog:
+    """Pre-serialized cross-references to the logbook's shared definitions.
+
+    Built once per logbook, so a dive's links to its buddies, site and center,
+    and the <equipmentref> run of its site's equipment set, are table lookups
+    instead of per-dive formatting and element building. That keeps the
+    per-dive cost flat however many buddies or equipment items there are.
+    serialize_dive splices the fragments in.
+    """
+
+    def __init__(self, sites: List[Dict], centers: List[Dict], buddies: List[Dict]):
+        self.site_links = [f'<link ref="site{i+1:03d}" />'.encode() for i in range(len(sites))]
+        self.center_links = [f'<link ref="center_{i+1:03d}" />'.encode() for i in range(len(centers))]
+        self.buddy_links = {buddy["id"]: f"<link ref={quoteattr(buddy['id'])} />".encode() for buddy in buddies}
+        self.site_equipment = [site_equipment_set(site) for site in sites]
+        self.equipment_refs = {
+            set_name: "".join(f"<equipmentref>{escape(item['id'])}</equipmentref>" for item in items).encode()
+            for set_name, items in EQUIPMENT_SETS.items()
+        }
+
+    def links(self, record: Dict) -> bytes:
+        """The record's buddy, site and center <link> elements."""
+        buddy_links = self.buddy_links
+        return b"".join([buddy_links[buddy_id] for buddy_id in record["buddy_ids"]]) + \
+            self.site_links[record["site_idx"]] + self.center_links[record["center_idx"]]
 
-def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sample_interval: int = 5, max_sites: int = None):
+
+class SampleFormat:
+    """Fixed-decimal text formatting for <waypoint> samples.
+
+    Waypoints are most of a UDDF file, and building them as ElementTree nodes
+    spent most of the write time on per-sample element and attribute objects.
+    Here each dive gets one format string with its tank refs baked in, and a
+    sample is a single str.format call. The output is the same as ElementTree's
+    serialization. The defaults reproduce the generator's historical
+    2-decimal depth and temperature; fewer decimals make smaller files.
+    """
+
+    def __init__(self, depth_decimals: int = 2, temperature_decimals: int = 2):
+        self.depth_decimals = depth_decimals
+        self.temperature_decimals = temperature_decimals
+
+    def _template(self, tank_ids: List[str], switch: str = "") -> str:
+        tanks = "".join(f'<tankpressure ref="{tank_id}">{{}}</tankpressure>' for tank_id in tank_ids)
+        return (
+            f"<waypoint><depth>{{:.{self.depth_decimals}f}}</depth><divetime>{{}}</divetime>{tanks}"
+            f"<temperature>{{:.{self.temperature_decimals}f}}</temperature>{switch}</waypoint>"
+        )
+
+    def waypoints(self, record: Dict) -> str:
+        """The record's profile as concatenated <waypoint> elements."""
+        profile = record["profile"]
+        tank_ids = [f"dive{record['dive_idx']+1:04d}_tank{i+1}" for i in range(len(profile.tank_pressures))]
+        switch_times = {gs["time"]: gs["mix_id"] for gs in record["gas_switches"]}
+        waypoint = self._template(tank_ids).format
+
+        parts = []
+        for divetime, depth, temperature, pressures in profile.rows():
+            if divetime in switch_times:
+                switch = f'<switchmix><link ref="{switch_times[divetime]}" /></switchmix>'
+                parts.append(self._template(tank_ids, switch).format(depth, divetime, *pressures, temperature))
+            else:
+                parts.append(waypoint(depth, divetime, *pressures, temperature))
+        return "".join(parts)
+
+
+DEFAULT_SAMPLE_FORMAT = SampleFormat()
+
+
+def build_dive_element(
+    record: Dict, site: Dict, with_samples: bool = True, with_references: bool = True
+) -> ET.Element:
+    """Build the <dive> element for a generated dive record.
+
+    Args:
+        record: Record from generate_dive_records
+        site: The dive site the record's site_idx refers to
+        with_samples: Fill <samples> with waypoint elements; serialize_dive
+            leaves it empty and splices in formatted text instead
+        with_references: Add the buddy/site/center links and equipment refs;
+            serialize_dive leaves them out and splices in ReferenceCatalog
+            fragments instead
+
+    Returns:
+        Detached <dive> element, ready to be serialized on its own
+    """
+    dive_idx = record["dive_idx"]
+    course_ref = record["course_ref"]
+    conditions = record["conditions"]
+    tank_config = record["tank_config"]
+    profile = record["profile"]
+    max_depth = record["max_depth"]
+    duration = record["duration"]
+    site_type = record["site_type"]
+    is_tech = record["is_tech"]
+    surface_interval_minutes = record["surface_interval_minutes"]
+
+    # Build dive element
+    dive = ET.Element("dive")
+    dive.set("id", f"dive{dive_idx+1:04d}")
+
+    # informationbeforedive
+    before = ET.SubElement(dive, "informationbeforedive")
+    if with_references:
+        for buddy_id in record["buddy_ids"]:
+            link = ET.SubElement(before, "link")
+            link.set("ref", buddy_id)
+        site_link = ET.SubElement(before, "link")
+        site_link.set("ref", f"site{record['site_idx']+1:03d}")
+        center_link = ET.SubElement(before, "link")
+        center_link.set("ref", f"center_{record['center_idx']+1:03d}")
+    # Link to trip if this dive is part of one
+    if record["trip_id"]:
+        trip_link = ET.SubElement(before, "link")
+        trip_link.set("ref", f"trip_{record['trip_id']}")
+    # Link to training course if this is a course dive
+    if course_ref:
+        course_link = ET.SubElement(before, "link")
+        course_link.set("ref", course_ref)
+    ET.SubElement(before, "divenumber").text = str(record["dive_number"])
+    ET.SubElement(before, "datetime").text = record["datetime"].strftime("%Y-%m-%dT%H:%M:%S")
+    ET.SubElement(before, "airtemperature").text = f"{record['air_temp_kelvin']:.2f}"
+
+    # Entry type (parser expects this in informationbeforedive)
+    ET.SubElement(before, "entrytype").text = conditions["entry_method"]
+
+    # Altitude (0 for sea level dives, higher for highland sites)
+    altitude = site.get("altitude", 0)
+    ET.SubElement(before, "altitude").text = str(altitude)
+
+    # Surface pressure in Pascals (1 atm = 101325 Pa, adjusted for altitude)
+    surface_pressure_pa = 101325 * (1 - (altitude / 44330)) ** 5.255 if altitude > 0 else 101325
+    ET.SubElement(before, "surfacepressure").text = str(int(surface_pressure_pa))
+
+    equipused = ET.SubElement(before, "equipmentused")
+    ET.SubElement(equipused, "leadquantity").text = f"{record['weight']:.1f}"
+
+    # Add equipment references
+    if with_references:
+        for item in EQUIPMENT_SETS[site_equipment_set(site)]:
+            equip_ref = ET.SubElement(equipused, "equipmentref")
+            equip_ref.text = item["id"]
+
+    # tankdata elements with IDs (critical for multi-tank pressure refs)
+    for i, tc in enumerate(tank_config):
+        tank_id = f"dive{dive_idx+1:04d}_tank{i+1}"
+        tankdata = ET.SubElement(dive, "tankdata")
+        tankdata.set("id", tank_id)
+
+        mix_link = ET.SubElement(tankdata, "link")
+        mix_link.set("ref", tc["mix_id"])
+
+        # UDDF uses cubic meters, but liters is common practice
+        ET.SubElement(tankdata, "tankvolume").text = f"{tc['volume']:.2f}"
+
+        start_p = tc.get("start_pressure_actual", 200 * 100000)
+        end_p = tc.get("end_pressure_actual", 50 * 100000)
+        ET.SubElement(tankdata, "tankpressurebegin").text = str(int(start_p))
+        ET.SubElement(tankdata, "tankpressureend").text = str(int(end_p))
+
+        # Tank working pressure in Pascal (bar * 100000) - required by parser
+        working_p = tc.get("working_pressure", 200) * 100000
+        ET.SubElement(tankdata, "tankworkingpressure").text = str(int(working_p))
+
+        # Tank material (matches Dart TankMaterial enum: aluminum, steel, carbonFiber)
+        if tc.get("material"):
+            ET.SubElement(tankdata, "tankmaterial").text = tc["material"]
+
+    # samples: one waypoint per profile sample, with a tankpressure per tank
+    # (ref attributes are KEY FOR MULTI-TANK SUPPORT) and switchmix at gas switches
+    samples = ET.SubElement(dive, "samples")
+    if with_samples:
+        samples.extend(ET.fromstring(f"<samples>{DEFAULT_SAMPLE_FORMAT.waypoints(record)}</samples>"))
+
+    # informationafterdive
+    after = ET.SubElement(dive, "informationafterdive")
+    ET.SubElement(after, "greatestdepth").text = f"{max_depth:.2f}"
+    avg_depth = sum(profile.depth) / len(profile)
+    ET.SubElement(after, "averagedepth").text = f"{avg_depth:.2f}"
+    ET.SubElement(after, "diveduration").text = str(duration * 60)
+    ET.SubElement(after, "lowesttemperature").text = f"{record['bottom_temp'] + 273.15:.2f}"
+    ET.SubElement(after, "visibility").text = str(conditions["visibility"])
+    ET.SubElement(after, "currentstrength").text = conditions["current_strength"]
+
+    # Rating with nested ratingvalue (parser expects this structure)
+    rating_elem = ET.SubElement(after, "rating")
+    ET.SubElement(rating_elem, "ratingvalue").text = str(record["rating"])
+
+    # Water type (salt/fresh)
+    water_type = "fresh" if conditions["water_type"] == "freshwater" else "salt"
+    ET.SubElement(after, "watertype").text = water_type
+
+    # Surface interval for repetitive dives
+    if surface_interval_minutes is not None and surface_interval_minutes < 720:  # Less than 12 hours
+        ET.SubElement(after, "surfaceinterval").text = str(int(surface_interval_minutes * 60))
+
+    # Swell height for ocean dives (parser expects swellheight)
+    if conditions["swell_height"] > 0:
+        ET.SubElement(after, "swellheight").text = f"{conditions['swell_height']:.1f}"
+
+    # Exit method (parser expects exittype; entry is already in informationbeforedive)
+    ET.SubElement(after, "exittype").text = conditions["exit_method"]
+
+    # Current direction if there's current
+    if conditions["current_direction"]:
+        ET.SubElement(after, "currentdirection").text = conditions["current_direction"]
+
+    # Dive notes (generated based on site, sightings, conditions)
+    ET.SubElement(after, "notes").text = record["notes"]
+
+    # Marine life sightings (parser expects sightings with speciesref/count attributes)
+    if record["sightings"]:
+        sightings_elem = ET.SubElement(after, "sightings")
+        for sighting in record["sightings"]:
+            sighting_elem = ET.SubElement(sightings_elem, "sighting")
+            # Create a species ref ID from species name (normalize to valid ID)
+            species_id = f"species_{sighting['species'].lower().replace(' ', '_').replace('-', '_')}"
+            sighting_elem.set("speciesref", species_id)
+            sighting_elem.set("count", str(sighting["count"]))
+
+    # Tags (based on site type, dive characteristics)
+    dive_tags = []
+    if site_type == "wall":
+        dive_tags.append("wall")
+    elif site_type == "wreck":
+        dive_tags.append("wreck")
+    elif site_type == "drift":
+        dive_tags.append("drift")
+    elif site_type == "cenote":
+        dive_tags.append("cave")
+    if max_depth > 30:
+        dive_tags.append("deep")
+    if is_tech:
+        dive_tags.append("technical")
+    if conditions["current_strength"] in ["moderate", "strong"]:
+        dive_tags.append("current")
+
+    if dive_tags:
+        tags_elem = ET.SubElement(after, "tags")
+        for tag_name in dive_tags:
+            tagref = ET.SubElement(tags_elem, "tagref")
+            tagref.text = f"tag_{tag_name}"
+
+    return dive
+
+
+def serialize_element(elem: ET.Element) -> bytes:
+    """UTF-8 bytes of an element, as UddfStreamWriter writes it."""
+    return ET.tostring(elem, encoding="unicode").encode("utf-8")
+
+
+def serialize_dive(
+    record: Dict, site: Dict, sample_format: SampleFormat = None, catalog: ReferenceCatalog = None
+) -> bytes:
+    """UTF-8 bytes of a record's <dive> element, samples formatted as text.
+
+    Same bytes as serialize_element(build_dive_element(record, site)) for the
+    default format, without building a node per sample. With a catalog, the
+    cross-references are spliced in from its fragments as well.
+    """
+    dive = build_dive_element(record, site, with_samples=False, with_references=catalog is None)
+    waypoints = (sample_format or DEFAULT_SAMPLE_FORMAT).waypoints(record)
+    splices = {"samples": (b"", waypoints.encode("utf-8"))}
+    if catalog is not None:
+        splices["informationbeforedive"] = (catalog.links(record), b"")
+        splices["equipmentused"] = (b"", catalog.equipment_refs[catalog.site_equipment[record["site_idx"]]])
+    buffer = io.BytesIO()
+    write_spliced(UddfStreamWriter(buffer), dive, splices)
+    return buffer.getvalue()
+
+
+def write_spliced(writer: "UddfStreamWriter", elem: ET.Element, splices: Dict[str, Tuple[bytes, bytes]]):
+    """
+    Write an element, adding pre-serialized content inside some descendants.
+
+    Elements named in splices, and their ancestors, are written tag by tag
+    with the writer; every other subtree is serialized whole. Spliced
+    elements must have no text of their own.
+
+    Args:
+        writer: Writer positioned where elem goes
+        elem: Element to write
+        splices: Tag name to (leading, trailing) bytes written before the
+            element's first child and after its last
+    """
+    if not any(descendant.tag in splices for descendant in elem.iter()):
+        writer.write_element(elem)
+        return
+    leading, trailing = splices.get(elem.tag, (b"", b""))
+    writer.open_section(elem.tag, elem.attrib)
+    writer.write_fragment(leading)
+    for child in elem:
+        write_spliced(writer, child, splices)
+    writer.write_fragment(trailing)
+    writer.close_section(elem.tag)
+
+
+# Bump when the cache file layout or key recipe changes
+DIVE_CACHE_VERSION = 1
+
+
+def _stable_json(value) -> str:
+    """Deterministic JSON for cache keys (objects hash by their public attributes)."""
+    def default(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return {k: v for k, v in vars(obj).items() if not k.startswith("_")}
+    return json.dumps(value, sort_keys=True, default=default)
+
+
+def top_level_sources() -> Dict[str, str]:
+    """Source text of each module-level function and class, by name."""
+    with open(__file__, encoding="utf-8") as f:
+        source = f.read()
+    lines = source.splitlines(keepends=True)
+    sources = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            sources[node.name] = "".join(lines[start - 1:node.end_lineno])
+    return sources
+
+
+def code_dependencies(roots: List[str]) -> Dict[str, str]:
+    """
+    Module-level functions, classes and constants reachable from roots.
+
+    Follows every identifier in the code of each root (comments and strings
+    excluded) to this module's globals, recursively, so a helper that a
+    profile or serializer function starts calling is picked up without a
+    hand-maintained list.
+
+    Args:
+        roots: Names of module-level functions or classes
+
+    Returns:
+        Dict of global name to its source text (functions and classes) or
+        the JSON of its value (UPPER_CASE constants)
+    """
+    definitions = top_level_sources()
+    namespace = globals()
+    found = {name: definitions[name] for name in roots}
+    pending = list(roots)
+    while pending:
+        for token in tokenize.generate_tokens(io.StringIO(definitions[pending.pop()]).readline):
+            name = token.string
+            if token.type != tokenize.NAME or name in found:
+                continue
+            if name in definitions:
+                found[name] = definitions[name]
+                pending.append(name)
+            elif name.isupper() and isinstance(namespace.get(name), (dict, list, tuple, str, int, float)):
+                found[name] = _stable_json(namespace[name])
+    return found
+
+
+# Entry point of everything a cached <dive> fragment's bytes depend on
+DIVE_CACHE_ROOTS = ["serialize_session_chain"]
+
+
+@functools.lru_cache(maxsize=None)
+def dive_cache_fingerprint() -> str:
+    """Hash of the generator code and shared data every cached dive depends on."""
+    digest = hashlib.sha256(f"v{DIVE_CACHE_VERSION}".encode())
+    for name, text in sorted(code_dependencies(DIVE_CACHE_ROOTS).items()):
+        digest.update(f"{name}\n{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DiveCache:
+    """On-disk cache of serialized <dive> fragments.
+
+    Entries are keyed by (dive index, seed, input hash). The hash covers the
+    dive's plan (including its thermocline profile, conditions and
+    personality), its site, the sample interval, dive_cache_fingerprint(), and
+    the hashes of the earlier dives of its day, whose tissue loading it
+    inherits. Tweaking one THERMOCLINE_PROFILES entry therefore only
+    regenerates the days that dive in that water. Dive dates are planned back
+    from end_date(), which the first run pins in the cache directory, so
+    entries stay valid on later days.
+    """
+
+    ANCHOR_FILE = "anchor.json"
+
+    def __init__(self, cache_dir: str, seed: int):
+        self.cache_dir = cache_dir
+        self.seed = seed
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def end_date(self) -> datetime:
+        """Logbook end date of the first run that used this cache directory."""
+        path = os.path.join(self.cache_dir, self.ANCHOR_FILE)
+        try:
+            with open(path) as f:
+                return datetime.fromisoformat(json.load(f)["end_date"])
+        except FileNotFoundError:
+            pass
+        end_date = logbook_date_range()[1]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"end_date": end_date.isoformat()}, f)
+        os.replace(tmp_path, path)
+        return end_date
+
+    def keys(
+        self, chain: List[Dict], sites: List[Dict], sample_interval: int, sample_format: SampleFormat = None
+    ) -> List[str]:
+        """Input hash of each planned dive of one diving day."""
+        keys = []
+        previous = dive_cache_fingerprint()
+        fields = [sample_interval, sample_format or DEFAULT_SAMPLE_FORMAT]
+        for plan in chain:
+            digest = hashlib.sha256(previous.encode())
+            digest.update(_stable_json([plan, sites[plan["site_idx"]], fields]).encode("utf-8"))
+            previous = digest.hexdigest()
+            keys.append(previous)
+        return keys
+
+    def _prefix(self, dive_idx: int) -> str:
+        return os.path.join(self.cache_dir, f"dive{dive_idx+1:05d}_seed{self.seed}_")
+
+    def get(self, dive_idx: int, key: str):
+        """Cached fragment for a dive, or None."""
+        try:
+            with open(self._prefix(dive_idx) + key + ".xml", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, dive_idx: int, key: str, fragment: bytes):
+        """Store a fragment, replacing any stale entry for the same dive and seed."""
+        prefix = self._prefix(dive_idx)
+        path = prefix + key + ".xml"
+        for stale in glob.glob(glob.escape(prefix) + "*.xml"):
+            if stale != path:
+                os.remove(stale)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(fragment)
+        os.replace(tmp_path, path)
+
+    def prune(self, num_dives: int):
+        """Remove this seed's entries for dives past num_dives.
+
+        put() only replaces entries for the same dive index, so without this a
+        run with fewer dives would leave the extra dives' entries forever.
+        """
+        pattern = re.compile(rf"dive(\d+)_seed{re.escape(str(self.seed))}_[0-9a-f]+\.xml")
+        for name in os.listdir(self.cache_dir):
+            match = pattern.fullmatch(name)
+            if match and int(match.group(1)) > num_dives:
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def serialize_session_chain(
+    chain: List[Dict],
+    sample_interval: int,
+    sites: List[Dict],
+    cache: DiveCache = None,
+    sample_format: SampleFormat = None,
+    catalog: ReferenceCatalog = None,
+) -> List[bytes]:
+    """Serialized <dive> fragments for one diving day, reusing cached ones.
+
+    A cache miss regenerates the whole day, since a dive's profile depends on
+    the tissue loading left by the dives before it; dives that were hits keep
+    their cached bytes.
+    """
+    if cache is None:
+        return [
+            serialize_dive(record, sites[record["site_idx"]], sample_format, catalog)
+            for record in generate_session_chain(chain, sample_interval)
+        ]
+
+    keys = cache.keys(chain, sites, sample_interval, sample_format)
+    fragments = [cache.get(plan["dive_idx"], key) for plan, key in zip(chain, keys)]
+    if None not in fragments:
+        return fragments
+
+    for i, record in enumerate(generate_session_chain(chain, sample_interval)):
+        if fragments[i] is None:
+            fragments[i] = serialize_dive(record, sites[record["site_idx"]], sample_format, catalog)
+            cache.put(record["dive_idx"], keys[i], fragments[i])
+    return fragments
+
+
+def serialize_dives(
+    plans: List[Dict],
+    sites: List[Dict],
+    sample_interval: int,
+    workers: int = 1,
+    cache: DiveCache = None,
+    sample_format: SampleFormat = None,
+    catalog: ReferenceCatalog = None,
+) -> Iterator[bytes]:
+    """Generate and serialize planned dives, yielding <dive> fragments in plan order.
+
+    Args:
+        plans: Output of plan_dives
+        sites: Sites the plans' site_idx values index into
+        sample_interval: Profile sample interval in seconds
+        workers: Number of worker processes; output is identical for any count
+        cache: Reuse and store fragments in this cache (None = always generate)
+        sample_format: Waypoint number formatting (None = DEFAULT_SAMPLE_FORMAT)
+        catalog: Cross-reference fragments for sites and buddies (None = build
+            the references per dive)
+    """
+    serialize_chain = functools.partial(
+        serialize_session_chain, sample_interval=sample_interval, sites=sites, cache=cache,
+        sample_format=sample_format, catalog=catalog,
+    )
+    chains = split_session_chains(plans)
+
+    if workers <= 1:
+        for chain in chains:
+            yield from serialize_chain(chain)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for fragments in executor.map(serialize_chain, chains, chunksize=max(1, len(chains) // (workers * 8))):
+            yield from fragments
+
+
+class UddfStreamWriter:
+    """Incremental UDDF writer.
+
+    Writes the root start tag, then one detached element at a time, so callers
+    can build, serialize and drop each <dive> instead of holding the whole
+    ElementTree. The bytes match ElementTree.write() of the equivalent tree.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._root_tag = None
+
+    def start(self, root: ET.Element):
+        """Write the XML declaration and the root start tag (children are not written)."""
+        self._root_tag = root.tag
+        self._stream.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+        self.open_section(root.tag, root.attrib)
+
+    def open_section(self, tag: str, attrib: Dict[str, str] = None):
+        """Write a start tag for an element whose children are streamed."""
+        attrs = "".join(f" {name}={quoteattr(value)}" for name, value in (attrib or {}).items())
+        self._stream.write(f"<{tag}{attrs}>".encode("utf-8"))
+
+    def close_section(self, tag: str):
+        """Write the end tag matching an open_section call."""
+        self._stream.write(f"</{tag}>".encode("utf-8"))
+
+    def write_element(self, elem: ET.Element):
+        """Serialize a complete element at the current position."""
+        self._stream.write(serialize_element(elem))
+
+    def write_fragment(self, fragment: bytes):
+        """Write an element already serialized with serialize_element."""
+        self._stream.write(fragment)
+
+    def end(self):
+        """Close the root element."""
+        self.close_section(self._root_tag)
+
+
+# Output compression: (file extension, opener). Streams are compressed as they
+# are written; gzip headers carry no timestamp so reruns are byte-identical.
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def zstd_available() -> bool:
+    """Whether open_output can write zstd (Python 3.14+ or the zstandard package)."""
+    for module_name in ("compression.zstd", "zstandard"):
+        try:
+            importlib.import_module(module_name)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+def open_output(output_path: str, compression: str = None):
+    """Open output_path for binary writing, compressing on the fly.
+
+    Args:
+        compression: None, "gzip", or "zstd" (Python 3.14's compression.zstd,
+            or the zstandard package on older versions)
+    """
+    if compression is None:
+        return open(output_path, "wb")
+    if compression == "gzip":
+        return gzip.GzipFile(output_path, "wb", compresslevel=6, mtime=0)
+    if compression == "zstd":
+        try:
+            from compression import zstd
+            return zstd.open(output_path, "wb")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd output needs Python 3.14+ or the zstandard package") from None
+        return zstandard.ZstdCompressor().stream_writer(open(output_path, "wb"), closefd=True)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def write_uddf_file(
+    output_path: str,
+    root: ET.Element,
+    appdata: ET.Element,
+    dives: Iterator[bytes],
+    progress_total: int = None,
+    compression: str = None,
+) -> int:
+    """Stream a UDDF file: root's header sections, the dives, then appdata.
+
+    Each <dive> fragment is written as soon as it arrives, so peak memory does
+    not grow with the number of dives.
+
+    Args:
+        output_path: Output file path
+        root: <uddf> element holding the header sections
+        appdata: <applicationdata> element, written after profiledata
+        dives: Serialized <dive> elements, e.g. from serialize_dives
+        progress_total: Print progress every 50 dives out of this total (None = quiet)
+        compression: Compress the stream as it is written (see open_output)
+
+    Returns:
+        Number of dives written
+    """
+    count = 0
+    with open_output(output_path, compression) as f:
+        writer = UddfStreamWriter(f)
+        writer.start(root)
+        for section in root:
+            writer.write_element(section)
+
+        writer.open_section("profiledata")
+        writer.open_section("repetitiongroup", {"id": "rg1"})
+        for fragment in dives:
+            writer.write_fragment(fragment)
+            count += 1
+            if progress_total and count % 50 == 0:
+                print(f"Generated {count} / {progress_total} dives...")
+        writer.close_section("repetitiongroup")
+        writer.close_section("profiledata")
+
+        writer.write_element(appdata)
+        writer.end()
+    return count
+
+
+# Shared definitions a shard only carries when one of its dives links to them:
+# (section path under <uddf> or <applicationdata>, element tag, ID attribute)
+SHARDED_DEFINITIONS = [
+    (".", "divetrip", "id"),
+    ("gasdefinitions", "mix", "id"),
+    ("divesite", "site", "id"),
+    ("diveoperator", "divebase", "id"),
+    ("diver", "buddy", "id"),
+    ("diver/owner/equipment", "equipmentconfiguration", "id"),
+    ("diver/owner/equipment", "piece", "id"),
+    ("submersion/tripextended", "trip", "tripref"),
+    ("submersion/divecenters", "center", "id"),
+    ("submersion/equipment", "item", "id"),
+    ("submersion/equipmentsets", "set", "id"),
+]
+
+
+def split_shards(plans: List[Dict], shard_size: int) -> List[List[Dict]]:
+    """Group planned dives into shards of about shard_size dives.
+
+    Shards only break between diving days, so every dive keeps the residual
+    tissue loading it has in a single-file logbook; a shard may run a few dives
+    over shard_size to finish its last day.
+    """
+    shards = []
+    for chain in split_session_chains(plans):
+        if not shards or len(shards[-1]) >= shard_size:
+            shards.append([])
+        shards[-1].extend(chain)
+    return shards
+
+
+def referenced_ids(plans: List[Dict], sites: List[Dict]) -> set:
+    """IDs of every shared definition the planned dives link to."""
+    ids = set()
+    site_indices, center_indices = set(), set()
+    for plan in plans:
+        ids.update(tc["mix_id"] for tc in plan["tank_config"])
+        site_indices.add(plan["site_idx"])
+        center_indices.add(plan["center_idx"])
+        ids.update(plan["buddy_ids"])
+        if plan["trip_id"]:
+            ids.add(f"trip_{plan['trip_id']}")
+    # Expand per distinct site and equipment set rather than per dive
+    ids.update(f"site{i+1:03d}" for i in site_indices)
+    ids.update(f"center_{i+1:03d}" for i in center_indices)
+    for set_name in {site_equipment_set(sites[i]) for i in site_indices}:
+        ids.update((f"config_{set_name}", f"set_{set_name}"))
+        ids.update(item["id"] for item in EQUIPMENT_SETS[set_name])
+    return ids
+
+
+def prune_definitions(root: ET.Element, appdata: ET.Element, ids: set) -> Tuple[ET.Element, ET.Element]:
+    """Copy root and appdata, dropping SHARDED_DEFINITIONS entries not in ids."""
+    root = copy.deepcopy(root)
+    appdata = copy.deepcopy(appdata)
+    for path, tag, attr in SHARDED_DEFINITIONS:
+        top = appdata if path.startswith("submersion") else root
+        for parent in top.findall(path):
+            for child in parent.findall(tag):
+                if child.get(attr) not in ids:
+                    parent.remove(child)
+    # Drop sections left empty (the UDDF schema requires at least one child)
+    tripext = appdata.find("submersion/tripextended")
+    if tripext is not None and len(tripext) == 0:
+        appdata.find("submersion").remove(tripext)
+    return root, appdata
+
+
+def write_shard(
+    output_path: str,
+    root: ET.Element,
+    appdata: ET.Element,
+    plans: List[Dict],
+    sites: List[Dict],
+    sample_interval: int,
+    cache: DiveCache = None,
+    sample_format: SampleFormat = None,
+    compression: str = None,
+    catalog: ReferenceCatalog = None,
+) -> Dict:
+    """Generate and write one self-contained shard.
+
+    Returns:
+        The shard's manifest entry
+    """
+    root, appdata = prune_definitions(root, appdata, referenced_ids(plans, sites))
+    dives = serialize_dives(
+        plans, sites, sample_interval, cache=cache, sample_format=sample_format, catalog=catalog
+    )
+    write_uddf_file(output_path, root, appdata, dives, compression=compression)
+    return {
+        "file": os.path.basename(output_path),
+        "dives": len(plans),
+        "first_dive_number": plans[0]["dive_number"],
+        "last_dive_number": plans[-1]["dive_number"],
+        "first_datetime": plans[0]["datetime"].strftime("%Y-%m-%dT%H:%M:%S"),
+        "last_datetime": plans[-1]["datetime"].strftime("%Y-%m-%dT%H:%M:%S"),
+        "sites": len(root.find("divesite")),
+        "buddies": len(root.find("diver").findall("buddy")),
+        "trips": len(root.findall("divetrip")),
+        "bytes": os.path.getsize(output_path),
+    }
+
+
+def write_shards(
+    output_path: str,
+    root: ET.Element,
+    appdata: ET.Element,
+    plans: List[Dict],
+    sites: List[Dict],
+    sample_interval: int,
+    shard_size: int,
+    workers: int = 1,
+    seed: int = None,
+    cache: DiveCache = None,
+    sample_format: SampleFormat = None,
+    compression: str = None,
+    catalog: ReferenceCatalog = None,
+) -> str:
+    """Write the logbook as self-contained UDDF shards plus a JSON manifest.
+
+    Shards are named after output_path (test_data.uddf -> test_data_001.uddf,
+    ...) and the manifest is written to test_data.manifest.json. With more
+    than one worker, shards are generated and written in parallel; each
+    shard's bytes are identical for any worker count. Compressed shards get
+    the compression's extension (test_data_001.uddf.gz).
+
+    Returns:
+        Path of the manifest
+    """
+    stem, ext = os.path.splitext(output_path)
+    shards = split_shards(plans, shard_size)
+    width = max(3, len(str(len(shards))))
+    suffix = COMPRESSION_SUFFIXES.get(compression, "")
+    paths = [f"{stem}_{i+1:0{width}d}{ext or '.uddf'}{suffix}" for i in range(len(shards))]
+    jobs = [
+        (path, root, appdata, shard, sites, sample_interval, cache, sample_format, compression, catalog)
+        for path, shard in zip(paths, shards)
+    ]
+
+    manifest_entries = []
+    if workers <= 1:
+        for entry in itertools.starmap(write_shard, jobs):
+            manifest_entries.append(entry)
+            print(f"Wrote {entry['file']} ({entry['dives']} dives)")
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for entry in executor.map(write_shard, *zip(*jobs)):
+                manifest_entries.append(entry)
+                print(f"Wrote {entry['file']} ({entry['dives']} dives)")
+
+    manifest_path = f"{stem}.manifest.json"
+    manifest = {
+        "generator": "Submersion UDDF Test Generator",
+        "version": "1.0.0",
+        "seed": seed,
+        "sample_interval": sample_interval,
+        "shard_size": shard_size,
+        "total_dives": len(plans),
+        "shards": manifest_entries,
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest_path
+
+
+# Stages timed by --profile: (owner, attribute, stage name). Module-level
+# functions are looked up as globals at call time, so replacing the module
+# attribute reaches every caller.
+PROFILED_STAGES = [
+    (sys.modules[__name__], "plan_dives", "plan_dives"),
+    (sys.modules[__name__], "generate_dive_profile", "generate_dive_profile"),
+    (sys.modules[__name__], "generate_segment_profile", "generate_segment_profile"),
+    (TissueState, "update", "tissue.update"),
+    (TissueState, "update_segment", "tissue.update_segment"),
+    (TissueState, "update_linear", "tissue.update_linear"),
+    (TissueState, "gf_ceiling", "tissue.gf_ceiling"),
+    (sys.modules[__name__], "calculate_temperature_at_depth", "calculate_temperature_at_depth"),
+    (ThermoclineField, "at", "thermocline.at"),
+    (sys.modules[__name__], "apply_micro_event", "apply_micro_event"),
+    (sys.modules[__name__], "build_dive_element", "build_dive_element"),
+    (SampleFormat, "waypoints", "format_waypoints"),
+    (sys.modules[__name__], "serialize_element", "serialize_element"),
+    (UddfStreamWriter, "write_fragment", "write"),
+]
+
+
+class StageProfiler:
+    """Lightweight call counters and timers for the PROFILED_STAGES.
+
+    install() swaps each stage for a timing wrapper and uninstall() restores
+    the originals, so runs without --profile pay nothing. Nested stages are
+    tracked on a stack, which yields per-stage totals as well as collapsed
+    stacks ("a;b;c <self microseconds>") for flamegraph.pl or speedscope.
+    Only the current process is measured.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.self_seconds = {}  # keyed by collapsed stack
+        self._stack = []  # [name, seconds spent in child stages]
+        self._installed = []
+
+    def _enter(self, name: str):
+        self._stack.append([name, 0.0])
+
+    def _exit(self, elapsed: float):
+        name, child_seconds = self._stack.pop()
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+        path = ";".join([frame[0] for frame in self._stack] + [name])
+        self.self_seconds[path] = self.self_seconds.get(path, 0.0) + elapsed - child_seconds
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def wrap(self, name: str, func):
+        """Return func wrapped to record its calls and time as stage name."""
+        enter, exit_, perf_counter = self._enter, self._exit, time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            enter(name)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                exit_(perf_counter() - start)
+        return timed
+
+    def install(self, stages=None):
+        """Wrap every (owner, attribute, name) stage."""
+        for owner, attr, name in stages or PROFILED_STAGES:
+            original = owner.__dict__[attr] if isinstance(owner, type) else getattr(owner, attr)
+            self._installed.append((owner, attr, original))
+            setattr(owner, attr, self.wrap(name, original))
+
+    def uninstall(self):
+        """Restore the original functions."""
+        while self._installed:
+            owner, attr, original = self._installed.pop()
+            setattr(owner, attr, original)
+
+    def run(self, name: str, func, *args, **kwargs):
+        """Call func as a root stage."""
+        return self.wrap(name, func)(*args, **kwargs)
+
+    def report(self) -> str:
+        """Per-stage table, slowest first."""
+        total = max(self.seconds.values(), default=0.0) or 1.0
+        lines = [f"{'Stage':<32}{'Calls':>10}{'Total s':>10}{'us/call':>10}{'% run':>8}"]
+        for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+            calls = self.calls[name]
+            lines.append(
+                f"{name:<32}{calls:>10}{seconds:>10.3f}{seconds / calls * 1e6:>10.1f}{seconds / total * 100:>7.1f}%"
+            )
+        return "\n".join(lines)
+
+    def write_collapsed(self, path: str):
+        """Write collapsed stacks weighted by self time in microseconds."""
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.self_seconds.items()):
+                f.write(f"{stack} {max(0, round(seconds * 1e6))}\n")
+
+
+def generate_uddf(
+    num_dives: int = 500,
+    output_path: str = "test_data.uddf",
+    sample_interval: int = 5,
+    max_sites: int = None,
+    workers: int = 1,
+    seed: int = 42,
+    shard_size: int = None,
+    cache_dir: str = None,
+    profile: bool = False,
+    sample_format: SampleFormat = None,
+    compression: str = None,
+    num_buddies: int = 50,
+    profile_engine: str = "ticks",
+):
     """Generate UDDF 3.2.1 compliant file.
 
     Args:
@@ -2680,30 +5520,58 @@ def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sam
         output_path: Output file path
         sample_interval: Profile sample interval in seconds (5 for detailed, 30 for quick)
         max_sites: Maximum number of dive sites to include (None = all sites)
+        workers: Worker processes for profile generation (output is identical
+            for any value)
+        seed: Random seed for the whole logbook
+        shard_size: Split the logbook into self-contained files of about this
+            many dives plus a manifest (None = one file); with workers > 1 the
+            shards are written in parallel
+        cache_dir: Reuse serialized dives from this directory when their
+            inputs are unchanged, and store newly generated ones (None = no
+            cache); the logbook keeps the dates of the first run that used it
+        sample_format: Waypoint number formatting (None = 2 decimals for depth
+            and temperature)
+        compression: "gzip" or "zstd" to compress output as it is written;
+            the extension is appended to output_path (None = uncompressed)
+        num_buddies: Size of the buddy list dives draw from
+        profile_engine: "ticks" (generate_dive_profile) or "segments"
+            (generate_segment_profile, opt-in; profiles differ from ticks)
     """
+    if profile:
+        if workers > 1:
+            print("Profiling measures this process only; generating with 1 worker")
+        profiler = StageProfiler()
+        profiler.install()
+        try:
+            profiler.run(
+                "generate_uddf", generate_uddf, num_dives, output_path,
+                sample_interval=sample_interval, max_sites=max_sites, workers=1, seed=seed,
+                shard_size=shard_size, cache_dir=cache_dir, sample_format=sample_format,
+                compression=compression, num_buddies=num_buddies, profile_engine=profile_engine,
+            )
+        finally:
+            profiler.uninstall()
+        collapsed_path = os.path.splitext(output_path)[0] + ".folded"
+        profiler.write_collapsed(collapsed_path)
+        print(f"\nStage profile:\n{profiler.report()}")
+        print(f"\nCollapsed stacks for flame graphs: {collapsed_path}")
+        return
+
     # Limit sites if specified (speeds up import due to geolocation lookups)
     sites_to_use = DIVE_SITES[:max_sites] if max_sites else DIVE_SITES
     centers_to_use = DIVE_CENTERS[:max_sites] if max_sites else DIVE_CENTERS
 
-    random.seed(42)
+    random.seed(seed)
+    cache = DiveCache(cache_dir, seed) if cache_dir else None
 
     # Calculate date range: 5 years ago to a few weeks ago
-    end_date = datetime.now() - timedelta(weeks=2)
-    start_date = end_date - timedelta(days=5*365)  # 5 years before end_date
+    start_date, end_date = logbook_date_range(cache.end_date() if cache else None)
 
     print(f"Generating dives from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
+    print(f"Average step between non-trip dives: {average_step_days(num_dives, start_date, end_date):.1f} days")
 
-    # Generate buddies
-    buddies = []
-    for i in range(50):
-        first = random.choice(BUDDY_FIRST_NAMES)
-        last = random.choice(BUDDY_LAST_NAMES)
-        buddies.append({
-            "id": f"buddy{i+1:03d}",
-            "firstname": first,
-            "lastname": last,
-            "email": f"{first.lower()}.{last.lower()}@email.com"
-        })
+    # Generate buddies
+    buddies = generate_buddies(num_buddies)
 
     # Generate trips within the date range
     trips = generate_trips(start_date, end_date, num_trips=20)
@@ -2851,476 +5719,21 @@ def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sam
 
     # Note: Dive trips are written AFTER the dive loop to filter out empty trips
 
-    # Profile data (dives)
-    profiledata = ET.SubElement(root, "profiledata")
-    repgroup = ET.SubElement(profiledata, "repetitiongroup")
-    repgroup.set("id", "rg1")
-
-    # Generate dives (start_date and end_date already calculated at top of function)
-    current_date = start_date
-    dive_number = 1
-
-    # Calculate average days between dives to fit requested number in date range
-    total_days = (end_date - start_date).days
-    # Estimate trip dives (multiple dives per day during trips reduce needed steps)
-    # Assume ~30% of dives are during trips with 2-3 dives/day average
-    estimated_trip_dives = num_dives * 0.3
-    estimated_non_trip_dives = num_dives - estimated_trip_dives
-    # Calculate step size to ensure we span the full date range
-    avg_step_days = max(1, total_days / estimated_non_trip_dives)
-    print(f"Average step between non-trip dives: {avg_step_days:.1f} days")
-
-    dive_types = [
-        ("recreational_single", 0.25),
-        ("recreational_nitrox", 0.25),
-        ("recreational_al80", 0.15),
-        ("tec_single_stage", 0.12),
-        ("tec_doubles", 0.08),
-        ("tec_doubles_deco", 0.07),
-        ("sidemount", 0.05),
-        ("tec_deep", 0.03),
-    ]
-
-    # Track trip dive counts for multiple dives per trip day
-    trip_dive_counts = {trip["id"]: 0 for trip in trips}
-
-    # Initialize dive session for repetitive diving tracking
-    dive_session = DiveSession()
-
-    # Generate training dives from courses
-    training_dives = []
-    for course in PADI_COURSES:
-        course_dives = generate_training_dives(course, dive_start_index=len(training_dives))
-        training_dives.extend(course_dives)
-
-    # Sort training dives by date for chronological insertion
-    training_dives.sort(key=lambda d: d["datetime"])
-
-    # Track which dives are training dives
-    training_dive_indices = {}
-
-    for dive_idx in range(num_dives):
-        # Stop if we've exceeded the end date
-        if current_date >= end_date:
-            print(f"Reached end date at dive {dive_idx}. Stopping generation.")
-            break
-
-        # Pick dive type
-        r = random.random()
-        cumulative = 0
-        dive_type = "recreational_single"
-        for dt, prob in dive_types:
-            cumulative += prob
-            if r <= cumulative:
-                dive_type = dt
-                break
-
-        tank_config = [tc.copy() for tc in TANK_CONFIGS[dive_type]]
-
-        # Check if we should do a trip dive (40% chance if there's an upcoming trip)
-        active_trip = None
-        site = None
-        site_idx = None
-        center = None
-        center_idx = None
-
-        # Check if we're within a trip's date range
-        for trip in trips:
-            # Target ~3-4 dives per day for 4-7 day trips = 12-28 dives per trip
-            max_dives_per_trip = random.randint(12, 20)
-            if trip_dive_counts[trip["id"]] < max_dives_per_trip:
-                if trip["start_date"] <= current_date <= trip["end_date"]:
-                    # We're within this trip's dates
-                    active_trip = trip
-                    break
-                elif trip["start_date"] > current_date:
-                    # Next trip is in the future - maybe jump to it if close
-                    days_until_trip = (trip["start_date"] - current_date).days
-                    if days_until_trip <= 7 and random.random() < 0.5:
-                        # 50% chance to jump to nearby trip
-                        current_date = trip["start_date"]
-                        active_trip = trip
-                        break
-
-        if active_trip:
-            # Pick site from trip's site list
-            valid_site_indices = [i for i in active_trip["site_indices"] if i < len(sites_to_use)]
-            if valid_site_indices:
-                site_idx = random.choice(valid_site_indices)
-                site = sites_to_use[site_idx]
-            # Pick center from trip's center list
-            valid_center_indices = [i for i in active_trip["center_indices"] if i < len(centers_to_use)]
-            if valid_center_indices:
-                center_idx = random.choice(valid_center_indices)
-                center = centers_to_use[center_idx]
-            trip_dive_counts[active_trip["id"]] += 1
-
-        # Fall back to random site/center if not in a trip
-        if site is None:
-            site = random.choice(sites_to_use)
-            site_idx = sites_to_use.index(site)
-        if center is None:
-            center = random.choice(centers_to_use)
-            center_idx = centers_to_use.index(center)
-
-        num_buddies = random.randint(1, 3)
-        dive_buddies = random.sample(buddies, num_buddies)
-
-        is_tech = "tec" in dive_type or "sidemount" in dive_type
-
-        # Determine max depth based on dive type
-        if "deep" in dive_type:
-            max_depth = random.uniform(50, min(75, site.get("max_depth", 75)))
-        elif "tec" in dive_type:
-            max_depth = random.uniform(35, min(50, site.get("max_depth", 50)))
-        else:
-            max_depth = random.uniform(12, min(30, site.get("max_depth", 30)))
-
-        # Calculate realistic duration based on gas supply and NDL
-        gas_limited_duration = calculate_gas_duration(max_depth, tank_config, is_tech)
-
-        # Calculate NDL at max depth (using a temporary tissue state)
-        temp_tissue = TissueState()
-        ndl_at_depth = temp_tissue.ndl(max_depth, o2_fraction=0.21, gf_high=0.85)
-
-        if is_tech:
-            # Tech dives can exceed NDL (planned deco), but limited by gas
-            # Add time for deco stops (rough estimate: 1 min per 3m of depth over 20m)
-            deco_time_estimate = max(0, (max_depth - 20) / 3) * 2
-            target_duration = random.uniform(35, 55) + deco_time_estimate
-            duration = int(min(gas_limited_duration * 0.85, target_duration))
-        else:
-            # Recreational dives: stay within NDL and gas limits
-            # Use 80% of limits for safety margin
-            max_safe_duration = min(gas_limited_duration * 0.80, ndl_at_depth * 0.85)
-            # Add some randomness but stay within limits
-            target_duration = random.uniform(30, 50)
-            duration = int(min(max_safe_duration, target_duration))
-
-        # Ensure minimum reasonable dive time
-        duration = max(20, duration)
-
-        # Get site type and thermocline profile
-        site_type = get_site_type(site)
-        thermocline_profile = get_thermocline_profile(site)
-
-        # Surface temperature from thermocline profile
-        temp_range = thermocline_profile["surface_temp"]
-        surface_temp = random.uniform(temp_range[0], temp_range[1])
-
-        # Per-dive temperature offset for day-to-day variation
-        temp_offset = random.uniform(-0.2, 0.2)
-        # Bottom temp calculated via thermocline model (for reference in XML)
-        bottom_temp = calculate_temperature_at_depth(
-            max_depth, thermocline_profile, surface_temp, temp_offset
-        )
-
-        air_temp = surface_temp + random.uniform(-2, 5)
-        air_temp_kelvin = air_temp + 273.15
-
-        # Generate dive conditions based on site type
-        conditions = generate_dive_conditions(site, site_type)
-
-        # Determine dive datetime - ensure chronological order for same-day dives
-        if dive_session.last_dive_end is not None and dive_session.last_dive_end.date() == current_date.date():
-            # Same day as last dive - schedule after previous dive ends + surface interval
-            min_surface_interval = random.randint(60, 180)  # 1-3 hours between dives
-            dive_datetime = dive_session.last_dive_end + timedelta(minutes=min_surface_interval)
-
-            # If that pushes us past reasonable diving hours, move to next day
-            if dive_datetime.hour >= 18:
-                current_date += timedelta(days=1)
-                hour = random.choice([7, 8, 9, 10])
-                dive_datetime = current_date.replace(hour=hour, minute=random.choice([0, 15, 30, 45]))
-        else:
-            # First dive of the day - pick a morning or afternoon start time
-            hour = random.choice([7, 8, 9, 10, 11, 14, 15, 16])
-            minute = random.choice([0, 15, 30, 45])
-            dive_datetime = current_date.replace(hour=hour, minute=minute)
-
-        # Check for new diving day and handle surface interval
-        if dive_session.is_new_day(dive_datetime):
-            dive_session.start_new_day()
-            surface_interval_minutes = None
-        else:
-            surface_interval_minutes = dive_session.surface_interval_minutes(dive_datetime)
-            # Only apply positive surface intervals
-            if surface_interval_minutes > 0:
-                dive_session.apply_surface_interval(surface_interval_minutes)
-            else:
-                surface_interval_minutes = None
-
-        # For repetitive dives, use session tissue state with reduced NDL
-        if dive_session.dive_count_today > 0 and not is_tech:
-            # Repetitive dive: calculate reduced NDL
-            ndl_at_depth = dive_session.get_adjusted_ndl(max_depth, gf_high=0.85)
-            max_safe_duration = min(gas_limited_duration * 0.80, ndl_at_depth * 0.85)
-            target_duration = random.uniform(25, 45)  # Slightly shorter for repetitive
-            duration = int(min(max_safe_duration, target_duration))
-            duration = max(20, duration)
-
-        # Check if there's a training dive that should be inserted at this point
-        course_ref = None
-        is_training_dive = False
-        while training_dives and training_dives[0]["datetime"] <= dive_datetime:
-            td = training_dives.pop(0)
-            training_dive_indices[dive_idx] = td
-            is_training_dive = True
-            course_ref = td["course_id"]
-            max_depth = td["max_depth"]
-            duration = td["duration"]
-            site_type = td["site_type"]
-            personality = DiverPersonality(
-                skill_level=td["skill_level"],
-                activity_level=random.uniform(0.3, 0.5),
-            )
-            dive_datetime = td["datetime"]
-            break
-
-        # Generate diver personality for this dive
-        if not is_training_dive:
-            personality = DiverPersonality.generate(dive_number=dive_idx, total_dives=num_dives)
-
-        # Generate profile with site-specific patterns and thermocline
-        profile, gas_switches, final_tissue = generate_dive_profile(
-            max_depth=max_depth,
-            duration_minutes=duration,
-            surface_temp=surface_temp,
-            bottom_temp=bottom_temp,
-            tank_configs=tank_config,
-            is_tech=is_tech,
-            site_type=site_type,
-            thermocline_profile=thermocline_profile,
-            tissue_state=dive_session.tissue if dive_session.dive_count_today > 0 else None,
-            sample_interval=sample_interval,
-            temp_offset=temp_offset,
-            personality=personality,
-        )
-
-        # Update session tissue state for next dive
-        dive_session.tissue = final_tissue
-
-        # Generate marine life sightings
-        sightings = generate_sightings(site, site_type)
-
-        # Generate rating (weighted toward higher ratings)
-        rating = random.choices([3, 4, 5], weights=[0.15, 0.35, 0.5])[0]
-
-        # Generate notes
-        buddy_name = dive_buddies[0]["firstname"] if dive_buddies else "buddy"
-        notes = generate_dive_notes(site, site_type, sightings, buddy_name, conditions)
-
-        # Build dive element
-        dive = ET.SubElement(repgroup, "dive")
-        dive.set("id", f"dive{dive_idx+1:04d}")
-
-        # informationbeforedive
-        before = ET.SubElement(dive, "informationbeforedive")
-        for buddy in dive_buddies:
-            link = ET.SubElement(before, "link")
-            link.set("ref", buddy["id"])
-        site_link = ET.SubElement(before, "link")
-        site_link.set("ref", f"site{site_idx+1:03d}")
-        center_link = ET.SubElement(before, "link")
-        center_link.set("ref", f"center_{center_idx+1:03d}")
-        # Link to trip if this dive is part of one
-        if active_trip:
-            trip_link = ET.SubElement(before, "link")
-            trip_link.set("ref", f"trip_{active_trip['id']}")
-        # Link to training course if this is a course dive
-        if course_ref:
-            course_link = ET.SubElement(before, "link")
-            course_link.set("ref", course_ref)
-        ET.SubElement(before, "divenumber").text = str(dive_number)
-        ET.SubElement(before, "datetime").text = dive_datetime.strftime("%Y-%m-%dT%H:%M:%S")
-        ET.SubElement(before, "airtemperature").text = f"{air_temp_kelvin:.2f}"
-
-        # Entry type (parser expects this in informationbeforedive)
-        ET.SubElement(before, "entrytype").text = conditions["entry_method"]
-
-        # Altitude (0 for sea level dives, higher for highland sites)
-        altitude = site.get("altitude", 0)
-        ET.SubElement(before, "altitude").text = str(altitude)
-
-        # Surface pressure in Pascals (1 atm = 101325 Pa, adjusted for altitude)
-        surface_pressure_pa = 101325 * (1 - (altitude / 44330)) ** 5.255 if altitude > 0 else 101325
-        ET.SubElement(before, "surfacepressure").text = str(int(surface_pressure_pa))
-
-        equipused = ET.SubElement(before, "equipmentused")
-        weight = random.uniform(4, 8)
-        ET.SubElement(equipused, "leadquantity").text = f"{weight:.1f}"
-
-        # Determine which equipment set to use based on water temperature
-        is_cold_water = site["country"] == "New Zealand" or \
-                        (site["country"] == "USA" and "California" in site.get("region", ""))
-        equipment_set_name = "cold_water" if is_cold_water else "warm_water"
-        equipment_items = EQUIPMENT_SETS[equipment_set_name]
-
-        # Add equipment references
-        for item in equipment_items:
-            equip_ref = ET.SubElement(equipused, "equipmentref")
-            equip_ref.text = item["id"]
-
-        # tankdata elements with IDs (critical for multi-tank pressure refs)
-        for i, tc in enumerate(tank_config):
-            tank_id = f"dive{dive_idx+1:04d}_tank{i+1}"
-            tankdata = ET.SubElement(dive, "tankdata")
-            tankdata.set("id", tank_id)
-
-            mix_link = ET.SubElement(tankdata, "link")
-            mix_link.set("ref", tc["mix_id"])
-
-            # UDDF uses cubic meters, but liters is common practice
-            ET.SubElement(tankdata, "tankvolume").text = f"{tc['volume']:.2f}"
-
-            start_p = tc.get("start_pressure_actual", 200 * 100000)
-            end_p = tc.get("end_pressure_actual", 50 * 100000)
-            ET.SubElement(tankdata, "tankpressurebegin").text = str(int(start_p))
-            ET.SubElement(tankdata, "tankpressureend").text = str(int(end_p))
-
-            # Tank working pressure in Pascal (bar * 100000) - required by parser
-            working_p = tc.get("working_pressure", 200) * 100000
-            ET.SubElement(tankdata, "tankworkingpressure").text = str(int(working_p))
-
-            # Tank material (matches Dart TankMaterial enum: aluminum, steel, carbonFiber)
-            if tc.get("material"):
-                ET.SubElement(tankdata, "tankmaterial").text = tc["material"]
-
-        # samples
-        samples = ET.SubElement(dive, "samples")
-
-        active_tank = 0
-        switch_times = {gs["time"]: gs for gs in gas_switches}
-
-        for point in profile:
-            wp = ET.SubElement(samples, "waypoint")
-            ET.SubElement(wp, "depth").text = f"{point['depth']:.2f}"
-            ET.SubElement(wp, "divetime").text = str(point["divetime"])
-
-            # Multi-tank pressure with ref attributes (KEY FOR MULTI-TANK SUPPORT)
-            for tp in point["tankpressures"]:
-                tank_idx = tp["tank_index"]
-                tank_id = f"dive{dive_idx+1:04d}_tank{tank_idx+1}"
-                tp_elem = ET.SubElement(wp, "tankpressure")
-                tp_elem.set("ref", tank_id)
-                tp_elem.text = str(tp["pressure"])
-
-            ET.SubElement(wp, "temperature").text = f"{point['temperature']:.2f}"
-
-            # Gas switch
-            if point["divetime"] in switch_times:
-                gs = switch_times[point["divetime"]]
-                switchmix = ET.SubElement(wp, "switchmix")
-                sm_link = ET.SubElement(switchmix, "link")
-                sm_link.set("ref", gs["mix_id"])
-
-        # informationafterdive
-        after = ET.SubElement(dive, "informationafterdive")
-        ET.SubElement(after, "greatestdepth").text = f"{max_depth:.2f}"
-        avg_depth = sum(p["depth"] for p in profile) / len(profile)
-        ET.SubElement(after, "averagedepth").text = f"{avg_depth:.2f}"
-        ET.SubElement(after, "diveduration").text = str(duration * 60)
-        ET.SubElement(after, "lowesttemperature").text = f"{bottom_temp + 273.15:.2f}"
-        ET.SubElement(after, "visibility").text = str(conditions["visibility"])
-        ET.SubElement(after, "currentstrength").text = conditions["current_strength"]
-
-        # Rating with nested ratingvalue (parser expects this structure)
-        rating_elem = ET.SubElement(after, "rating")
-        ET.SubElement(rating_elem, "ratingvalue").text = str(rating)
-
-        # Water type (salt/fresh)
-        water_type = "fresh" if conditions["water_type"] == "freshwater" else "salt"
-        ET.SubElement(after, "watertype").text = water_type
-
-        # Surface interval for repetitive dives
-        if surface_interval_minutes is not None and surface_interval_minutes < 720:  # Less than 12 hours
-            ET.SubElement(after, "surfaceinterval").text = str(int(surface_interval_minutes * 60))
-
-        # Swell height for ocean dives (parser expects swellheight)
-        if conditions["swell_height"] > 0:
-            ET.SubElement(after, "swellheight").text = f"{conditions['swell_height']:.1f}"
-
-        # Exit method (parser expects exittype; entry is already in informationbeforedive)
-        ET.SubElement(after, "exittype").text = conditions["exit_method"]
-
-        # Current direction if there's current
-        if conditions["current_direction"]:
-            ET.SubElement(after, "currentdirection").text = conditions["current_direction"]
-
-        # Dive notes (generated based on site, sightings, conditions)
-        if is_tech and len(tank_config) > 1:
-            notes += f" {len(tank_config)}-tank tech dive with AI transmitters."
-        ET.SubElement(after, "notes").text = notes
-
-        # Marine life sightings (parser expects sightings with speciesref/count attributes)
-        if sightings:
-            sightings_elem = ET.SubElement(after, "sightings")
-            for sighting in sightings:
-                sighting_elem = ET.SubElement(sightings_elem, "sighting")
-                # Create a species ref ID from species name (normalize to valid ID)
-                species_id = f"species_{sighting['species'].lower().replace(' ', '_').replace('-', '_')}"
-                sighting_elem.set("speciesref", species_id)
-                sighting_elem.set("count", str(sighting["count"]))
-
-        # Tags (based on site type, dive characteristics)
-        dive_tags = []
-        if site_type == "wall":
-            dive_tags.append("wall")
-        elif site_type == "wreck":
-            dive_tags.append("wreck")
-        elif site_type == "drift":
-            dive_tags.append("drift")
-        elif site_type == "cenote":
-            dive_tags.append("cave")
-        if max_depth > 30:
-            dive_tags.append("deep")
-        if is_tech:
-            dive_tags.append("technical")
-        if conditions["current_strength"] in ["moderate", "strong"]:
-            dive_tags.append("current")
-
-        if dive_tags:
-            tags_elem = ET.SubElement(after, "tags")
-            for tag_name in dive_tags:
-                tagref = ET.SubElement(tags_elem, "tagref")
-                tagref.text = f"tag_{tag_name}"
-
-        # Record dive end for session tracking
-        dive_end_time = dive_datetime + timedelta(minutes=duration)
-        dive_session.record_dive_end(dive_end_time, {
-            "max_depth": max_depth,
-            "duration": duration,
-            "site": site["name"],
-        })
-
-        dive_number += 1
-
-        # Move date forward for next dive (if not in a trip, or sometimes within a trip)
-        if active_trip is None:
-            # Always advance the date for non-trip dives to ensure even distribution
-            # Use calculated step size with random variation (0.7x to 1.3x)
-            step = max(1, int(avg_step_days * random.uniform(0.7, 1.3)))
-            current_date += timedelta(days=step)
-        else:
-            # Multiple dives per day during trips (30% chance to move to next day)
-            if random.random() < 0.3:
-                current_date += timedelta(days=1)
-                if current_date > active_trip["end_date"]:
-                    current_date = active_trip["end_date"]
-
-        if (dive_idx + 1) % 50 == 0:
-            print(f"Generated {dive_idx + 1} / {num_dives} dives...")
+    # Plan every dive up front: the header needs the trips that have dives.
+    # These are the same plans iter_dives draws lazily.
+    plans, trip_dive_counts = plan_dives(
+        num_dives, sites_to_use, centers_to_use, buddies, trips, start_date, end_date
+    )
+    if len(plans) < num_dives:
+        print(f"Reached end date at dive {len(plans)}. Stopping generation.")
+    for plan in plans:
+        plan["profile_engine"] = profile_engine
 
-    # Now write dive trips (only those with dives)
-    # We need to insert them before profiledata in the XML tree
+    # Dive trips (only those with dives), written before profiledata
     trips_with_dives = [t for t in trips if trip_dive_counts.get(t["id"], 0) > 0]
 
-    # Find profiledata element and insert trips before it
-    profiledata_elem = root.find("profiledata")
-    profiledata_index = list(root).index(profiledata_elem) if profiledata_elem is not None else len(list(root))
-
-    for i, trip in enumerate(trips_with_dives):
-        divetrip = ET.Element("divetrip")
+    for trip in trips_with_dives:
+        divetrip = ET.SubElement(root, "divetrip")
         divetrip.set("id", f"trip_{trip['id']}")
         ET.SubElement(divetrip, "name").text = trip["name"]
 
@@ -3340,10 +5753,9 @@ def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sam
             notes_text += f" Aboard {trip['liveaboard_name']}."
         ET.SubElement(divetrip, "notes").text = notes_text
 
-        root.insert(profiledata_index + i, divetrip)
-
     # Application data section for Submersion-specific extensions
-    appdata = ET.SubElement(root, "applicationdata")
+    # (built now, written after the streamed profiledata)
+    appdata = ET.Element("applicationdata")
     submersion = ET.SubElement(appdata, "submersion")
     submersion.set("xmlns", SUBMERSION_NS)
 
@@ -3490,14 +5902,30 @@ def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sam
         ET.SubElement(tag_elem, "name").text = tag_name
         ET.SubElement(tag_elem, "color").text = tag_color
 
-    # Write file
-    tree = ET.ElementTree(root)
-    with open(output_path, 'wb') as f:
-        tree.write(f, encoding='utf-8', xml_declaration=True)
+    catalog = ReferenceCatalog(sites_to_use, centers_to_use, buddies)
+    suffix = COMPRESSION_SUFFIXES.get(compression, "")
+    if suffix and output_path.endswith(suffix):
+        output_path = output_path[:-len(suffix)]
+    if shard_size:
+        manifest_path = write_shards(
+            output_path, root, appdata, plans, sites_to_use, sample_interval,
+            shard_size, workers=workers, seed=seed, cache=cache,
+            sample_format=sample_format, compression=compression, catalog=catalog,
+        )
+        print(f"\nWrote shard manifest: {manifest_path}")
+    else:
+        output_path += suffix
+        write_uddf_file(
+            output_path, root, appdata,
+            serialize_dives(plans, sites_to_use, sample_interval, workers, cache, sample_format, catalog),
+            progress_total=num_dives,
+            compression=compression,
+        )
+    if cache:
+        cache.prune(len(plans))
 
-    # Pretty print version (optional, larger file)
-    # with open(output_path, 'w', encoding='utf-8') as f:
-    #     f.write(prettify_xml(root))
+    # Pretty print version (optional, larger file): prettify_xml() on a
+    # fully built tree, which this streaming writer no longer keeps
 
     # Count dives per trip
     trip_dives_total = sum(trip_dive_counts.values())
@@ -3505,7 +5933,7 @@ def generate_uddf(num_dives: int = 500, output_path: str = "test_data.uddf", sam
     # Count equipment
     total_equipment = sum(len(items) for items in EQUIPMENT_SETS.values())
 
-    print(f"\nGenerated UDDF 3.2.1 compliant file: {output_path}")
+    print(f"\nGenerated UDDF 3.2.1 compliant {'shards' if shard_size else 'file'}: {output_path}")
     print(f"- {num_dives} dives ({trip_dives_total} on trips)")
     print(f"- {len(trips_with_dives)} trips (4-7 days each)")
     print(f"- {len(sites_to_use)} dive sites with GPS")
@@ -3540,6 +5968,14 @@ Examples:
   python generate_uddf_test_data.py --quick            # Quick 10 dives for testing
   python generate_uddf_test_data.py -n 50              # Custom 50 dives
   python generate_uddf_test_data.py --quick -o test.uddf
+  python generate_uddf_test_data.py -n 10000 --workers 8  # Large logbook on 8 cores
+  python generate_uddf_test_data.py -n 20000 --shard-size 1000 --workers 8  # 20 shard files + manifest
+  python generate_uddf_test_data.py --cache-dir .uddf_cache  # Rerun only regenerates changed dives
+  python generate_uddf_test_data.py -n 100 --profile  # Per-stage timings + .folded flame graph input
+  python generate_uddf_test_data.py -n 1000 --format jsonl -o dives.jsonl  # One JSON dive per line
+  python generate_uddf_test_data.py -n 5000 --format sqlite -o perf.db  # App database, no import needed
+  python generate_uddf_test_data.py --depth-decimals 1 --temperature-decimals 1 --compress gzip  # Compact stress file
+  python generate_uddf_test_data.py -n 1000 --profile-engine segments  # Opt-in analytic segment profiles
         """
     )
     parser.add_argument(
@@ -3571,8 +6007,85 @@ Examples:
         default=None,
         help="Maximum number of dive sites to include (default: all)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for profile generation (default: 1; output is identical for any value)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Random seed for the whole logbook (default: 42)"
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=None,
+        help="Split output into self-contained files of about this many dives, plus a manifest (default: one file)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Reuse serialized dives whose inputs are unchanged from this directory; the logbook keeps "
+             "the dates of the first run that used it (default: no cache)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["uddf", "jsonl", "sqlite"],
+        default="uddf",
+        help="Output format: a UDDF file, JSON lines with one full dive record per line, or a SQLite "
+             "database in the app's schema (default: uddf)"
+    )
+    parser.add_argument(
+        "--buddies",
+        type=int,
+        default=50,
+        help="Number of buddies dives draw from (default: 50)"
+    )
+    parser.add_argument(
+        "--depth-decimals",
+        type=int,
+        default=2,
+        help="Decimal places for waypoint depths (default: 2)"
+    )
+    parser.add_argument(
+        "--temperature-decimals",
+        type=int,
+        default=2,
+        help="Decimal places for waypoint temperatures (default: 2)"
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "zstd"],
+        default=None,
+        help="Compress UDDF output as it is written, appending .gz or .zst (zstd needs Python 3.14+ "
+             "or the zstandard package; default: uncompressed)"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time the main generator stages and write collapsed stacks next to the output"
+    )
+    parser.add_argument(
+        "--profile-engine",
+        choices=["ticks", "segments"],
+        default="ticks",
+        help="Profile synthesis: per-sample ticks, or analytic segments integrated in closed form and "
+             "sampled only on output (opt-in; profiles differ from ticks) (default: ticks)"
+    )
 
     args = parser.parse_args()
+    if args.format != "uddf":
+        uddf_only = ["workers", "shard_size", "cache_dir", "compress", "profile", "depth_decimals",
+                     "temperature_decimals"]
+        used = [f"--{name.replace('_', '-')}" for name in uddf_only if getattr(args, name) != parser.get_default(name)]
+        if used:
+            parser.error(f"{', '.join(used)} only apply to --format uddf")
+    if args.compress == "zstd" and not zstd_available():
+        parser.error("--compress zstd needs Python 3.14+ or the zstandard package")
 
     # Quick mode overrides
     if args.quick:
@@ -3587,4 +6100,29 @@ Examples:
         max_sites = args.max_sites
         output_path = args.output
 
-    generate_uddf(num_dives, output_path, sample_interval=sample_interval, max_sites=max_sites)
+    if args.format == "jsonl":
+        records = iter_dives(num_dives, args.seed, sample_interval, max_sites, args.buddies, args.profile_engine)
+        count = write_dives_jsonl(output_path, records)
+        print(f"\nWrote {count} dives to {output_path}")
+    elif args.format == "sqlite":
+        counts = generate_sqlite(
+            num_dives, output_path, sample_interval, max_sites, args.seed, num_buddies=args.buddies,
+            profile_engine=args.profile_engine,
+        )
+        print(f"\nWrote {output_path}: " + ", ".join(f"{n} {table}" for table, n in counts.items()))
+    else:
+        generate_uddf(
+            num_dives,
+            output_path,
+            sample_interval=sample_interval,
+            max_sites=max_sites,
+            workers=args.workers,
+            seed=args.seed,
+            shard_size=args.shard_size,
+            cache_dir=args.cache_dir,
+            profile=args.profile,
+            sample_format=SampleFormat(args.depth_decimals, args.temperature_decimals),
+            compression=args.compress,
+            num_buddies=args.buddies,
+            profile_engine=args.profile_engine,
+        )
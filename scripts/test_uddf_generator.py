@@ -1,29 +1,84 @@
 #!/usr/bin/env python3
 """Tests for UDDF test data generator helper functions."""
 
+import contextlib
+import io
 import math
 import sys
 import os
 import unittest
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_uddf_test_data
 from generate_uddf_test_data import (
     PerlinNoise,
     DiverPersonality,
     breathing_oscillation,
     generate_micro_events,
     apply_micro_event,
+    MicroEventTimeline,
     calculate_temperature_at_depth,
+    ThermoclineField,
     generate_dive_profile,
+    generate_segment_profile,
+    SegmentTimeline,
     THERMOCLINE_PROFILES,
     GAS_MIXES,
     PADI_COURSES,
     PADI_CERTIFICATIONS,
     generate_training_dives,
+    TissueState,
+    TissueHistory,
+    BUHLMANN_ZHL16C,
+    SURFACE_PRESSURE,
+    WATER_VAPOR_PRESSURE,
+    NdlTable,
+    get_ndl_table,
+    DIVE_SITES,
+    DIVE_CENTERS,
+    generate_trips,
+    plan_dives,
+    split_session_chains,
+    generate_session_chain,
+    generate_dive_records,
+    UddfStreamWriter,
+    build_dive_element,
+    DiveProfile,
+    split_shards,
+    generate_uddf,
+    DiveCache,
+    dive_cache_fingerprint,
+    code_dependencies,
+    DIVE_CACHE_ROOTS,
+    serialize_dives,
+    StageProfiler,
+    generate_buddies,
+    logbook_date_range,
+    iter_dives,
+    write_dives_jsonl,
+    drift_table_ddl,
+    generate_sqlite,
+    SampleFormat,
+    serialize_dive,
+    serialize_element,
+    write_uddf_file,
+    ReferenceCatalog,
 )
 from datetime import timedelta, datetime
 
 
+def plan_test_dives(num_dives=16):
+    """Plan a small, fixed-seed logbook over 2022."""
+    import random as rng
+    rng.seed(42)
+    start, end = datetime(2022, 1, 1), datetime(2023, 1, 1)
+    trips = generate_trips(start, end, num_trips=3)
+    buddies = [{"id": f"buddy{i:03d}", "firstname": "Sam"} for i in range(1, 6)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        plans, _ = plan_dives(num_dives, DIVE_SITES, DIVE_CENTERS, buddies, trips, start, end)
+    return plans
+
+
 class TestPerlinNoise(unittest.TestCase):
     """Test the 1D Perlin noise implementation."""
 
@@ -64,6 +119,19 @@ class TestPerlinNoise(unittest.TestCase):
         )
         self.assertGreater(differences, 0)
 
+    def test_batch_matches_noise(self):
+        """noise_batch should return exactly what per-value noise() returns."""
+        noise = PerlinNoise(seed=42)
+        xs = [-3.7, -0.5, 0.0, 0.25, 1.0, 255.9, 256.0, 1234.567]
+        self.assertEqual(list(noise.noise_batch(xs)), [noise.noise(x) for x in xs])
+
+    def test_track_matches_sample_times(self):
+        """A pre-rendered track should match noise(t * frequency) at each sample time."""
+        noise = PerlinNoise(seed=7)
+        track = noise.track(0.015, 5, 400)
+        self.assertEqual(len(track), 400)
+        self.assertEqual(list(track), [noise.noise(i * 5 * 0.015) for i in range(400)])
+
     def test_non_periodic_over_dive_length(self):
         """Should not repeat within a typical dive duration."""
         noise = PerlinNoise(seed=42)
@@ -173,6 +241,21 @@ class TestMicroEvents(unittest.TestCase):
         offset = apply_micro_event(event, 115)
         self.assertNotAlmostEqual(offset, 0.0)
 
+    def test_timeline_returns_events_in_progress(self):
+        """The timeline should yield exactly the events with a nonzero offset."""
+        import random as rng
+        rng.seed(5)
+        events = generate_micro_events(
+            level_start_time=60, level_duration=1200, target_depth=18,
+            activity_level=0.9, max_depth=25,
+        )
+        events.append({"start_time": 90, "duration": 600, "depth_offset": 1.0, "event_type": "overlap"})
+        timeline = MicroEventTimeline(events)
+        for t in range(0, 1500, 5):
+            expected = [e for e in events if apply_micro_event(e, t) != 0.0]
+            active = [e for e in timeline.active(t) if apply_micro_event(e, t) != 0.0]
+            self.assertEqual(active, expected)
+
 
 class TestTemperatureFix(unittest.TestCase):
     """Test that temperature is depth-stratified, not noisy."""
@@ -205,6 +288,794 @@ class TestTemperatureFix(unittest.TestCase):
         temp_deep = calculate_temperature_at_depth(35.0, profile, 28.0, 0.0)
         self.assertGreater(temp_surface, temp_deep)
 
+    def test_field_matches_formula(self):
+        """ThermoclineField tracks calculate_temperature_at_depth, halocline included."""
+        import random as rng
+        self.addCleanup(rng.setstate, rng.getstate())
+        for name, profile in THERMOCLINE_PROFILES.items():
+            field = ThermoclineField(profile, 26.0, 0.15)
+            for step in range(0, 4000, 7):
+                depth = step / 100
+                rng.seed(step)
+                expected = calculate_temperature_at_depth(depth, profile, 26.0, 0.15)
+                rng.seed(step)
+                actual = field.at(depth) + rng.uniform(-0.05, 0.05)
+                in_layer = profile["thermocline_start"] <= depth < (
+                    profile["thermocline_start"] + profile["thermocline_thickness"])
+                if in_layer:
+                    self.assertAlmostEqual(actual, expected, delta=1e-4, msg=f"{name} @ {depth}m")
+                else:
+                    self.assertEqual(actual, expected, f"{name} @ {depth}m")
+
+
+def _reference_update(n2, he, depth, time_seconds, o2_fraction, he_fraction):
+    """Per-compartment Schreiner update, as TissueState.update used to loop."""
+    inspired = SURFACE_PRESSURE + depth / 10.0 - WATER_VAPOR_PRESSURE
+    pp_n2 = inspired * (1.0 - o2_fraction - he_fraction)
+    pp_he = inspired * he_fraction
+    minutes = time_seconds / 60.0
+    for i, (ht_n2, ht_he, _, _, _, _) in enumerate(BUHLMANN_ZHL16C):
+        n2[i] = pp_n2 + (n2[i] - pp_n2) * math.exp(-(math.log(2) / ht_n2) * minutes)
+        if he_fraction > 0:
+            he[i] = pp_he + (he[i] - pp_he) * math.exp(-(math.log(2) / ht_he) * minutes)
+        elif he[i] > 0.001:
+            he[i] = he[i] * math.exp(-(math.log(2) / ht_he) * minutes)
+
+
+class TestTissueState(unittest.TestCase):
+    """Test the array-backed ZHL-16C tissue engine against the reference loop."""
+
+    TOLERANCE = 1e-12  # bar
+
+    def _random_segments(self, seed, count=200):
+        import random as rng
+        r = rng.Random(seed)
+        mixes = [(0.21, 0.0), (0.32, 0.0), (0.18, 0.45), (0.50, 0.0), (0.21, 0.35)]
+        return [
+            (r.uniform(0, 70), r.choice([1, 5, 30, 60, 600]), *r.choice(mixes))
+            for _ in range(count)
+        ]
+
+    def test_update_matches_reference(self):
+        """Loadings should match the per-compartment Schreiner loop."""
+        tissue = TissueState()
+        ref_n2, ref_he = list(tissue.n2_loadings), list(tissue.he_loadings)
+        for depth, seconds, o2, he in self._random_segments(7):
+            tissue.update(depth, seconds, o2, he)
+            _reference_update(ref_n2, ref_he, depth, seconds, o2, he)
+        for got, want in zip(tissue.n2_loadings + tissue.he_loadings, ref_n2 + ref_he):
+            self.assertAlmostEqual(got, want, delta=self.TOLERANCE)
+
+    def test_update_segment_matches_update(self):
+        """A segment should leave exactly the loadings of per-sample updates."""
+        import random as rng
+        r = rng.Random(3)
+        depths = [round(r.uniform(0, 60), 2) for _ in range(500)]
+        for o2, he in [(0.21, 0.0), (0.18, 0.45), (0.50, 0.0)]:
+            start = TissueState()
+            start.update(40.0, 20 * 60, 0.21, 0.35)  # helium left to off-gas
+            stepped = TissueState()
+            stepped.n2_loadings, stepped.he_loadings = list(start.n2_loadings), list(start.he_loadings)
+            for depth in depths:
+                stepped.update(depth, 5, o2, he)
+            start.update_segment(depths, 5, o2, he)
+            self.assertEqual(start.n2_loadings, stepped.n2_loadings)
+            self.assertEqual(start.he_loadings, stepped.he_loadings)
+
+    def test_update_linear_matches_fine_stepping(self):
+        """A ramp should match many short updates; a level should match update()."""
+        for o2, he in [(0.21, 0.0), (0.18, 0.45)]:
+            start = TissueState()
+            start.update(40.0, 20 * 60, 0.21, 0.35)  # helium left to off-gas
+            for d0, d1 in [(0.0, 45.0), (45.0, 12.0)]:
+                ramp, stepped = start.copy(), start.copy()
+                ramp.update_linear(d0, d1, 180, o2, he)
+                steps = 3600
+                for i in range(steps):
+                    stepped.update(d0 + (d1 - d0) * (i + 0.5) / steps, 180 / steps, o2, he)
+                for got, want in zip(ramp.n2_loadings + ramp.he_loadings,
+                                     stepped.n2_loadings + stepped.he_loadings):
+                    self.assertAlmostEqual(got, want, delta=1e-6)
+            level, held = start.copy(), start.copy()
+            level.update_linear(30.0, 30.0, 600, o2, he)
+            held.update(30.0, 600, o2, he)
+            for got, want in zip(level.n2_loadings + level.he_loadings, held.n2_loadings + held.he_loadings):
+                self.assertAlmostEqual(got, want, delta=self.TOLERANCE)
+
+    def test_ceiling_clears_after_surface_interval(self):
+        """A loaded tissue should have a ceiling that clears at the surface."""
+        tissue = TissueState()
+        tissue.update(45.0, 40 * 60, 0.21, 0.0)
+        self.assertGreater(tissue.ceiling(0.85), 0.0)
+        tissue.update(0.0, 12 * 3600, 0.21, 0.0)
+        self.assertEqual(tissue.ceiling(0.85), 0.0)
+
+    def test_fresh_tissue_has_no_ceiling(self):
+        """Surface-saturated tissue should have no ceiling."""
+        self.assertEqual(TissueState().ceiling(0.3), 0.0)
+
+    def test_ndl_decreases_with_depth(self):
+        """Deeper dives should have shorter no-deco limits."""
+        ndls = [TissueState().ndl(d) for d in (12, 18, 24, 30, 40)]
+        self.assertEqual(ndls, sorted(ndls, reverse=True))
+        self.assertEqual(TissueState().ndl(6), 200.0)
+
+
+def _reference_ndl(tissue, depth, o2_fraction, he_fraction, gf_high):
+    """The 1-minute forward simulation TissueState.ndl used to run."""
+    n2, he = list(tissue.n2_loadings), list(tissue.he_loadings)
+    minutes = 0
+    while minutes < 200:
+        _reference_update(n2, he, depth, 60, o2_fraction, he_fraction)
+        probe = TissueState()
+        probe.n2_loadings, probe.he_loadings = n2, he
+        if probe.ceiling(gf_high) > 0:
+            return float(minutes)
+        minutes += 1
+    return 200.0
+
+
+class TestClosedFormNdl(unittest.TestCase):
+    """Test the analytic/bisection NDL solver against 1-minute stepping."""
+
+    def _loaded_tissues(self):
+        tissues = [TissueState()]
+        for depth, minutes, he in [(30, 20, 0.0), (18, 45, 0.0), (40, 25, 0.35), (25, 40, 0.0)]:
+            tissue = TissueState()
+            tissue.update(depth, minutes * 60, 0.21, he)
+            tissue.update(0.0, 90 * 60, 0.21, 0.0)
+            tissues.append(tissue)
+        return tissues
+
+    def test_whole_minutes_match_stepping(self):
+        """Default mode should reproduce the whole-minute stepping result."""
+        for tissue in self._loaded_tissues():
+            breathing_he = any(h > 0.001 for h in tissue.he_loadings)
+            for depth in (8, 12.5, 18, 24.3, 30, 36, 45):
+                for gf_high in (0.7, 0.85):
+                    he = 0.35 if breathing_he else 0.0
+                    self.assertEqual(
+                        tissue.ndl(depth, 0.21, he, gf_high),
+                        _reference_ndl(tissue, depth, 0.21, he, gf_high),
+                        f"depth={depth} gf={gf_high}",
+                    )
+
+    def test_exact_mode_within_the_whole_minute(self):
+        """Exact NDL should fall inside the minute the stepping result names."""
+        for tissue in self._loaded_tissues():
+            for depth in (15, 21, 27, 33):
+                whole = tissue.ndl(depth)
+                exact = tissue.ndl(depth, exact=True)
+                self.assertGreaterEqual(exact, whole)
+                self.assertLess(exact, whole + 1)
+
+    def test_exact_mode_hits_the_m_value(self):
+        """Loading for the exact NDL should put the ceiling right at the surface."""
+        tissue = TissueState()
+        exact = tissue.ndl(30.0, exact=True)
+        tissue.update(30.0, (exact - 0.01) * 60, 0.21, 0.0)
+        self.assertEqual(tissue.ceiling(0.85), 0.0)
+        tissue.update(30.0, 0.02 * 60, 0.21, 0.0)
+        self.assertGreater(tissue.ceiling(0.85), 0.0)
+
+    def test_trimix_uses_bisection(self):
+        """Helium mixes should still produce a bounded, depth-ordered NDL."""
+        shallow = TissueState().ndl(20, 0.21, 0.35, exact=True)
+        deep = TissueState().ndl(40, 0.21, 0.35, exact=True)
+        self.assertGreater(shallow, deep)
+        self.assertGreater(deep, 0)
+
+
+class TestNdlTable(unittest.TestCase):
+    """Test precomputed NDL lookups for clean tissue."""
+
+    def test_table_matches_direct_solve(self):
+        """Whole minutes should equal ndl(); fractional ones stay within 1.5%."""
+        for o2, he in ((0.21, 0.0), (0.32, 0.0), (0.21, 0.35)):
+            table = get_ndl_table(o2, he, 0.85)
+            for i in range(600):
+                depth = 6.0 + i * 0.0731
+                self.assertEqual(table.lookup(depth), TissueState().ndl(depth, o2, he), depth)
+                direct = TissueState().ndl(depth, o2, he, exact=True)
+                self.assertAlmostEqual(table.lookup(depth, exact=True), direct, delta=0.015 * direct, msg=depth)
+
+    def test_table_per_gas_mix(self):
+        """Every GAS_MIXES entry should be tabulated without errors."""
+        for mix in GAS_MIXES:
+            if mix["he"] > 0:
+                continue  # bisection tables are slower to build; covered below
+            table = get_ndl_table(mix["o2"], mix["he"], 0.85)
+            self.assertGreaterEqual(table.lookup(12.0), table.lookup(30.0))
+
+    def test_table_is_shared(self):
+        """The same gas and GF should reuse one table."""
+        self.assertIs(get_ndl_table(0.32, 0.0, 0.85), get_ndl_table(0.32, 0.0, 0.85))
+
+
+class TestTissueHistory(unittest.TestCase):
+    """Test per-day tissue history queries."""
+
+    def test_residual_matches_sequential_off_gassing(self):
+        """Querying the history should equal off-gassing the live tissue."""
+        day = datetime(2024, 5, 1, 9, 0)
+        history = TissueHistory()
+        live = TissueState()
+        live.update(25.0, 40 * 60, 0.21, 0.0)
+        history.record(day + timedelta(minutes=40), live)
+
+        query = day + timedelta(minutes=40 + 95)
+        live.update(0.0, 95 * 60, 0.21, 0.0)
+        residual = history.residual_at(query)
+        self.assertEqual(residual.n2_loadings, live.n2_loadings)
+        self.assertEqual(residual.he_loadings, live.he_loadings)
+
+    def test_uses_latest_dive_ended_by_query(self):
+        """Queries should start from the last dive that had ended by then."""
+        day = datetime(2024, 5, 1, 9, 0)
+        history = TissueHistory()
+        first, second = TissueState(), TissueState()
+        first.update(18.0, 30 * 60, 0.21, 0.0)
+        second.update(30.0, 30 * 60, 0.32, 0.0)
+        history.record(day + timedelta(hours=1), first)
+        history.record(day + timedelta(hours=4), second)
+
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.residual_at(day).n2_loadings, TissueState().n2_loadings)
+        self.assertEqual(history.residual_at(day + timedelta(hours=1)).n2_loadings, first.n2_loadings)
+        self.assertEqual(history.residual_at(day + timedelta(hours=4)).n2_loadings, second.n2_loadings)
+        self.assertLess(
+            history.residual_at(day + timedelta(hours=3)).n2_loadings[0], first.n2_loadings[0]
+        )
+
+
+class TestParallelGeneration(unittest.TestCase):
+    """Test planned, per-chain profile generation across worker counts."""
+
+    def test_chains_cover_plans_in_order(self):
+        """Session chains should partition the plans without reordering."""
+        plans = plan_test_dives()
+        chains = split_session_chains(plans)
+        self.assertEqual([p["dive_idx"] for c in chains for p in c], [p["dive_idx"] for p in plans])
+        self.assertTrue(all(c[0]["starts_session"] for c in chains))
+
+    def test_output_independent_of_worker_count(self):
+        """Records should be identical whether generated in-process or in a pool."""
+        plans = plan_test_dives()
+        serial = [r["profile"] for r in generate_dive_records(plans, 30, workers=1)]
+        pooled = [r["profile"] for r in generate_dive_records(plans, 30, workers=2)]
+        self.assertEqual(serial, pooled)
+
+    def test_chain_independent_of_previous_chains(self):
+        """A chain generated alone should match the same chain in a full run."""
+        plans = plan_test_dives()
+        chains = split_session_chains(plans)
+        full = [r["profile"] for r in generate_dive_records(plans, 30)]
+        last = [r["profile"] for r in generate_session_chain(chains[-1], 30)]
+        self.assertEqual(full[-len(last):], last)
+
+
+class TestDivePlanning(unittest.TestCase):
+    """Test the indexed trip and site scheduler."""
+
+    def _plan(self, num_dives, sites, num_trips=10, days=730):
+        import random as rng
+        rng.seed(3)
+        end = datetime(2024, 1, 1)
+        start = end - timedelta(days=days)
+        trips = generate_trips(start, end, num_trips=num_trips)
+        buddies = [{"id": f"buddy{i:03d}", "firstname": "Sam"} for i in range(1, 6)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            plans, counts = plan_dives(num_dives, sites, sites, buddies, trips, start, end)
+        return plans, counts, {trip["id"]: trip for trip in trips}
+
+    def test_trip_dives_within_quota_and_dates(self):
+        """Trip dives should fall on their trip's dates and stay within its 12-20 dive quota."""
+        plans, counts, trips = self._plan(400, DIVE_SITES)
+        self.assertTrue(any(counts.values()))
+        self.assertTrue(all(count <= 20 for count in counts.values()))
+        for trip_id, count in counts.items():
+            self.assertEqual(sum(p["trip_id"] == trip_id for p in plans), count)
+        for plan in plans:
+            trip = trips.get(plan["trip_id"])
+            # Course dives keep their own date; a late last dive can roll past
+            # the trip's final day
+            if trip is not None and plan["course_ref"] is None:
+                self.assertLessEqual(trip["start_date"].date(), plan["datetime"].date())
+                self.assertLessEqual(plan["datetime"].date(), (trip["end_date"] + timedelta(days=1)).date())
+
+    def test_large_site_catalog(self):
+        """Non-trip dives should draw site indices across a large catalog."""
+        sites = [dict(DIVE_SITES[i % len(DIVE_SITES)], name=f"Site {i}") for i in range(20000)]
+        plans, _, _ = self._plan(200, sites, num_trips=0)
+        indices = [plan["site_idx"] for plan in plans]
+        self.assertTrue(all(0 <= i < len(sites) for i in indices))
+        self.assertGreater(max(indices), len(DIVE_SITES))
+
+
+class TestIterDives(unittest.TestCase):
+    """Test the lazy dive record generator and JSON-lines output."""
+
+    def test_matches_planned_generation(self):
+        """iter_dives should yield the records generate_uddf builds from plan_dives."""
+        import random as rng
+        with contextlib.redirect_stdout(io.StringIO()):
+            streamed = list(iter_dives(12, seed=7, sample_interval=30, max_sites=10))
+
+            rng.seed(7)
+            start, end = logbook_date_range()
+            buddies = generate_buddies(50)
+            trips = generate_trips(start, end, num_trips=20)
+            plans, _ = plan_dives(12, DIVE_SITES[:10], DIVE_CENTERS[:10], buddies, trips, start, end)
+        planned = list(generate_dive_records(plans, 30))
+
+        self.assertEqual([r["datetime"] for r in streamed], [r["datetime"] for r in planned])
+        self.assertEqual([r["profile"] for r in streamed], [r["profile"] for r in planned])
+        self.assertTrue(all(r["site"] is DIVE_SITES[r["site_idx"]] for r in streamed))
+
+    def test_independent_of_caller_random_use(self):
+        """Drawing from the random module between yields should not change the dives."""
+        import random as rng
+        expected = [r["profile"] for r in iter_dives(8, seed=7, sample_interval=30, max_sites=10)]
+        rng.seed(99)
+        interleaved = []
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            for record in iter_dives(8, seed=7, sample_interval=30, max_sites=10):
+                interleaved.append(record["profile"])
+                rng.random()
+        self.assertEqual(interleaved, expected)
+        self.assertEqual(stdout.getvalue(), "")
+
+        # The caller's stream continues as if iter_dives never ran
+        rng.seed(99)
+        caller = [rng.random() for _ in expected]
+        rng.seed(99)
+        for _ in iter_dives(8, seed=7, sample_interval=30, max_sites=10):
+            pass
+        self.assertEqual(rng.random(), caller[0])
+
+    def test_jsonl_round_trip(self):
+        """Each line should hold one dive with its profile columns."""
+        import json
+        import tempfile
+        with contextlib.redirect_stdout(io.StringIO()):
+            records = list(iter_dives(5, seed=7, sample_interval=30, max_sites=10))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dives.jsonl")
+            self.assertEqual(write_dives_jsonl(path, iter(records)), len(records))
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+
+        self.assertEqual(len(lines), len(records))
+        for line, record in zip(lines, records):
+            self.assertEqual(line["dive_number"], record["dive_number"])
+            self.assertEqual(line["datetime"], record["datetime"].isoformat())
+            self.assertEqual(line["profile"]["depth"], list(record["profile"].depth))
+            self.assertEqual(line["site"]["name"], record["site"]["name"])
+
+
+class TestSqliteOutput(unittest.TestCase):
+    """Test the direct SQLite database emitter."""
+
+    def test_drift_table_ddl(self):
+        """Drift column builders should map to SQLite column definitions."""
+        source = (
+            "class DiveTanks extends Table {\n"
+            "  TextColumn get id => text()();\n"
+            "  TextColumn get diveId =>\n"
+            "      text().references(Dives, #id, onDelete: KeyAction.cascade)();\n"
+            "  RealColumn get o2Percent => real().withDefault(const Constant(21.0))();\n"
+            "  BoolColumn get isPrimary => boolean().withDefault(\n"
+            "    const Constant(true),\n"
+            "  )();\n"
+            "  TextColumn get tankName =>\n"
+            "      text().nullable()(); // user-friendly name\n"
+            "\n"
+            "  @override\n"
+            "  Set<Column> get primaryKey => {id};\n"
+            "}\n"
+        )
+        columns, ddl = drift_table_ddl(source, "DiveTanks")
+        self.assertEqual(columns, ["id", "dive_id", "o2_percent", "is_primary", "tank_name"])
+        self.assertEqual(
+            ddl,
+            'CREATE TABLE IF NOT EXISTS "dive_tanks" ("id" TEXT NOT NULL, '
+            '"dive_id" TEXT NOT NULL REFERENCES dives (id) ON DELETE CASCADE, '
+            '"o2_percent" REAL NOT NULL DEFAULT 21.0, '
+            '"is_primary" INTEGER NOT NULL DEFAULT 1 CHECK ("is_primary" IN (0, 1)), '
+            '"tank_name" TEXT, PRIMARY KEY ("id"))',
+        )
+
+    def test_database_matches_generated_dives(self):
+        """Every generated dive and sample should land in the app's tables."""
+        import sqlite3
+        import tempfile
+        with contextlib.redirect_stdout(io.StringIO()):
+            records = list(iter_dives(6, seed=7, sample_interval=30, max_sites=10))
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "logbook.db")
+                counts = generate_sqlite(6, path, sample_interval=30, max_sites=10, seed=7)
+                conn = sqlite3.connect(path)
+                try:
+                    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+                    depths = [row[0] for row in conn.execute(
+                        "SELECT depth FROM dive_profiles WHERE dive_id = 'dive0001' ORDER BY timestamp"
+                    )]
+                    dangling = conn.execute(
+                        "SELECT COUNT(*) FROM dives WHERE site_id NOT IN (SELECT id FROM dive_sites)"
+                    ).fetchone()[0]
+                finally:
+                    conn.close()
+
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual(counts["dives"], len(records))
+        self.assertEqual(counts["dive_profiles"], sum(len(r["profile"]) for r in records))
+        self.assertEqual(depths, list(records[0]["profile"].depth))
+        self.assertEqual(dangling, 0)
+
+    def test_trips_and_caller_random_state(self):
+        """Trips with dives should be written, without touching the random module."""
+        import random as rng
+        import sqlite3
+        import tempfile
+        records = list(iter_dives(80, seed=7, sample_interval=60))
+        rng.seed(99)
+        state = rng.getstate()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logbook.db")
+            generate_sqlite(80, path, sample_interval=60, seed=7)
+            conn = sqlite3.connect(path)
+            try:
+                trips = {row[0] for row in conn.execute("SELECT id FROM trips")}
+                dive_trips = {row[0] for row in conn.execute("SELECT trip_id FROM dives WHERE trip_id IS NOT NULL")}
+            finally:
+                conn.close()
+
+        self.assertEqual(rng.getstate(), state)
+        self.assertTrue(trips)
+        self.assertEqual(trips, {r["trip_id"] for r in records if r["trip_id"]})
+        self.assertEqual(dive_trips, trips)
+
+
+class TestUddfStreamWriter(unittest.TestCase):
+    """Test incremental UDDF serialization."""
+
+    def test_matches_elementtree_write(self):
+        """Streamed sections should produce the same bytes as ElementTree.write."""
+        import xml.etree.ElementTree as ET
+        root = ET.Element("uddf", {"xmlns": "http://www.streit.cc/uddf/3.2", "version": "3.2.1"})
+        ET.SubElement(ET.SubElement(root, "generator"), "name").text = "Gen & <Co>"
+        profiledata = ET.SubElement(root, "profiledata")
+        repgroup = ET.SubElement(profiledata, "repetitiongroup", {"id": "rg1"})
+        dives = []
+        for i in range(3):
+            dive = ET.SubElement(repgroup, "dive", {"id": f"dive{i}"})
+            ET.SubElement(dive, "notes").text = "Saw a \u00e9l\u00e9phant seal"
+            dives.append(dive)
+
+        expected = io.BytesIO()
+        ET.ElementTree(root).write(expected, encoding="utf-8", xml_declaration=True)
+
+        streamed = io.BytesIO()
+        writer = UddfStreamWriter(streamed)
+        header = ET.Element(root.tag, root.attrib)
+        writer.start(header)
+        writer.write_element(root.find("generator"))
+        writer.open_section("profiledata")
+        writer.open_section("repetitiongroup", {"id": "rg1"})
+        for dive in dives:
+            writer.write_element(dive)
+        writer.close_section("repetitiongroup")
+        writer.close_section("profiledata")
+        writer.end()
+
+        self.assertEqual(streamed.getvalue(), expected.getvalue())
+
+    def test_dive_element_is_detached(self):
+        """build_dive_element should serialize one dive on its own."""
+        import xml.etree.ElementTree as ET
+        plans = plan_test_dives(num_dives=2)
+        record = next(generate_dive_records(plans, 30))
+        dive = build_dive_element(record, DIVE_SITES[record["site_idx"]])
+        parsed = ET.fromstring(ET.tostring(dive))
+        self.assertEqual(parsed.get("id"), "dive0001")
+        self.assertEqual(len(parsed.find("samples")), len(record["profile"]))
+
+
+    def test_serialize_dive_matches_element(self):
+        """Text-formatted samples should serialize exactly like the element tree."""
+        plans = plan_test_dives(num_dives=4)
+        for record in generate_dive_records(plans, 30):
+            site = DIVE_SITES[record["site_idx"]]
+            self.assertEqual(serialize_dive(record, site), serialize_element(build_dive_element(record, site)))
+
+    def test_catalog_references_match_elements(self):
+        """Spliced catalog fragments should serialize like per-dive link elements."""
+        import random as rng
+        plans = plan_test_dives(num_dives=6)
+        rng.seed(5)
+        buddies = generate_buddies(2000)
+        buddies[:5] = [{"id": f"buddy{i:03d}", "firstname": "Sam", "lastname": "Lee"} for i in range(1, 6)]
+        catalog = ReferenceCatalog(DIVE_SITES, DIVE_CENTERS, buddies)
+        for record in generate_dive_records(plans, 30):
+            site = DIVE_SITES[record["site_idx"]]
+            self.assertEqual(serialize_dive(record, site, catalog=catalog), serialize_dive(record, site))
+
+    def test_sample_format_decimals(self):
+        """Depth and temperature should use the configured decimals."""
+        import xml.etree.ElementTree as ET
+        plans = plan_test_dives(num_dives=2)
+        record = next(generate_dive_records(plans, 30))
+        dive = ET.fromstring(serialize_dive(record, DIVE_SITES[record["site_idx"]], SampleFormat(1, 0)))
+        waypoint = dive.find("samples/waypoint[2]")
+        self.assertEqual(waypoint.findtext("depth"), f"{record['profile'].depth[1]:.1f}")
+        self.assertEqual(waypoint.findtext("temperature"), f"{record['profile'].temperature[1]:.0f}")
+
+    def test_gzip_output(self):
+        """Compressed output should decompress to the uncompressed bytes."""
+        import gzip
+        import tempfile
+        import xml.etree.ElementTree as ET
+        root = ET.Element("uddf", {"version": "3.2.1"})
+        ET.SubElement(root, "generator")
+        appdata = ET.Element("applicationdata")
+        dives = [b'<dive id="dive0001" />', b'<dive id="dive0002" />']
+        with tempfile.TemporaryDirectory() as tmp:
+            plain, packed = os.path.join(tmp, "a.uddf"), os.path.join(tmp, "a.uddf.gz")
+            write_uddf_file(plain, root, appdata, iter(dives))
+            write_uddf_file(packed, root, appdata, iter(dives), compression="gzip")
+            with open(plain, "rb") as f, gzip.open(packed, "rb") as g:
+                self.assertEqual(f.read(), g.read())
+
+
+class TestSharding(unittest.TestCase):
+    """Test splitting the logbook into self-contained shard files."""
+
+    @staticmethod
+    def _load(path):
+        import xml.etree.ElementTree as ET
+        root = ET.parse(path).getroot()
+        for elem in root.iter():
+            elem.tag = elem.tag.split("}")[-1]
+        return root
+
+    def test_shards_break_between_days(self):
+        """Shards should partition the plans without splitting a session chain."""
+        plans = plan_test_dives(num_dives=30)
+        shards = split_shards(plans, 4)
+        self.assertEqual([p["dive_idx"] for s in shards for p in s], [p["dive_idx"] for p in plans])
+        self.assertTrue(all(s[0]["starts_session"] for s in shards))
+        self.assertTrue(all(len(s) >= 4 for s in shards[:-1]))
+
+    def test_shards_are_self_contained(self):
+        """Each shard should define exactly what its dives link to, and the
+        shards together should hold the same dives as a single file."""
+        import json
+        import tempfile
+        import xml.etree.ElementTree as ET
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            generate_uddf(12, os.path.join(tmp, "one.uddf"), sample_interval=60)
+            generate_uddf(12, os.path.join(tmp, "log.uddf"), sample_interval=60, shard_size=5)
+            with open(os.path.join(tmp, "log.manifest.json")) as f:
+                manifest = json.load(f)
+            single = [ET.tostring(d) for d in self._load(os.path.join(tmp, "one.uddf")).iter("dive")]
+            sharded = []
+            for entry in manifest["shards"]:
+                root = self._load(os.path.join(tmp, entry["file"]))
+                dives = list(root.iter("dive"))
+                self.assertEqual(len(dives), entry["dives"])
+                sharded.extend(ET.tostring(d) for d in dives)
+
+                ids = {e.get("id") for e in root.iter() if e.get("id")}
+                refs = {e.get("ref") for e in root.iter("link")} | {e.text for e in root.iter("equipmentref")}
+                self.assertLessEqual(refs, ids)
+                # Nothing defined in the header that no dive refers to
+                mixes = {m.get("id") for m in root.find("gasdefinitions")}
+                buddies = {b.get("id") for b in root.find("diver").findall("buddy")}
+                self.assertLessEqual(mixes | buddies, refs)
+
+        self.assertEqual(manifest["total_dives"], len(single))
+        self.assertGreater(len(manifest["shards"]), 1)
+        self.assertEqual(sharded, single)
+
+
+class TestDiveCache(unittest.TestCase):
+    """Test reuse of serialized dives across runs."""
+
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.cache_dir = self._tmp.name
+        self.plans = plan_test_dives(num_dives=12)
+
+    def _serialize(self, plans):
+        return list(serialize_dives(plans, DIVE_SITES, 60, cache=DiveCache(self.cache_dir, 42)))
+
+    def test_cached_output_matches_uncached(self):
+        """A cold and a warm cache should both reproduce the uncached bytes."""
+        expected = list(serialize_dives(self.plans, DIVE_SITES, 60))
+        self.assertEqual(self._serialize(self.plans), expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), len(self.plans))
+        self.assertEqual(self._serialize(self.plans), expected)
+
+    def test_changed_input_regenerates_its_day_only(self):
+        """Changing one dive's thermocline should only recompute its diving day."""
+        self._serialize(self.plans)
+        before = set(os.listdir(self.cache_dir))
+
+        chain = split_session_chains(self.plans)[-1]
+        changed = [dict(p) for p in self.plans]
+        target = changed[chain[0]["dive_idx"]]
+        target["thermocline_profile"] = dict(target["thermocline_profile"], temp_drop=20)
+        self._serialize(changed)
+        after = set(os.listdir(self.cache_dir))
+
+        # One entry per dive: stale ones are replaced, not accumulated
+        self.assertEqual(len(after), len(self.plans))
+        self.assertEqual(len(after - before), len(chain))
+
+    def test_prune_drops_dives_past_the_run(self):
+        """A shorter run should drop its seed's entries for the dives it no longer has."""
+        self._serialize(self.plans)
+        DiveCache(self.cache_dir, 7).put(11, "ab", b"<dive />")
+        DiveCache(self.cache_dir, 42).prune(8)
+        names = os.listdir(self.cache_dir)
+        kept = sorted(name.split("_")[0] for name in names if "_seed42_" in name)
+        self.assertEqual(kept, [f"dive{i:05d}" for i in range(1, 9)])
+        self.assertIn("dive00012_seed7_ab.xml", names)
+
+    def _edited_fingerprint(self, old, new):
+        """dive_cache_fingerprint() of a copy of the generator with one edit."""
+        import importlib.util
+        with open(generate_uddf_test_data.__file__, encoding="utf-8") as f:
+            source = f.read()
+        self.assertEqual(source.count(old), 1, old)
+        path = os.path.join(self.cache_dir, "edited_generator.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source.replace(old, new))
+        spec = importlib.util.spec_from_file_location("edited_generator", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        self.addCleanup(sys.modules.pop, spec.name, None)
+        spec.loader.exec_module(module)
+        return module.dive_cache_fingerprint()
+
+    def test_fingerprint_follows_profile_helpers(self):
+        """Editing code a dive's bytes depend on should change the cache key."""
+        unchanged = self._edited_fingerprint('if __name__ == "__main__":', 'if __name__ == "__main__":')
+        self.assertEqual(unchanged, dive_cache_fingerprint())
+        edits = [
+            ("return 4 * t * t * t", "return 4.0 * t * t * t"),  # ease_in_out_cubic
+            ('class MicroEventTimeline:\n', 'class MicroEventTimeline:\n    edited = True\n'),
+            ('return ET.tostring(elem, encoding="unicode").encode("utf-8")',
+             'return ET.tostring(elem, encoding="unicode").encode("utf-8") + b""'),  # serialize_element
+        ]
+        for old, new in edits:
+            self.assertNotEqual(self._edited_fingerprint(old, new), unchanged, old)
+
+    def test_serializers_are_hashed(self):
+        """The fragment serializers shape cached bytes, so they belong in the cache key."""
+        hashed = code_dependencies(DIVE_CACHE_ROOTS)
+        for name in ("serialize_dive", "serialize_element", "write_spliced", "UddfStreamWriter"):
+            self.assertIn(name, hashed)
+
+    def test_profile_callees_are_hashed(self):
+        """Every module function or class generate_dive_profile reaches should be in the cache key."""
+        import inspect
+        import types
+        hashed = code_dependencies(DIVE_CACHE_ROOTS)
+        module = vars(generate_uddf_test_data)
+        pending, seen = [generate_dive_profile], set()
+        while pending:
+            obj = pending.pop()
+            if inspect.isclass(obj):
+                # Methods, static/class methods and property getters
+                members = [getattr(m, "__func__", getattr(m, "fget", m)) for m in vars(obj).values()]
+                codes = [m.__code__ for m in members if inspect.isfunction(m)]
+            else:
+                codes = [obj.__code__]
+            while codes:
+                code = codes.pop()
+                codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+                for name in code.co_names:
+                    value = inspect.unwrap(module[name]) if callable(module.get(name)) else None
+                    if name not in seen and getattr(value, "__module__", None) == generate_uddf_test_data.__name__:
+                        seen.add(name)
+                        pending.append(value)
+        self.assertIn("MicroEventTimeline", seen)
+        self.assertEqual(seen - set(hashed), set())
+
+    def test_fingerprint_ignores_unrelated_code(self):
+        """Editing code outside the dive path should keep cached dives."""
+        self.assertEqual(
+            self._edited_fingerprint('"Number of buddies dives draw from (default: 50)"', '"Buddy count"'),
+            dive_cache_fingerprint(),
+        )
+
+    def test_end_date_pinned_by_first_run(self):
+        """Later runs should plan back from the end date the cache was created with."""
+        import json
+        cache = DiveCache(self.cache_dir, 42)
+        first = cache.end_date()
+        with open(os.path.join(self.cache_dir, DiveCache.ANCHOR_FILE), "w") as f:
+            json.dump({"end_date": "2024-03-01T00:00:00"}, f)
+        self.assertEqual(DiveCache(self.cache_dir, 7).end_date(), datetime(2024, 3, 1))
+        self.assertEqual(first, logbook_date_range()[1])
+
+
+class TestStageProfiler(unittest.TestCase):
+    """Test the opt-in --profile stage counters."""
+
+    def test_nested_stages_and_restore(self):
+        """Stages should count calls, nest into collapsed stacks and unwrap cleanly."""
+        import types
+        module = types.SimpleNamespace()
+        module.leaf = lambda x: x * 2
+        module.parent = lambda n: sum(module.leaf(i) for i in range(n))
+        original_leaf = module.leaf
+
+        profiler = StageProfiler()
+        profiler.install([(module, "parent", "parent"), (module, "leaf", "leaf")])
+        self.assertEqual(module.parent(3), 6)
+        profiler.uninstall()
+
+        self.assertIs(module.leaf, original_leaf)
+        self.assertEqual(profiler.calls, {"parent": 1, "leaf": 3})
+        self.assertEqual(set(profiler.self_seconds), {"parent", "parent;leaf"})
+        self.assertGreaterEqual(profiler.seconds["parent"], profiler.seconds["leaf"])
+
+    def test_profile_run_writes_collapsed_stacks(self):
+        """generate_uddf(profile=True) should write a .folded file and unwrap stages."""
+        import tempfile
+        original_gf_ceiling = TissueState.gf_ceiling
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()) as out:
+            generate_uddf(3, os.path.join(tmp, "p.uddf"), sample_interval=60, profile=True)
+            with open(os.path.join(tmp, "p.folded")) as f:
+                stacks = [line.rsplit(" ", 1)[0] for line in f]
+        self.assertIn("generate_uddf;generate_dive_profile;tissue.gf_ceiling", stacks)
+        self.assertIn("tissue.gf_ceiling", out.getvalue())
+        self.assertIs(TissueState.gf_ceiling, original_gf_ceiling)
+
+
+class TestDiveProfileColumns(unittest.TestCase):
+    """Test the columnar profile representation."""
+
+    def _make_profile(self):
+        import random as rng
+        rng.seed(42)
+        tanks = [
+            {"mix_id": "air", "volume": 0.012, "role": "main", "working_pressure": 232},
+            {"mix_id": "ean50", "volume": 0.0111, "role": "stage", "working_pressure": 207},
+        ]
+        profile, _, _ = generate_dive_profile(
+            max_depth=40, duration_minutes=35, surface_temp=28, bottom_temp=24,
+            tank_configs=tanks, is_tech=True, site_type="wall",
+            thermocline_profile=THERMOCLINE_PROFILES["tropical"],
+        )
+        return profile
+
+    def test_columns_are_parallel(self):
+        """Every column, including each tank's pressures, has one value per sample."""
+        profile = self._make_profile()
+        self.assertIsInstance(profile, DiveProfile)
+        self.assertEqual(len(profile.tank_pressures), 2)
+        for column in [profile.depth, profile.temperature, *profile.tank_pressures]:
+            self.assertEqual(len(column), len(profile))
+
+    def test_rows_zip_columns(self):
+        """rows() should yield one tuple per sample with a pressure per tank."""
+        profile = self._make_profile()
+        rows = list(profile.rows())
+        self.assertEqual(len(rows), len(profile))
+        divetime, depth, temperature, pressures = rows[10]
+        self.assertEqual(divetime, profile.divetime[10])
+        self.assertEqual(pressures, (profile.tank_pressures[0][10], profile.tank_pressures[1][10]))
+
+    def test_ends_at_surface(self):
+        """The last sample should be at the surface."""
+        self.assertEqual(self._make_profile().depth[-1], 0.0)
+
 
 class TestProfileRealism(unittest.TestCase):
     """Integration tests for realistic dive profile generation."""
@@ -223,9 +1094,9 @@ class TestProfileRealism(unittest.TestCase):
             thermocline_profile=THERMOCLINE_PROFILES["tropical"],
         )
         target = 30 * 0.9
-        for point in profile:
-            if point["depth"] >= target:
-                time_to_depth = point["divetime"]
+        for divetime, depth in zip(profile.divetime, profile.depth):
+            if depth >= target:
+                time_to_depth = divetime
                 rate = (target / time_to_depth) * 60
                 self.assertLess(rate, 18, f"Descent too steep: {rate:.1f} m/min")
                 break
@@ -239,10 +1110,9 @@ class TestProfileRealism(unittest.TestCase):
             tank_configs=self._make_single_tank(), site_type="reef",
             thermocline_profile=THERMOCLINE_PROFILES["tropical"],
         )
-        total = profile[-1]["divetime"]
-        bottom_points = [p for p in profile if total * 0.2 < p["divetime"] < total * 0.7]
-        if len(bottom_points) > 10:
-            depths = [p["depth"] for p in bottom_points]
+        total = profile.divetime[-1]
+        depths = [d for t, d in zip(profile.divetime, profile.depth) if total * 0.2 < t < total * 0.7]
+        if len(depths) > 10:
             depth_range = max(depths) - min(depths)
             self.assertGreater(depth_range, 1.0,
                                f"Bottom too flat: only {depth_range:.1f}m variation")
@@ -256,14 +1126,12 @@ class TestProfileRealism(unittest.TestCase):
             tank_configs=self._make_single_tank(), site_type="reef",
             thermocline_profile=THERMOCLINE_PROFILES["tropical"],
         )
-        total = profile[-1]["divetime"]
-        bottom_points = [p for p in profile if total * 0.2 < p["divetime"] < total * 0.7]
-        if len(bottom_points) > 20:
+        total = profile.divetime[-1]
+        pressures = [p for t, p in zip(profile.divetime, profile.tank_pressures[0]) if total * 0.2 < t < total * 0.7]
+        if len(pressures) > 20:
             drops = []
-            for i in range(1, len(bottom_points)):
-                p_prev = bottom_points[i-1]["tankpressures"][0]["pressure"]
-                p_curr = bottom_points[i]["tankpressures"][0]["pressure"]
-                drops.append(p_prev - p_curr)
+            for i in range(1, len(pressures)):
+                drops.append(pressures[i-1] - pressures[i])
             if drops:
                 avg_drop = sum(drops) / len(drops)
                 variance = sum((d - avg_drop) ** 2 for d in drops) / len(drops)
@@ -290,8 +1158,8 @@ class TestProfileRealism(unittest.TestCase):
             tank_configs=tanks, site_type="reef", thermocline_profile=thermo,
         )
 
-        depths1 = [p["depth"] for p in profile1 if 120 < p["divetime"] < 1800]
-        depths2 = [p["depth"] for p in profile2 if 120 < p["divetime"] < 1800]
+        depths1 = [d for t, d in zip(profile1.divetime, profile1.depth) if 120 < t < 1800]
+        depths2 = [d for t, d in zip(profile2.divetime, profile2.depth) if 120 < t < 1800]
         min_len = min(len(depths1), len(depths2))
         if min_len > 10:
             diffs = [abs(depths1[i] - depths2[i]) for i in range(min_len)]
@@ -299,6 +1167,73 @@ class TestProfileRealism(unittest.TestCase):
             self.assertGreater(avg_diff, 0.5, f"Dives too similar: avg diff = {avg_diff:.2f}m")
 
 
+class TestSegmentProfile(unittest.TestCase):
+    """Test the opt-in segment-based profile engine."""
+
+    def _make(self, sample_interval=5, seed=42):
+        import random as rng
+        rng.seed(seed)
+        tanks = [
+            {"mix_id": "air", "volume": 0.012, "role": "main", "working_pressure": 232},
+            {"mix_id": "ean50", "volume": 0.0111, "role": "stage", "working_pressure": 207},
+        ]
+        profile, switches, tissue = generate_segment_profile(
+            max_depth=45, duration_minutes=40, surface_temp=28, bottom_temp=24,
+            tank_configs=tanks, is_tech=True, site_type="wall",
+            thermocline_profile=THERMOCLINE_PROFILES["tropical"], sample_interval=sample_interval,
+        )
+        return profile, switches, tissue, tanks
+
+    def test_timeline_samples_segment_shapes(self):
+        """sample() should interpolate depth by shape and pressures linearly."""
+        timeline = SegmentTimeline([200.0])
+        timeline.add(60, 30.0, "linear", [180.0])
+        timeline.add(60, 20.0, "cosine", [170.0])
+        samples = list(timeline.sample([0, 30, 60, 90, 120, 150]))
+        self.assertEqual(samples[1], (15.0, "linear", (190.0,)))
+        self.assertAlmostEqual(samples[3][0], 25.0)
+        self.assertEqual(samples[3][2], (175.0,))
+        self.assertEqual(samples[4], (20.0, "surface", (170.0,)))
+        self.assertEqual(samples[5], samples[4])
+
+    def test_profile_is_well_formed(self):
+        """The profile should start and end at the surface with decompression cleared."""
+        profile, switches, tissue, tanks = self._make()
+        self.assertEqual(profile.depth[0], 0.0)
+        self.assertEqual(profile.depth[-1], 0.0)
+        self.assertEqual(set(b - a for a, b in zip(profile.divetime, profile.divetime[1:])), {5})
+        self.assertGreater(max(profile.depth), 35)
+        for column in profile.tank_pressures:
+            self.assertTrue(all(b <= a for a, b in zip(column, column[1:])))
+        self.assertTrue(switches)
+        for switch in switches:
+            self.assertIn(switch["time"], profile.divetime)
+        self.assertEqual(tissue.ceiling(0.85), 0.0)
+        self.assertEqual(tanks[0]["end_pressure_actual"], profile.tank_pressures[0][-1])
+
+    def test_planning_independent_of_sample_interval(self):
+        """Tissue and gas are integrated per segment, so the output interval doesn't change them."""
+        _, _, tissue, tanks = self._make(sample_interval=1)
+        for sample_interval in (5, 30):
+            _, _, other, other_tanks = self._make(sample_interval=sample_interval)
+            self.assertEqual(other.n2_loadings, tissue.n2_loadings)
+            self.assertEqual(other.he_loadings, tissue.he_loadings)
+            self.assertEqual([t["end_pressure_actual"] for t in other_tanks],
+                             [t["end_pressure_actual"] for t in tanks])
+
+    def test_session_chain_follows_plan_engine(self):
+        """Plans stamped with profile_engine "segments" use the segment engine."""
+        plans = plan_test_dives(4)
+        ticks = generate_session_chain(plans, 30)
+        for plan in plans:
+            plan["profile_engine"] = "segments"
+        segments = generate_session_chain(plans, 30)
+        for tick, segment in zip(ticks, segments):
+            self.assertNotEqual(tick["profile"], segment["profile"])
+            self.assertEqual(segment["profile"].depth[0], 0.0)
+            self.assertEqual(segment["profile"].depth[-1], 0.0)
+
+
 class TestCourseGeneration(unittest.TestCase):
     """Test PADI course data and training dive generation."""
 